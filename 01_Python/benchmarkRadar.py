@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+
+# This file measures how fast the different stages of 'logRadar.py' are, on synthetic (or recorded) frames
+# Usage: python3 benchmarkRadar.py [--repeat N] [--frames N] [--capture FILE.raw] [--json RESULTS.json]
+#   - micro benchmarks: magic word search and decoding, against the code they replaced
+#   - stages: sync, parse, postprocess, elevation, format and end to end, for several frame contents
+#   - water elevation estimation vs number of range bins, against the highest frame rate
+#     frames/s, bytes/s, latency percentiles per frame and peak memory allocated per frame
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import argparse     ## for the command line options
+import json         ## for the machine-readable results
+import os           ## for the path separator
+import platform     ## to describe the machine in the results
+import time         ## for the timers
+import tracemalloc  ## for the allocations per frame
+
+import numpy as np  ## for the buffers
+
+import globals          ## for the name of the radar configuration file
+import logRadar         ## the code we want to measure
+import radarSynthetic   ## to generate the radar frames
+
+# ---------------------- global variables []------------------
+
+# Synthetic frame contents of the stage benchmarks: name, objects per frame, range profile bins, garbage bytes before each frame
+benchmarkScenarios = [("1obj",                  1,   0,  0),
+                      ("10obj",                10,   0,  0),
+                      ("100obj",              100,   0,  0),
+                      ("10obj+profile",        10, 256,  0),
+                      ("10obj+garbage",        10,   0, 64),
+                      ("100obj+profile+garbage", 100, 256, 64)]
+
+benchmarkPercentiles = [50, 95, 99]
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def timeCall(function, repeat):
+    ### Function to call "function" repeat times and return the median duration of one call in [us]
+
+    durations = np.zeros(repeat)
+    for cnt in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations[cnt] = time.perf_counter() - start
+
+    return np.median(durations) * 1e6
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def legacyMagicScan(byteBuffer, expectedMagicWord):
+    ### The magic word search as it was done before (whole buffer, Python loop on the candidates)
+
+    possibleLocs = np.where(byteBuffer == expectedMagicWord[0])[0]
+    startIdx = []
+    for loc in possibleLocs:
+        check = byteBuffer[loc:loc + 8]
+        if np.all(check == expectedMagicWord):
+            startIdx.append(loc)
+
+    return startIdx
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def benchmarkMagicSync(repeat):
+    ### Per-call cost of the magic word search as the buffer fills up
+    ### Each call only brings one new frame worth of bytes, like the acquisition loop does
+
+    print("-" * 50)
+    print("Magic word sync: cost per call [us] vs buffer fill")
+    print("{:>12} {:>12} {:>12}".format("fill[bytes]", "legacy", "incremental"))
+
+    maxBufferSize = 2 ** 15
+    stream = radarSynthetic.buildSyntheticStream(400, numObj=10, garbageBytes=16, numRangeBins=256)
+    stream = np.frombuffer(stream, dtype='uint8')
+    newBytes = len(radarSynthetic.buildSyntheticFrame(1, 10, numRangeBins=256))
+
+    for fill in [1024, 2048, 4096, 8192, 16384, 30000]:
+        byteBuffer = np.zeros(maxBufferSize, dtype='uint8')
+        byteBuffer[:fill] = stream[:fill]
+
+        legacy = timeCall(lambda: legacyMagicScan(byteBuffer, logRadar.expectedMagicWord), repeat)
+
+        sync = logRadar.MagicWordSync(logRadar.expectedMagicWord)
+        previousStartIdx = sync.update(byteBuffer, fill - newBytes).copy()
+
+        def incremental():
+            # Pretend the last frame just arrived
+            sync.startIdx = previousStartIdx
+            sync.scannedLength = fill - newBytes
+            sync.update(byteBuffer, fill)
+
+        incrementalTime = timeCall(incremental, repeat)
+
+        print("{:>12d} {:>12.1f} {:>12.1f}".format(fill, legacy, incrementalTime))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def legacyDecode(byteBuffer):
+    ### The header + detected objects decoding as it was done before (one np.matmul per field)
+
+    word_4_32 = [2 ** 0, 2 ** 8, 2 ** 16, 2 ** 24]
+    word_4_16 = word_4_32[:2]
+    word_4_8 = word_4_32[:1]
+
+    parsedData = logRadar.RadarData()
+    idX = 8
+    parsedData.frmhdr.sdkVersion.BuildNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
+    idX += 1
+    parsedData.frmhdr.sdkVersion.BugfixNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
+    idX += 1
+    parsedData.frmhdr.sdkVersion.MinorNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
+    idX += 1
+    parsedData.frmhdr.sdkVersion.MajorNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
+    idX += 1
+    parsedData.frmhdr.totalPacketLen = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
+    idX += 4
+    parsedData.frmhdr.platform = format(np.matmul(byteBuffer[idX:idX + 4], word_4_32), 'x')
+    idX += 4
+    parsedData.frmhdr.frameNumber = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
+    idX += 4
+    parsedData.frmhdr.timeCpuCycles = np.matmul(byteBuffer[idX:idX + 4], word_4_32).astype(np.uint32)
+    idX += 4
+    parsedData.frmhdr.numDetectedObj = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
+    idX += 4
+    parsedData.frmhdr.numTLVs = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
+    idX += 4
+
+    idX += 8  # TLV header
+    tlv_numObj = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+    idX += 2
+    parsedData.tlv_xyzQFormat = 2 ** np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+    idX += 2
+
+    objList = []
+    for objectNum in range(tlv_numObj):
+        obj = logRadar.RadarDetectedObject()
+        obj.rangeIdx = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        obj.dopplerIdx = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        obj.peakVal = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        obj.x = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        obj.y = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        obj.z = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
+        idX += 2
+        objList.append(obj)
+
+    return parsedData, objList
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def structuredDecode(byteBuffer):
+    ### The header + detected objects decoding with the structured dtypes
+
+    parsedData = logRadar.RadarData()
+    idX = logRadar.decodeFrameHeader14xx(byteBuffer, parsedData.frmhdr)
+    tlvLength = int(np.frombuffer(byteBuffer, dtype=logRadar.tlvHeaderDtype, count=1, offset=idX)[0]['length'])
+    idX += logRadar.tlvHeaderDtype.itemsize
+    parsedData.tlv_xyzQFormat, objects, objectsOK = logRadar.decodeDetectedObjects14xx(byteBuffer, idX, tlvLength)
+
+    return parsedData, objects
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def benchmarkDecode(repeat):
+    ### Cost of decoding the header and the detected objects of one frame
+
+    print("-" * 50)
+    print("Header + detected objects decoding: cost per frame [us]")
+    print("{:>12} {:>12} {:>12}".format("objects", "legacy", "structured"))
+
+    for numObj in [1, 10, 100]:
+        byteBuffer = np.frombuffer(radarSynthetic.buildSyntheticFrame(1, numObj), dtype='uint8')
+
+        legacy = timeCall(lambda: legacyDecode(byteBuffer), repeat)
+        structured = timeCall(lambda: structuredDecode(byteBuffer), repeat)
+
+        print("{:>12d} {:>12.1f} {:>12.1f}".format(numObj, legacy, structured))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildSyntheticSegments(nbrFrames, numObj, numRangeBins, garbageBytes, seed=0):
+    ### Function to build the byte segments received for each frame: garbage (if any) followed by the frame
+
+    rng = np.random.default_rng(seed)
+    segments = []
+    for frameNumber in range(1, nbrFrames + 1):
+        garbage = rng.integers(0, 256, garbageBytes, dtype=np.uint8)
+        garbage[garbage == logRadar.expectedMagicWord[0]] = 0  # make sure there is no fake magic word
+        frame = radarSynthetic.buildSyntheticFrame(frameNumber, numObj, rng=rng, numRangeBins=numRangeBins)
+        segments.append(garbage.tobytes() + frame)
+
+    return segments
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readCaptureSegments(fileName, nbrFrames):
+    ### Function to cut a raw capture into segments starting at each magic word (at most nbrFrames segments)
+
+    byteVec = np.fromfile(fileName, dtype='uint8')
+    startIdx = logRadar.findMagicWord(byteVec, logRadar.expectedMagicWord)[:nbrFrames + 1]
+    if len(startIdx) < 2:
+        return []
+
+    return [byteVec[start:stop].tobytes() for start, stop in zip(startIdx[:-1], startIdx[1:])]
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def measureStage(scenarioName, stageName, function, items, nbrBytes):
+    ### Function to call "function" on each item once, returns the statistics of the stage as a dictionary
+    ### Timing and allocations are measured in 2 separate passes (tracemalloc slows everything down)
+    ### "function" must give the same result when called again on the same item
+
+    latencies = np.zeros(len(items))
+    startTime = time.perf_counter()
+    for cnt, item in enumerate(items):
+        callStart = time.perf_counter()
+        function(item)
+        latencies[cnt] = time.perf_counter() - callStart
+    duration = time.perf_counter() - startTime
+
+    # Peak of the memory allocated during each call, above what was allocated before it
+    allocations = np.zeros(len(items))
+    tracemalloc.start()
+    for cnt, item in enumerate(items):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        function(item)
+        allocations[cnt] = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    result = {"scenario": scenarioName,
+              "stage": stageName,
+              "frames": len(items),
+              "frames/s": round(len(items) / duration, 1),
+              "bytes/s": round(nbrBytes / duration, 1),
+              "meanAlloc[B/frame]": round(float(np.mean(allocations)), 1)}
+    for percentile in benchmarkPercentiles:
+        result["p{}[us]".format(percentile)] = round(float(np.percentile(latencies, percentile)) * 1e6, 2)
+
+    return result
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def benchmarkStages(scenarioName, segments, configParameters):
+    ### Every stage of the acquisition loop on its own, then all of them together
+    ### The inputs of each stage are prepared beforehand with the previous stages
+
+    nbrBytes = sum([len(segment) for segment in segments])
+    timeMs = 0
+    extractor = logRadar.RadarFrameExtractor(2 ** 15)
+
+    def sync(segment):
+        # Same as the reader thread: feed the bytes, then take out every complete frame
+        extractor.feed(np.frombuffer(segment, dtype='uint8'))
+        frames = []
+        frame = extractor.nextFrame()
+        while frame is not None:
+            frames.append(frame.tobytes())
+            extractor.consumeFrame(len(frame))
+            frame = extractor.nextFrame()
+        return frames
+
+    def parse(frameBytes):
+        return logRadar.parseFrame14xx(frameBytes)
+
+    def postprocess(frameBytes):
+        # The post-processing works in place, so it always starts from a freshly parsed frame
+        return logRadar.postprocessData14xx(logRadar.parseFrame14xx(frameBytes), configParameters)
+
+    def elevation(parsedData):
+        return logRadar.estimateWaterElevation14xx(parsedData, configParameters)
+
+    def formatFrame(parsedData):
+        return logRadar.formatRadarFrame(parsedData, timeMs)
+
+    def endToEnd(segment):
+        for frameBytes in sync(segment):
+            parsedData = logRadar.parseFrame14xx(frameBytes)
+            if parsedData.dataOK:
+                parsedData = logRadar.postprocessData14xx(parsedData, configParameters)
+                logRadar.formatRadarFrame(logRadar.estimateWaterElevation14xx(parsedData, configParameters), timeMs)
+
+    # The extractor always ends on a frame boundary, so the segments can be fed again and again
+    frames = []
+    for segment in segments:
+        frames += sync(segment)
+    frameBytesTotal = sum([len(frameBytes) for frameBytes in frames])
+    parsedFrames = [elevation(postprocess(frameBytes)) for frameBytes in frames]
+
+    return [measureStage(scenarioName, "sync", sync, segments, nbrBytes),
+            measureStage(scenarioName, "parse", parse, frames, frameBytesTotal),
+            measureStage(scenarioName, "parse+postprocess", postprocess, frames, frameBytesTotal),
+            measureStage(scenarioName, "elevation", elevation, parsedFrames, frameBytesTotal),
+            measureStage(scenarioName, "format", formatFrame, parsedFrames, frameBytesTotal),
+            measureStage(scenarioName, "endToEnd", endToEnd, segments, nbrBytes)]
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def benchmarkElevation(repeat, configParameters, maxFrameRate):
+    ### Cost of the water elevation estimation from the range profile, for the possible numbers of range bins
+    ### It must stay a small part of the frame period at the highest frame rate
+
+    print("-" * 50)
+    print("Water elevation from the range profile: cost per frame [us], share of the frame period at {:.0f} Hz".format(maxFrameRate))
+    print("{:>12} {:>12} {:>12}".format("range bins", "elevation", "period[%]"))
+
+    for numRangeBins in [64, 256, 1024, 4096]:
+        frameBytes = radarSynthetic.buildSyntheticFrame(1, 10, numRangeBins=numRangeBins)
+        parsedData = logRadar.postprocessData14xx(logRadar.parseFrame14xx(frameBytes), configParameters)
+
+        elevation = timeCall(lambda: logRadar.estimateWaterElevation14xx(parsedData, configParameters), repeat)
+
+        print("{:>12d} {:>12.1f} {:>12.2f}".format(numRangeBins, elevation, elevation * 1e-6 * maxFrameRate * 100))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def printStageResults(results):
+    ### Print the stage results as a table
+
+    columns = ["scenario", "stage", "frames/s", "bytes/s"] + \
+              ["p{}[us]".format(percentile) for percentile in benchmarkPercentiles] + ["meanAlloc[B/frame]"]
+
+    print("-" * 50)
+    print("Stages: throughput, latency per frame and memory allocated per frame")
+    print("{:>24} {:>18}".format(*columns[:2]) + "".join(["{:>19}".format(name) for name in columns[2:]]))
+    for result in results:
+        print("{:>24} {:>18}".format(result["scenario"], result["stage"]) +
+              "".join(["{:>19}".format(result[name]) for name in columns[2:]]))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the radar parsing code")
+    parser.add_argument("--repeat", type=int, default=200, help="number of calls per micro benchmark measurement")
+    parser.add_argument("--frames", type=int, default=500, help="number of frames per stage benchmark scenario")
+    parser.add_argument("--capture", default=None, help="raw capture of the DATA port to benchmark as well")
+    parser.add_argument("--cfg", default=globals.RadarParametersFilePath,
+                        help="radar configuration file")
+    parser.add_argument("--json", default=None, help="file to write the results to, to compare versions")
+    parser.add_argument("--label", default="", help="name of this run in the results (e.g. the version)")
+    parser.add_argument("--max-rate", type=float, default=100.0, help="highest frame rate to keep up with [Hz]")
+    args = parser.parse_args()
+
+    benchmarkMagicSync(args.repeat)
+    benchmarkDecode(args.repeat)
+
+    # Same parameters as the logger: radar configuration + echo filters
+    globals.pathSeparator = os.sep  # normally set by logRadar.main()
+    configParameters = logRadar.parseConfigFile(args.cfg)
+    loggerParametersDict = logRadar.readLoggerParameters(globals.LoggerParametersFilePath)
+    if loggerParametersDict:
+        configParameters.update(logRadar.readFilterParameters(loggerParametersDict))
+        configParameters.update(logRadar.readElevationParameters(loggerParametersDict))
+
+    benchmarkElevation(args.repeat, configParameters, args.max_rate)
+
+    results = []
+    for scenarioName, numObj, numRangeBins, garbageBytes in benchmarkScenarios:
+        segments = buildSyntheticSegments(args.frames, numObj, numRangeBins, garbageBytes)
+        results += benchmarkStages(scenarioName, segments, configParameters)
+
+    if args.capture:
+        segments = readCaptureSegments(args.capture, args.frames)
+        if segments:
+            results += benchmarkStages("capture", segments, configParameters)
+        else:
+            print("No frame found in {}".format(args.capture))
+
+    printStageResults(results)
+
+    if args.json:
+        report = {"label": args.label,
+                  "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                  "python": platform.python_version(),
+                  "numpy": np.__version__,
+                  "machine": platform.machine(),
+                  "frames": args.frames,
+                  "results": results}
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+        print("Results written to {}".format(args.json))
+
+## END OF FUNCTION
+# ***********************************************************************************************************************
+
+
+# -------------------------    MAIN   -----------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
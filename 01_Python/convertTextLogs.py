@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+# This file converts the text data logs ("<testRef>-Data.log" and its rotated files) into the columnar archive
+# (see 'radarArchive.py') or the binary log (see 'radarBinaryLog.py')
+# Usage: python3 convertTextLogs.py LOG_OR_FOLDER [...] [--format archive|binary] [--output FOLDER] [--jobs N] [--overwrite]
+#   - the outputs are "<testRef>-Converted-Archive" or "<testRef>-Converted-Data-NNNN.bin", so the archive/binary log
+#     written by the logger itself is never touched; a session already converted is skipped unless "--overwrite"
+#   - the rotated files of a session are read in parallel (one process per file) and written in chronological order:
+#     ".log.N" ... ".log.1" then ".log" (RotatingFileHandler), or ".log.0000", ".log.0001" ... then ".log"
+#     (segments of the compressor, ".gz"/".xz" are read directly)
+#   - each file is split in one go: all the fields of all the lines become one array of tokens, then whole columns
+#     are converted at once (no Python loop on the lines)
+#   - the header line, incomplete lines (power cut) and corrupted lines are skipped
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import argparse     ## for the command line options
+import concurrent.futures  ## to parse several files at once
+import glob         ## for the outputs of a previous conversion
+import gzip         ## for the compressed segments
+import lzma         ## for the compressed segments
+import os           ## for the file names
+import re           ## for the magic number field and the rotated file names
+import shutil       ## to remove the outputs of a previous conversion (--overwrite)
+import time         ## for the timestamps and the timers
+
+import numpy as np  ## for the columns
+
+import globals          ## for the text log format and the name of the radar configuration file
+import radarArchive     ## columnar output
+import radarBinaryLog   ## binary output
+from radarFormats import expectedMagicWord  ## the magic number is not converted, only frames with a good one are logged
+
+# ---------------------- global variables []------------------
+
+# "[2 1 4 3 6 5 8 7]" (numpy array) or "[2, 1, 4, 3, 6, 5, 8, 7]" (list, older logs): one token without comma
+textLogMagicPattern = re.compile(r"\[[^\]\n]*\]")
+
+# "<testRef>-Data.log", "<testRef>-Data.log.3", "<testRef>-Data.log.0002.gz"
+textLogNamePattern = re.compile(r"^(?P<session>.*-Data\.log)(?:\.(?P<number>\d+))?(?P<compressed>\.gz|\.xz)?$")
+textLogOpeners = {".gz": gzip.open, ".xz": lzma.open}
+
+# Added to the name of the outputs, so they never overwrite the binary log/archive written by the logger
+convertedSuffix = "-Converted"
+
+# Fields of "globals.singleEchoFormat" (the display count first)
+textLogEchoFields = ["displayCount", "echoNumber", "isValid", "isConverted", "x", "y", "z", "dopplerVal",
+                     "velocity", "rangeIdx", "rangeVal", "dopplerIdx", "peakVal", "elv", "azmth"]
+
+# Fields of "globals.headerFormat" (after the host timestamp), "waterElevation" is missing in the older logs
+textLogHeaderFields = ["time_ms", "magicNumber", "MajorNum", "MinorNum", "BugfixNum", "BuildNum", "totalPacketLen",
+                       "platform", "frameNumber", "timeCpuCycles", "numDetectedObj", "numTLVs", "xyzQFormat",
+                       "waterElevation"]
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def textLogSortKey(fileName):
+    ### Chronological position of a file in its session: rotated backups (oldest = highest number) or
+    ### compressor segments (oldest = lowest 4-digit number), the current file is always the last one
+
+    number = textLogNamePattern.match(os.path.basename(fileName)).group("number")
+    if number is None:
+        return (2, 0)
+    if len(number) == 4:
+        return (1, int(number))  # "<name>.NNNN" segment
+    return (0, -int(number))  # RotatingFileHandler backup
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def findTextLogSessions(paths):
+    ### Group the text log files (given, or found in the given folders) by session, each in chronological order
+    ### Returns a dict: session base name ("<folder>/<testRef>-Data.log") -> list of files
+
+    fileNames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, files in os.walk(path):
+                fileNames += [os.path.join(folder, name) for name in files]
+        else:
+            fileNames.append(path)
+
+    sessions = {}
+    for fileName in fileNames:
+        match = textLogNamePattern.match(os.path.basename(fileName))
+        if match is not None:
+            sessionName = os.path.join(os.path.dirname(fileName), match.group("session"))
+            sessions.setdefault(sessionName, []).append(fileName)
+
+    return {sessionName: sorted(files, key=textLogSortKey) for sessionName, files in sorted(sessions.items())}
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readTextLog(fileName):
+    ### Content of a text log (plain or compressed) as a string
+
+    compressedExtension = os.path.splitext(fileName)[1]
+    opener = textLogOpeners.get(compressedExtension, open)
+    with opener(fileName, "rb") as file:
+        return file.read().decode("latin-1")
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def uniqueApply(values, function):
+    ### Apply a Python function to a string column, once per distinct value (the timestamps and platforms repeat)
+
+    uniqueValues, inverse = np.unique(values, return_inverse=True)
+    return np.array([function(value) for value in uniqueValues])[inverse.ravel()]
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def toIntegers(column):
+    ### Convert a string column of integers, some are written with decimals ("512.00" for xyzQFormat, "4822.00000" for peakVal)
+
+    return np.rint(column.astype(np.float64)).astype(np.int64)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def parseTextLog(fileName):
+    ### Parse one text log file, returns a dict of columns (one value per frame, 2D for the echo fields)
+    ### or None if the file has no data line
+
+    text = textLogMagicPattern.sub("0", readTextLog(fileName))
+    lines = np.array(text.split("\n"))
+    if not lines.size:
+        return None
+
+    # Data lines: the timestamp is followed by a comma (the header line by a space), and all the data lines
+    # of a file have the same number of fields (every line has "nbrEchosDisplayed" echoes)
+    timestampLen = len(time.strftime(globals.timeStampDateFormat)) + 4  # + ".mmm"
+    candidates = lines[np.char.find(lines, ",") == timestampLen]
+    if not candidates.size:
+        return None
+    nbrCommas = np.char.count(candidates, ",")
+    nbrTabs = np.char.count(candidates, globals.echoSeparator)
+    layouts, counts = np.unique(np.stack((nbrCommas, nbrTabs), axis=1), axis=0, return_counts=True)
+    nbrCommasRef, nbrEchoes = layouts[np.argmax(counts)]
+    dataLines = candidates[(nbrCommas == nbrCommasRef) & (nbrTabs == nbrEchoes)]
+
+    nbrHeaderFields = int(nbrCommasRef) + int(nbrEchoes) - len(textLogEchoFields) * int(nbrEchoes)
+    if nbrHeaderFields not in [len(textLogHeaderFields), len(textLogHeaderFields) - 1]:
+        print("{}: unknown line layout ({} header fields), skipped".format(fileName, nbrHeaderFields))
+        return None
+    nbrFields = 1 + nbrHeaderFields + len(textLogEchoFields) * int(nbrEchoes)
+
+    # All the tokens at once, one row per line
+    tokens = np.array(",".join(dataLines).replace(globals.echoSeparator, ",").split(","))
+    tokens = tokens.reshape(len(dataLines), nbrFields)
+
+    # Corrupted lines (e.g. half-written before a power cut, then another line) are removed before the conversion
+    numeric = np.char.isdigit(tokens[:, 1 + textLogHeaderFields.index("frameNumber")])
+    tokens = tokens[numeric]
+
+    columns = {}
+    try:
+        # Host timestamp: the date/time part repeats, it is converted once per second
+        seconds, _, milliseconds = np.char.rpartition(tokens[:, 0], ".").T
+        columns["hostTimestamp"] = uniqueApply(
+            seconds, lambda value: time.mktime(time.strptime(value, globals.timeStampDateFormat))) + \
+            milliseconds.astype(np.float64) / 1000
+
+        for fieldIdx, field in enumerate(textLogHeaderFields[:nbrHeaderFields]):
+            column = tokens[:, 1 + fieldIdx]
+            if field == "magicNumber":
+                continue
+            elif field == "platform":
+                columns[field] = uniqueApply(column, lambda value: int(value, 16)).astype(np.uint32)
+            elif field == "waterElevation":
+                columns[field] = column.astype(np.float64)
+            else:
+                columns[field] = toIntegers(column)
+        if "waterElevation" not in columns:
+            columns["waterElevation"] = np.full(len(tokens), np.nan)
+
+        echoTokens = tokens[:, 1 + nbrHeaderFields:].reshape(len(tokens), int(nbrEchoes), len(textLogEchoFields))
+        for fieldIdx, field in enumerate(textLogEchoFields):
+            column = echoTokens[:, :, fieldIdx]
+            if field in ["isValid", "isConverted"]:
+                columns[field] = column == "True"
+            elif field in ["displayCount", "echoNumber", "rangeIdx", "dopplerIdx", "peakVal"]:
+                columns[field] = toIntegers(column)
+            else:
+                columns[field] = column.astype(np.float64)
+
+    except ValueError as e:
+        print("{}: cannot convert the fields ({}), skipped".format(fileName, e))
+        return None
+
+    return columns
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def columnsToArchiveRecords(columns, nbrEchoes):
+    ### Records of "radarArchive.archiveFrameDtype", the unused echoes (not valid) are NaN/0
+    ### "numKeptObj" is not in the text log: the echoes that passed the filters are not known, it is left at 0
+
+    records = np.zeros(len(columns["frameNumber"]), dtype=radarArchive.archiveFrameDtype(nbrEchoes))
+    for field in ["time_ms", "hostTimestamp", "frameNumber", "timeCpuCycles", "numDetectedObj", "xyzQFormat",
+                  "waterElevation"]:
+        records[field] = columns[field]
+
+    nbrCopied = min(nbrEchoes, columns["isValid"].shape[1])
+    valid = columns["isValid"][:, :nbrCopied]
+    records["numStoredObj"] = np.count_nonzero(valid, axis=1)
+    for pointField, column in radarArchive.archiveEchoFields:
+        records[column] = 0 if column == "peakVal" else np.nan
+        records[column][:, :nbrCopied] = np.where(valid, columns[pointField][:, :nbrCopied], records[column][:, :nbrCopied])
+
+    return records
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def columnsToBinaryRecords(columns, nbrEchoes):
+    ### Records of "radarBinaryLog.binaryRecordDtype": the raw header and point cloud are rebuilt from the text
+    ### (x, y, z are logged with enough decimals to get the Q format integers back)
+
+    records = np.zeros(len(columns["frameNumber"]), dtype=radarBinaryLog.binaryRecordDtype(nbrEchoes))
+    records["hostTimestamp"] = columns["hostTimestamp"]
+
+    frmhdr = records["frmhdr"]
+    frmhdr["magicNumber"] = expectedMagicWord
+    for field in ["MajorNum", "MinorNum", "BugfixNum", "BuildNum", "totalPacketLen", "platform", "frameNumber",
+                  "timeCpuCycles", "numDetectedObj", "numTLVs"]:
+        frmhdr[field] = columns[field]
+
+    xyzQFormat = np.maximum(columns["xyzQFormat"], 1)
+    records["xyzQFormat"] = np.round(np.log2(xyzQFormat)).astype(np.uint16)
+
+    nbrCopied = min(nbrEchoes, columns["isValid"].shape[1])
+    valid = columns["isValid"][:, :nbrCopied]
+    records["numStoredObj"] = np.count_nonzero(valid, axis=1)
+
+    points = records["points"]
+    for field in ["rangeIdx", "dopplerIdx", "peakVal"]:
+        points[field][:, :nbrCopied] = np.where(valid, columns[field][:, :nbrCopied], 0)
+    for field in ["x", "y", "z"]:
+        points[field][:, :nbrCopied] = np.where(valid, np.round(columns[field][:, :nbrCopied] * xyzQFormat[:, np.newaxis]), 0)
+
+    return records
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def convertedOutputs(baseName, outputFormat):
+    ### Existing outputs of a previous conversion of the session "baseName" (archive folder or binary files)
+
+    if outputFormat == "archive":
+        return [baseName + convertedSuffix + '-Archive'] if os.path.exists(baseName + convertedSuffix + '-Archive') else []
+    return sorted(glob.glob(glob.escape(baseName + convertedSuffix + '-Data') + '-[0-9][0-9][0-9][0-9].bin'))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def convertSession(sessionName, fileNames, outputFormat, outputFolder, executor, configHash, configParameters,
+                   overwrite=False):
+    ### Convert all the files of a session, parsed in parallel by "executor" and written in order
+    ### The outputs are named "<testRef>-Converted-...", never the names used by the logger itself
+    ### Returns the number of frames written, None if the outputs already exist (and "overwrite" is not set)
+
+    outputFolder = outputFolder or os.path.dirname(sessionName)
+    os.makedirs(outputFolder, exist_ok=True)
+    baseName = os.path.join(outputFolder, os.path.basename(sessionName)[:-len('-Data.log')])
+
+    existingOutputs = convertedOutputs(baseName, outputFormat)
+    if existingOutputs and not overwrite:
+        print("  already converted ({}), skipped (use --overwrite)".format(", ".join(existingOutputs)))
+        return None
+    for existingOutput in existingOutputs:
+        # The archive writer would append to the previous chunks, the binary writer may write fewer files
+        if os.path.isdir(existingOutput):
+            shutil.rmtree(existingOutput)
+        else:
+            os.remove(existingOutput)
+
+    writer = None
+    nbrFrames = 0
+
+    for fileName, columns in zip(fileNames, executor.map(parseTextLog, fileNames)):
+        if columns is None:
+            continue
+
+        if writer is None:
+            # The number of echoes of the first file is used for the whole session
+            nbrEchoes = columns["isValid"].shape[1]
+            if outputFormat == "archive":
+                writer = radarArchive.ColumnarArchiveWriter(baseName + convertedSuffix + '-Archive', nbrEchoes,
+                                                            configHash, configParameters)
+            else:
+                writer = radarBinaryLog.RadarBinaryLogWriter(baseName + convertedSuffix + '-Data', nbrEchoes,
+                                                             configHash, configParameters)
+
+        if outputFormat == "archive":
+            writer.writeRecords(columnsToArchiveRecords(columns, nbrEchoes))
+        else:
+            writer.writeRecords(columnsToBinaryRecords(columns, nbrEchoes))
+        nbrFrames += len(columns["frameNumber"])
+        print("  {}: {} frames".format(fileName, len(columns["frameNumber"])))
+
+    if writer is not None:
+        writer.close()
+
+    return nbrFrames
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description="Convert the text data logs into the columnar archive or the binary log")
+    parser.add_argument("paths", nargs="+", help="text log files or folders containing them (searched recursively)")
+    parser.add_argument("--format", choices=["archive", "binary"], default="archive", help="output format")
+    parser.add_argument("--output", default=None, help="output folder (default: next to the text logs)")
+    parser.add_argument("--overwrite", action="store_true", help="replace the outputs of a previous conversion")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of files parsed in parallel")
+    parser.add_argument("--cfg", default=globals.RadarParametersFilePath,
+                        help="radar configuration file used for the logs (stored in the output description)")
+    args = parser.parse_args()
+
+    # Imported here: the worker processes only need the parser
+    import logRadar
+    configParameters = logRadar.parseConfigFile(args.cfg)
+    configHash = logRadar.computeConfigHash(args.cfg)
+
+    sessions = findTextLogSessions(args.paths)
+    print("{} sessions, {} files".format(len(sessions), sum([len(files) for files in sessions.values()])))
+
+    startTime = time.perf_counter()
+    nbrFrames = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        for sessionName, fileNames in sessions.items():
+            print(sessionName)
+            nbrSessionFrames = convertSession(sessionName, fileNames, args.format, args.output, executor,
+                                              configHash, configParameters, args.overwrite)
+            nbrFrames += nbrSessionFrames or 0
+
+    duration = time.perf_counter() - startTime
+    print("-" * 50)
+    print("{} frames converted in {:.3f} s ({:.0f} frames/s)".format(nbrFrames, duration,
+                                                                    nbrFrames / duration if duration > 0 else 0))
+
+## END OF FUNCTION
+# ***********************************************************************************************************************
+
+
+# -------------------------    MAIN   -----------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
\ No newline at end of file
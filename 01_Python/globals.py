@@ -15,12 +15,16 @@
 
 # Version Control: https://github.com/Saultes45/
 
+# ---------------------- imports -----------------------------------------
+import os           ## for the path of the code folder
+
 # ---------------------- global variables []------------------
 
 ## Debug
 ##-------
 
 # Chose if we have to send the config parameters to the radar
+# Set by main(): True if the radar is already sending frames with the configuration last sent (see RadarStateFileName)
 radarAlreadyConfigured = False
 
 # Chose if we save the binary data of the last TLV message
@@ -38,7 +42,15 @@ LoggerParametersFileName    = "Parameter.ini"
 
 # Name of file and path for the radar configuration (cannot be put in the configuration file for obvious reasons)
 RadarParametersFolderName   = "02_RadarParameters"
-RadarParametersFileName     = "1443config_8Hz.cfg"
+RadarParametersFileName     = "1443config_8hz.cfg"  # case sensitive on the RPi
+
+# Default configuration files of the tools (replay, benchmark, conversion): next to the code, whatever the current folder
+codeFolderName              = os.path.dirname(os.path.abspath(__file__))
+LoggerParametersFilePath    = os.path.join(codeFolderName, LoggerParametersFolderName, LoggerParametersFileName)
+RadarParametersFilePath     = os.path.join(codeFolderName, RadarParametersFolderName, RadarParametersFileName)
+
+# Hash + parameters of the last radar configuration sent, stored in the radar configuration folder
+RadarStateFileName          = "radarState.json"
 
 
 ## Datalogging
@@ -66,14 +78,22 @@ timeStampDateFormat     = '%Y-%m-%d_%H-%M-%S'
 nbrAquisitionLoops      = 20
 nbrStoredEchoesInClass  = 10
 nbrEchosDisplayed       = 10  # make sure this number is >= the number of echoes in class
-loopSleepTimeSeconds    = 0.120  # Sampling frequency of 8Hz (same as pressure senors), 0.125 actually needed
+frameWaitTimeoutSeconds = 1.0  # Maximum time waiting for a frame from the DATA port reader thread
+frameQueueSize          = 64  # Number of complete frames the DATA port reader thread can hold (8s at 8Hz)
+statusPrintIntervalSeconds = 60.0  # Period of the reader/writer statistics printed on the console
+radarCpuFrequencyHz     = 200e6  # Clock of the radar R4F, unit of the "timeCpuCycles" of the frame header
+cliCommandTimeoutSeconds = 1.0  # Maximum time waiting for the radar to answer a CLI command ("Done" + prompt)
+cliStartTimeoutSeconds  = 5.0  # Same for "sensorStart", which runs the calibration first
+radarDetectNbrFrames    = 2  # Valid frames needed on the DATA port to consider the radar is already running
+radarDetectFramePeriods = 3.0  # Time waiting for these frames, in frame periods...
+radarDetectMinTimeoutSeconds = 0.5  # ... but not less than that
 
 crashMarker = "--------- /!\ CRASH /!\ ---------"
 
 ## Display format
 ##----------------
 
-headerFormat = ",{},{},{:02d},{:02d},{:02d},{:02d},{},{},{:010d},{:011d},{:02d},{},{:.2f}"
+headerFormat = ",{},{},{:02d},{:02d},{:02d},{:02d},{},{},{:010d},{:011d},{:02d},{},{:.2f},{:.4f}"
 singleEchoFormat = "{:02d},{:02d},{},{},{:.5f},{:.5f},{:.5f},{:.5f},{:.5f},{:04d},{:.5f},{:04d},{:.5f},{:.5f},{:.5f}"
 echoSeparator = "\t"
 
@@ -90,6 +110,7 @@ logFileHeader = " Aquisition Time[ms]," \
                 " Number of detected objects[N/A]," \
 				" Number of TLVs[N/A]," \
                 " xyzQFormat," \
+                " Water Elevation[m]," \
                 "    display count," \
                 " aquisition count," \
                 " isValid," \
@@ -63,20 +63,40 @@
 # ---------------------- imports -----------------------------------------
 import configparser ## for reading the logger data stored in the Parameters.ini file
 import os           ## for managing files and directories
-import subprocess   ## for checking the USB drive is present on the RPi
 import platform     ## for checking the platform (Win7 or raspberry pi)
 import serial       ## to communicate with the TI radar AWR1443BOOST
 
-import glob         ## for Linux platform only: list available serial ports
 import time         ## to slow down the data sent via serial
+import threading    ## to read the radar DATA serial port in the background
+import queue        ## to pass the radar frames from the reader thread to the main thread
+import collections  ## for the rolling statistics
+import cProfile     ## for the optional CPU profile of the acquisition loop
+import pstats       ## to print the CPU profile
 
 import logging                                    ## for logging both data and debug log
-from logging.handlers import RotatingFileHandler  ## for limiting the file size
 
 import numpy as np  ## for parsing the radar data
 # import re  ## for find substr in str
 
+import hashlib      ## for the hash of the radar configuration file
+import json         ## for the state of the radar configuration (last configuration sent)
+
 import globals  ## for storing my global variables that cannot be put in the ini file
+import radarBinaryLog  ## for the compact binary session log
+import radarWriter  ## for writing the data logs in a dedicated thread
+import radarCapture  ## for the raw capture of the DATA port
+import radarArchive  ## for the chunked columnar archive of the session
+import radarProfiling  ## for the timing of the acquisition stages
+import radarPorts  ## to find the radar serial ports from their USB attributes
+import radarCli  ## to send the commands to the radar CLI port
+import radarStorage  ## to find the USB drive and watch its free space
+import radarRetention  ## to keep the older sessions within the budget of the data folder
+from radarFormats import findMagicWord, expectedMagicWord, frameHeaderDtype, tlvHeaderDtype, detectedObjDescrDtype, \
+    detectedObjDtype, radarPointDtype, radarPointLogFields, radarPointTemplate, \
+    rangeProfileDtype, azimuthHeatmapDtype, rangeDopplerHeatmapDtype, statsDtype, \
+    MMWDEMO_UART_MSG_DETECTED_POINTS, MMWDEMO_UART_MSG_RANGE_PROFILE, MMWDEMO_UART_MSG_NOISE_PROFILE, \
+    MMWDEMO_UART_MSG_AZIMUT_STATIC_HEAT_MAP, MMWDEMO_UART_MSG_RANGE_DOPPLER_HEAT_MAP, \
+    MMWDEMO_UART_MSG_STATS  ## binary layouts of the radar data
 
 
 # ---------------------- user-defined exceptions [1+2]------------------
@@ -100,7 +120,7 @@ class BadOS(Error):
     print("Unknown OS, stopping execution")
     print(globals.crashMarker)
 
-# ---------------------- Class [4]------------------
+# ---------------------- Class [9]------------------
 
 class RadarDetectedObject:
     def __init__(self):
@@ -130,16 +150,64 @@ class RadarFrameHeader:
         self.timeCpuCycles = np.uint32(4294967295)
         self.numDetectedObj = 0
         self.numTLVs = 0
+        self.raw = None  # the header as received (structured array of 1 element)
+
+class RadarDetectedObjectView:
+    # Same attributes as "RadarDetectedObject", but reading/writing one row of the point cloud array of "RadarData"
+    def __init__(self, points, echoIdx):
+        object.__setattr__(self, "_points", points)
+        object.__setattr__(self, "_echoIdx", echoIdx)
+
+    def __getattr__(self, name):
+        if name not in radarPointDtype.names:
+            raise AttributeError(name)
+        return self._points[name][self._echoIdx].item()
+
+    def __setattr__(self, name, value):
+        if name not in radarPointDtype.names:
+            raise AttributeError(name)
+        self._points[name][self._echoIdx] = value
 
 class RadarData:
+    # The point cloud is stored as one record array (one row per echo, one field per attribute),
+    # the per-echo objects of "objList" are only created if someone asks for them
     def __init__(self):
          self.binData = []
          self.magicOK = False
          self.dataOK = False
+         self.truncated = False  # a TLV goes past the end of the frame (following TLVs missing) or its object count is wrong
          self.frmhdr = RadarFrameHeader()
          self.tlv_xyzQFormat = 0
-         self.objList = []  # to have different pointers, "append" is used later
-         # self.objList = [RadarDetectedObject()] * globals.nbrStoredEchoesInClass  # Max number of stored echo objects
+         self.numStoredObj = 0  # number of rows of "points" filled with a detected object
+         self.numKeptObj = 0  # number of objects that passed the filters of "postprocessData14xx"
+         self.rawObjects = np.zeros(0, dtype=detectedObjDtype)  # detected objects as received (before corrections)
+         self._points = None  # only allocated when a frame is actually parsed
+
+         # Other TLVs, read-only views on the frame bytes (None if not sent, see "guiMonitor" in the radar configuration)
+         # They are flat: the shapes depend on the radar configuration (range bins, Doppler bins, virtual antennas)
+         self.rangeProfile = None  # log magnitude per range bin
+         self.noiseProfile = None  # log magnitude per range bin
+         self.azimuthHeatmap = None  # complex (imag, real) per range bin x virtual antenna
+         self.rangeDopplerHeatmap = None  # log magnitude per range bin x Doppler bin
+         self.stats = None  # timings and CPU loads of the radar
+         self.unknownTlvTypes = []  # TLVs skipped because they are not handled
+
+         # Output of "estimateWaterElevation14xx" (NaN if no water surface found)
+         self.waterRange = np.nan  # [m] distance from the radar to the water surface
+         self.waterElevation = np.nan  # [m] sensor height - water range
+         self.elevationSource = ""  # "profile" or "points"
+
+    @property
+    def points(self):
+        # Max number of stored echo objects, unused rows keep the default values of "RadarDetectedObject"
+        if self._points is None:
+            self._points = radarPointTemplate.repeat(globals.nbrStoredEchoesInClass)
+        return self._points
+
+    @property
+    def objList(self):
+        # Lazy per-echo access, for debug or old code, the objects are views on "points"
+        return [RadarDetectedObjectView(self.points, echoIdx) for echoIdx in range(len(self.points))]
 
 
 class SDKversion:
@@ -150,30 +218,359 @@ class SDKversion:
         self.BugfixNum = 255
         self.BuildNum = 255
 
-# ---------------------- global variables [5]------------------
-
-## Is it really the best way to keep the buffer between 2 radar frames? --> Yes for now
-#global byteBuffer, byteBufferLength
-
-byteBuffer = np.zeros(2**15, dtype='uint8')
-byteBufferLength = 0
-
-# ---------------------- functions [17]-----------------------------------------
-
-# ***********************************************************************************************************************
-def addPointCloudsToClass(classToAdd, nbr_points):
-    ### Function to add point cloud classes in the list of point cloud held by the radar class
-
-    #  Make sure we don't add too many
-    nbr_points = min(globals.nbrStoredEchoesInClass, nbr_points)
+class MagicWordSync:
+    # Incremental search of the magic word in the byte buffer
+    # Only the bytes added since the last call are scanned, the frame starts already found are remembered
+    def __init__(self, magicWord):
+        self.magicWord = np.asarray(magicWord, dtype='uint8')
+        self.scannedLength = 0  # number of bytes at the start of the buffer that have already been searched
+        self.startIdx = np.zeros(0, dtype=np.int64)  # every frame start found so far in the valid region
+
+    def update(self, buffer, bufferLength):
+        ### Search the new bytes of the buffer and return every frame start in buffer[:bufferLength]
+
+        # Go back a bit, a magic word can straddle 2 serial reads
+        scanStart = max(0, self.scannedLength - (len(self.magicWord) - 1))
+
+        if bufferLength - scanStart >= len(self.magicWord):
+            newStartIdx = findMagicWord(buffer[scanStart:bufferLength], self.magicWord) + scanStart
+            if newStartIdx.size:
+                self.startIdx = np.concatenate((self.startIdx, newStartIdx))
+            self.scannedLength = bufferLength
+
+        return self.startIdx
+
+    def discard(self, nbrBytes):
+        ### The first nbrBytes of the buffer have been removed, shift the indexes accordingly
+        self.startIdx = self.startIdx[self.startIdx >= nbrBytes] - nbrBytes
+        self.scannedLength = max(0, self.scannedLength - nbrBytes)
+
+    def reset(self):
+        ### Forget everything, the buffer has been emptied
+        self.startIdx = np.zeros(0, dtype=np.int64)
+        self.scannedLength = 0
+
+class RadarByteRing:
+    # Ring buffer for the bytes received on the radar DATA port, with a read and a write cursor
+    # Every byte is stored twice (at i and at i + capacity): any window of up to 'capacity' bytes is contiguous,
+    # so the parser gets plain slices even across the wrap-around, and consuming data never moves or allocates memory
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.storage = np.zeros(2 * capacity, dtype='uint8')
+        self.readIdx = 0  # total number of bytes consumed since the start
+        self.writeIdx = 0  # total number of bytes written since the start
+        self.droppedBytes = 0  # bytes that could not be stored because the buffer was full
+        self.droppedWrites = 0  # number of writes dropped because the buffer was full
+
+    def __len__(self):
+        return self.writeIdx - self.readIdx
+
+    def free(self):
+        ### Number of bytes that can still be written
+        return self.capacity - len(self)
+
+    def write(self, byteVec):
+        ### Append the bytes at the write cursor, the whole chunk is dropped if it does not fit (same as before)
+        byteCount = len(byteVec)
+        if byteCount > self.free():
+            self.droppedBytes += byteCount
+            self.droppedWrites += 1
+            return False
 
-    for _ in range(nbr_points):  # Max number of stored echo objects, notice throw-away variable
-        classToAdd.objList.append(RadarDetectedObject())
+        writePos = self.writeIdx % self.capacity
+        firstPart = min(byteCount, self.capacity - writePos)
+        secondPart = byteCount - firstPart
+
+        # Main copy + mirror copy
+        self.storage[writePos:writePos + firstPart] = byteVec[:firstPart]
+        self.storage[writePos + self.capacity:writePos + self.capacity + firstPart] = byteVec[:firstPart]
+        if secondPart:
+            self.storage[:secondPart] = byteVec[firstPart:]
+            self.storage[self.capacity:self.capacity + secondPart] = byteVec[firstPart:]
+
+        self.writeIdx += byteCount
+        return True
+
+    def view(self, start=0, stop=None):
+        ### Contiguous numpy view of the unread bytes [start, stop) (relative to the read cursor), no copy
+        if stop is None:
+            stop = len(self)
+        readPos = (self.readIdx + start) % self.capacity
+        return self.storage[readPos:readPos + (stop - start)]
+
+    def memoryview(self, start=0, stop=None):
+        ### Same as view() but as a memoryview
+        return memoryview(self.view(start, stop))
+
+    def consume(self, nbrBytes):
+        ### Move the read cursor forward, nothing is copied
+        self.readIdx += min(nbrBytes, len(self))
+
+    def reset(self):
+        ### Empty the buffer
+        self.readIdx = self.writeIdx
+
+class RadarFrameExtractor:
+    # Cut the byte stream of the radar DATA port into complete frames (ring buffer + magic word sync)
+    def __init__(self, capacity=2**15):
+        self.byteRing = RadarByteRing(capacity)
+        self.magicSync = MagicWordSync(expectedMagicWord)
+        self.discardedBytes = 0  # bytes thrown away because they were not part of a frame
+        self.resyncs = 0  # number of times bytes had to be thrown away to find the next magic word
+
+    def feed(self, byteVec):
+        ### Add the received bytes, returns False if they were dropped because the buffer is full
+        return self.byteRing.write(byteVec)
+
+    def discard(self, nbrBytes):
+        ### Throw away the first bytes of the buffer
+        self.byteRing.consume(nbrBytes)
+        self.magicSync.discard(nbrBytes)
+        self.discardedBytes += nbrBytes
+        if nbrBytes > 0:
+            self.resyncs += 1
+
+    def nextFrame(self):
+        ### Contiguous view of the next complete frame (valid until "consumeFrame"), None if not fully received yet
+
+        minAcceptableBuffSize = 16
+        headerSize = frameHeaderDtype.itemsize
+
+        while len(self.byteRing) > minAcceptableBuffSize:
+
+            # Get all the locations of the magic word (only the bytes received since the last call are searched)
+            startIdx = self.magicSync.update(self.byteRing.view(), len(self.byteRing))
+
+            if not startIdx.size:
+                # No magic word at all: only keep the last bytes, they might be the start of one
+                self.discard(len(self.byteRing) - (len(expectedMagicWord) - 1))
+                return None
+
+            # Remove the data before the first start index (only the read cursor moves)
+            if startIdx[0] > 0:
+                self.discard(int(startIdx[0]))
+
+            if len(self.byteRing) < 16:
+                return None
+
+            # Check that all the packet has been received, otherwise wait for the next call
+            totalPacketLen = int(self.byteRing.view(12, 16).view('<u4')[0])
+            if headerSize <= totalPacketLen <= self.byteRing.capacity:
+                if len(self.byteRing) >= totalPacketLen:
+                    return self.byteRing.view(0, totalPacketLen)
+                return None
+
+            # The length makes no sense: not a real magic word, look for the next one
+            self.discard(1)
+
+        return None
+
+    def consumeFrame(self, totalPacketLen):
+        ### The frame returned by "nextFrame" has been processed, forget it
+        self.byteRing.consume(totalPacketLen)
+        self.magicSync.discard(totalPacketLen)
+
+    def reset(self):
+        ### Throw away the bytes waiting: the next bytes do not follow them (gap in a raw capture)
+        self.discard(len(self.byteRing))
+
+class RadarSerialReader(threading.Thread):
+    # Background thread doing blocking reads on the radar DATA port and queueing the complete frames
+    # The main thread gets them with "getFrame", so parsing and logging never stall the reception
+    # "rawCallback(arrivalTime, bytes)" (optional) gets every read before any parsing, it must not block
+    # "stageTimer" (optional) times the "serialWait" (blocking read), "serialRead" (raw callback + ring buffer)
+    # and "magicSync" stages
+    def __init__(self, dataPort, queueSize, rawCallback=None, stageTimer=None):
+        threading.Thread.__init__(self, name="RadarSerialReader", daemon=True)
+        self.dataPort = dataPort
+        self.rawCallback = rawCallback
+        self.stageTimer = stageTimer or radarProfiling.StageTimer([], enabled=False)
+        self.frameQueue = queue.Queue(maxsize=queueSize)
+        self.extractor = RadarFrameExtractor(2**15)
+        self.stopEvent = threading.Event()
+        self.error = None
+
+        # Counters
+        self.bytesReceived = 0
+        self.framesReceived = 0
+        self.framesDropped = 0  # queue full: the main thread is too slow
+        self.maxQueueDepth = 0
+        self.latencies = collections.deque(maxlen=1000)  # [s] from frame arrival to dequeue, last frames only
+        self.maxLatency = 0.0
+
+    def run(self):
+        try:
+            while not self.stopEvent.is_set():
+                # Blocks until at least 1 byte arrived or the serial timeout expired
+                # "serialWait" is mostly the time waiting for the UART, the cost of the bytes starts after it
+                stamp = self.stageTimer.start()
+                readBuffer = self.dataPort.read(max(1, self.dataPort.in_waiting))
+                if not readBuffer:
+                    continue
+                arrivalTime = time.monotonic()
+                stamp = self.stageTimer.stop("serialWait", stamp)
+                self.bytesReceived += len(readBuffer)
+                if self.rawCallback is not None:
+                    self.rawCallback(arrivalTime, readBuffer)
+                self.extractor.feed(np.frombuffer(readBuffer, dtype='uint8'))
+                stamp = self.stageTimer.stop("serialRead", stamp)
+
+                frame = self.extractor.nextFrame()
+                while frame is not None:
+                    try:
+                        self.frameQueue.put_nowait((arrivalTime, frame.tobytes()))  # copy, the ring will be overwritten
+                        self.framesReceived += 1
+                        self.maxQueueDepth = max(self.maxQueueDepth, self.frameQueue.qsize())
+                    except queue.Full:
+                        self.framesDropped += 1
+                    self.extractor.consumeFrame(len(frame))
+                    frame = self.extractor.nextFrame()
+                self.stageTimer.stop("magicSync", stamp)
 
-    return classToAdd
+        except Exception as e:
+            # Most likely the radar has been unplugged, let the main thread know
+            self.error = e
+            print("Error in the radar DATA serial reader: {}".format(e))
 
-    ## END OF FUNCTION
-# ***********************************************************************************************************************
+    def getFrame(self, timeout):
+        ### Next complete frame (bytes) with its arrival time, (None, None) if nothing arrived before the timeout
+        try:
+            arrivalTime, frameBytes = self.frameQueue.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+        latency = time.monotonic() - arrivalTime
+        self.latencies.append(latency)
+        self.maxLatency = max(self.maxLatency, latency)
+        return arrivalTime, frameBytes
+
+    def stop(self):
+        ### Ask the thread to stop and wait for it (at most one serial timeout)
+        self.stopEvent.set()
+        self.join()
+
+    def statistics(self):
+        ### Counters of the reader, as a dictionary
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1000
+            latencyMean, latencyP95 = float(latencies.mean()), float(np.percentile(latencies, 95))
+        else:
+            latencyMean, latencyP95 = 0.0, 0.0
+
+        return {"bytesReceived": self.bytesReceived,
+                "framesReceived": self.framesReceived,
+                "framesDropped": self.framesDropped,
+                "bytesDroppedBufferFull": self.extractor.byteRing.droppedBytes,
+                "queueDepth": self.frameQueue.qsize(),
+                "maxQueueDepth": self.maxQueueDepth,
+                "latencyMean[ms]": round(latencyMean, 3),
+                "latencyP95[ms]": round(latencyP95, 3),
+                "latencyMax[ms]": round(self.maxLatency * 1000, 3)}
+
+class LinkHealthTracker:
+    # Health of the radar link, from the frame headers ("frameNumber", "timeCpuCycles") and the reader counters
+    #   - gaps/missingFrames: "frameNumber" jumped by more than 1 (overflow, queue full, corrupted frame, ...)
+    #   - duplicates: same "frameNumber" twice, restarts: "frameNumber" went back (radar restarted)
+    #   - clockMismatches: the radar clock ("timeCpuCycles") does not give the same number of frames as "frameNumber"
+    #   - parseFailures: bad magic word, truncated TLVs or frames that could not be decoded at all ("parseFailed")
+    # The resyncs, discarded bytes and overflow drops are read from the reader ("RadarSerialReader", optional)
+    def __init__(self, reader=None, framePeriodSeconds=0.0, cpuFrequencyHz=200e6):
+        self.reader = reader
+        self.cpuFrequencyHz = cpuFrequencyHz
+        self.cyclesPerFrame = framePeriodSeconds * cpuFrequencyHz  # 0: the cycle counter is not checked
+        self.lastFrameNumber = None
+        self.lastTimeCpuCycles = None
+
+        # Counters
+        self.framesChecked = 0
+        self.gaps = 0
+        self.missingFrames = 0
+        self.duplicates = 0
+        self.restarts = 0
+        self.clockMismatches = 0
+        self.parseFailures = 0
+        self.radarPeriods = collections.deque(maxlen=1000)  # [ms] from "timeCpuCycles", consecutive frames only
+        self.lastInterval = {}  # totals at the last "intervalStatistics" call
+
+    def update(self, parsedData):
+        ### Check one parsed frame (called for every frame, even the ones that are not logged)
+        if not parsedData.magicOK or parsedData.truncated:
+            self.parseFailures += 1
+            if not parsedData.magicOK:
+                return
+
+        frameNumber = parsedData.frmhdr.frameNumber
+        timeCpuCycles = parsedData.frmhdr.timeCpuCycles
+        self.framesChecked += 1
+
+        if self.lastFrameNumber is not None:
+            frameDelta = frameNumber - self.lastFrameNumber
+            cyclesDelta = (timeCpuCycles - self.lastTimeCpuCycles) % 2**32  # UNSIGNED 32 bit, wraps every ~21 s
+
+            if frameDelta == 0:
+                self.duplicates += 1
+                return
+            elif frameDelta < 0:
+                self.restarts += 1
+            else:
+                if frameDelta > 1:
+                    self.gaps += 1
+                    self.missingFrames += frameDelta - 1
+                else:
+                    self.radarPeriods.append(cyclesDelta / self.cpuFrequencyHz * 1000)
+
+                # The cycle counter can only be checked if it did not wrap more than once
+                if self.cyclesPerFrame and frameDelta * self.cyclesPerFrame < 2**32:
+                    if round(cyclesDelta / self.cyclesPerFrame) != frameDelta:
+                        self.clockMismatches += 1
+
+        self.lastFrameNumber = frameNumber
+        self.lastTimeCpuCycles = timeCpuCycles
+
+    def parseFailed(self):
+        ### A frame was received but its decoding or post-processing raised an error
+        self.parseFailures += 1
+
+    def statistics(self):
+        ### Totals since the start, as a dictionary
+        statistics = {"framesChecked": self.framesChecked,
+                      "gaps": self.gaps,
+                      "missingFrames": self.missingFrames,
+                      "duplicates": self.duplicates,
+                      "restarts": self.restarts,
+                      "clockMismatches": self.clockMismatches,
+                      "parseFailures": self.parseFailures}
+
+        if self.reader is not None:
+            statistics["resyncs"] = self.reader.extractor.resyncs
+            statistics["bytesDiscarded"] = self.reader.extractor.discardedBytes
+            statistics["overflowDrops"] = self.reader.extractor.byteRing.droppedWrites
+            statistics["bytesDroppedBufferFull"] = self.reader.extractor.byteRing.droppedBytes
+            statistics["framesDroppedQueueFull"] = self.reader.framesDropped
+
+        if self.radarPeriods:
+            radarPeriods = np.array(self.radarPeriods)
+            statistics["radarPeriodMean[ms]"] = round(float(radarPeriods.mean()), 3)
+            statistics["radarPeriodMax[ms]"] = round(float(radarPeriods.max()), 3)
+
+        return statistics
+
+    def intervalStatistics(self):
+        ### Counters since the previous call (same keys as "statistics", the radar period is not a counter)
+        totals = self.statistics()
+        interval = {name: value - self.lastInterval.get(name, 0) for name, value in totals.items() if "[ms]" not in name}
+        self.lastInterval = totals
+        return interval
+
+# ---------------------- global variables [1]------------------
+
+## Is it really the best way to keep the buffer between 2 radar frames? --> Yes for now, but as a ring buffer
+## Only used by "readAndParseData14xx", the reader thread has its own
+#global frameExtractor
+
+frameExtractor = RadarFrameExtractor(2**15)
+
+# ---------------------- functions [29]-----------------------------------------
 
 # ***********************************************************************************************************************
 def displayDebugData(runID):
@@ -206,319 +603,405 @@ def displayDebugData(runID):
     ## END OF FUNCTION
 # ***********************************************************************************************************************
 
-# ***********************************************************************************************************************
-def executeShellAsSudo(command):
-    ### Function to execute the input command as sudo
-    ### As you could fear, it is super insecure and definitely a BAD idea
-    ### And the cherry on top is: we hard code the sudo password
-    ### The cream is: this is the default raspberry pi password
-    ### Use at your own risks
 
-    # source: https://stackoverflow.com/questions/567542/running-a-command-as-a-super-user-from-a-python-script
-    sudo_password = 'raspberry'
-    command = command.split()
 
-    cmd1 = subprocess.Popen(['echo', sudo_password], stdout=subprocess.PIPE)
-    cmd2 = subprocess.Popen(['sudo', '-S'] + command, stdin=cmd1.stdout, stdout=subprocess.PIPE)
+#***********************************************************************************************************************
+def postprocessPoints14xx(points, xyzQFormat, numStoredObj, configParameters):
+    ### Function to apply the corrections and the filters to point clouds, all the echoes at once
+    ### "points" can be one frame (nbrEchoes,) or a batch of frames stacked together (nbrFrames, nbrEchoes)
+    ### "xyzQFormat" and "numStoredObj" are then a scalar or one value per frame
+    ### Returns the mask of the echoes that passed all the filters
 
-    output = cmd2.stdout.read().decode()
-
-    return output
-    ## END OF FUNCTION
-# ***********************************************************************************************************************
+    xyzQFormat = np.asarray(xyzQFormat, dtype=np.float64)[..., np.newaxis]
+    numStoredObj = np.asarray(numStoredObj)[..., np.newaxis]
 
-
-#***********************************************************************************************************************
-def postprocessData14xx(parsedData, configParameters):
-    ### Function to apply the corrections to the data that have been parsed
-    ### This function should be called just after "readAndParseData14xx"
+    # Only the rows holding a detected object are converted
+    rows = np.arange(points.shape[-1]) < numStoredObj
+    rows = np.broadcast_to(rows, points.shape)
 
 
     # Step#1 - Make the necessary corrections and calculate the rest of the data (3)
     # --------------------------------------------------------------------------------
 
-    for objectNum in range(parsedData.frmhdr.numDetectedObj):
-        try:
-            # Correction on distances - 1/3
-            #------------------------------
-            parsedData.objList[objectNum].x = parsedData.objList[objectNum].x / parsedData.tlv_xyzQFormat
-            parsedData.objList[objectNum].y = parsedData.objList[objectNum].y / parsedData.tlv_xyzQFormat
-            parsedData.objList[objectNum].z = parsedData.objList[objectNum].z / parsedData.tlv_xyzQFormat
+    # Correction on distances - 1/3
+    #------------------------------
+    x = np.where(rows, points['x'] / xyzQFormat, points['x'])
+    y = np.where(rows, points['y'] / xyzQFormat, points['y'])
+    z = np.where(rows, points['z'] / xyzQFormat, points['z'])
 
-            # Correction on range - 2/3
-            # --------------------------
-            parsedData.objList[objectNum].rangeVal = \
-                parsedData.objList[objectNum].rangeIdx * configParameters["rangeIdxToMeters"]
+    # Correction on range - 2/3
+    # --------------------------
+    rangeVal = points['rangeIdx'] * configParameters["rangeIdxToMeters"]
 
-            # Correction on doppler - 3/3
-            # ------------------------------
-            # The following monstrosity (from what I could understand at least) uses the equivalence True = 1 and
-            # False = 0 as indexes, commented out until I understand better
+    # Correction on doppler - 3/3
+    # ------------------------------
+    # first 1/2 of the bins are >0 (no change) and the second 1/2 are <0 (- numDopplerBins)
+    dopplerIdx = points['dopplerIdx'].astype(np.int32)
+    numDopplerBins = int(configParameters["numDopplerBins"])
+    dopplerIdx = np.where(dopplerIdx > (numDopplerBins / 2 - 1), dopplerIdx - numDopplerBins, dopplerIdx)
+    dopplerVal = dopplerIdx * configParameters["dopplerResolutionMps"]
 
-            # calculate azimuth/elevation AND range (rectangular to spherical coordinates)
+    # calculate azimuth/elevation (rectangular to spherical coordinates), in [deg]
+    azmth = np.degrees(np.arctan2(x, y))
+    elv = np.degrees(np.arctan2(z, np.hypot(x, y)))
 
-            #parsedData.objList[objectNum].dopplerIdx[parsedData.objList[objectNum].dopplerIdx > (configParameters["numDopplerBins"] / 2 - 1)] = parsedData.objList[objectNum].dopplerIdx[parsedData.objList[objectNum].dopplerIdx > (configParameters["numDopplerBins"] / 2 - 1)] - 65535
+    points['x'] = x
+    points['y'] = y
+    points['z'] = z
+    points['rangeVal'] = np.where(rows, rangeVal, points['rangeVal'])
+    points['dopplerVal'] = np.where(rows, dopplerVal, points['dopplerVal'])
+    points['velocity'] = points['dopplerVal']
+    points['azmth'] = np.where(rows, azmth, points['azmth'])
+    points['elv'] = np.where(rows, elv, points['elv'])
 
-            parsedData.objList[objectNum].dopplerVal = parsedData.objList[objectNum].dopplerIdx * configParameters[
-                "dopplerResolutionMps"]
+    # indicate we performed the post-processing on those objects
+    points['isConverted'] |= rows
 
-            # first 1/2 of the bins are >0 (no change) and the second 1/2 are <0 (-65535)
-            # if parsedData.objList[objectNum].dopplerIdx < (configParameters["numDopplerBins"] / 2 - 1):
-            #     parsedData.objList[objectNum].dopplerVal = parsedData.objList[objectNum].dopplerVal - 65535
 
+    # Step#2 - Filter echoes to only get the water elevation
+    # -------------------------------------------------------
+    # A missing threshold does not filter anything
 
-            # x[x > 32767] = x[x > 32767] - 65536
-            # y[y > 32767] = y[y > 32767] - 65536
-            # z[z > 32767] = z[z > 32767] - 65536
+    keep = rows & points['isValid']
 
-            # indicate we performed the post-processing on that object
-            parsedData.objList[objectNum].isConverted = True
+    # Sort the azimuth - 1/3
+    keep &= np.abs(points['azmth']) <= configParameters.get("azimuthThreshold", np.inf)
 
+    # Sort the velocity - 2/3
+    keep &= points['dopplerVal'] >= configParameters.get("velocityThresholdMin", -np.inf)
+    keep &= points['dopplerVal'] <= configParameters.get("velocityThresholdMax", np.inf)
 
-            # Step#2 - Filter echoes to only get the water elevation
-            # -------------------------------------------------------
+    # Sort the range - 3/3
+    keep &= points['rangeVal'] >= configParameters.get("rangeThresholdMin", -np.inf)
+    keep &= points['rangeVal'] <= configParameters.get("rangeThresholdMax", np.inf)
 
+    # Sort the SNR or RSSI - peakVal
+    keep &= points['peakVal'] >= configParameters.get("peakValThreshold", 0)
 
-            # Sort the azimuth - 1/3 configParameters["azimuthThreshold"]
-            # Sort the velocity( or doppler?) - 2/3 configParameters["velocityThresholdMin"] configParameters["velocityThresholdMax"]
-            # Sort the range - 3/3 configParameters["rangeThresholdMin"] configParameters["rangeThresholdMax"]
-            # Sort the SNR or RSSI - peakVal
+    points['isKept'] = keep
 
-        # when there is an error on a point cloud, just leave "isConverted" as False and continue trying
-        except Exception as inst:
-            print(type(inst))  # the exception instance
-            print(inst.args)  # arguments stored in .args
-            print(inst)
-            pass
+    return keep
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+#***********************************************************************************************************************
+def postprocessData14xx(parsedData, configParameters):
+    ### Function to apply the corrections to the data that have been parsed
+    ### This function should be called just after "readAndParseData14xx"
+
+    try:
+        keep = postprocessPoints14xx(parsedData.points, parsedData.tlv_xyzQFormat, parsedData.numStoredObj,
+                                     configParameters)
+        parsedData.numKeptObj = int(np.count_nonzero(keep))
+
+    # when there is an error, just leave "isConverted" as False
+    except Exception as inst:
+        print(type(inst))  # the exception instance
+        print(inst.args)  # arguments stored in .args
+        print(inst)
+        pass
 
     return parsedData
     ## END OF FUNCTION
 # ***********************************************************************************************************************
 
 #***********************************************************************************************************************
-def readAndParseData14xx(Dataport):
-    ### Function to read and parse the incoming radar data
+def findRangeProfilePeak(rangeProfile, firstBin, lastBin):
+    ### Function to find the strongest range bin between firstBin and lastBin (included) of a range profile
+    ### The position is refined with a parabola through the peak and its 2 neighbours (sub-bin, in [bins])
+    ### Returns NaN if there is no bin in the window
 
-    global byteBuffer, byteBufferLength
+    firstBin = max(int(firstBin), 0)
+    lastBin = min(int(lastBin), len(rangeProfile) - 1)
+    if lastBin < firstBin:
+        return np.nan
 
-    # instantiate an empty class-struct to store the retrieved data
-    parsedData = RadarData()
-    parsedData = addPointCloudsToClass(parsedData, globals.nbrStoredEchoesInClass)
+    window = rangeProfile[firstBin:lastBin + 1]
+    peakBin = firstBin + int(np.argmax(window))
+    if peakBin == 0 or peakBin == len(rangeProfile) - 1:
+        return float(peakBin)  # no neighbour on one side
 
-    # Constants
-    #------------
-    # TODO: all of those should be in the ini file
-    MMWDEMO_UART_MSG_DETECTED_POINTS = 1
-    # 1 Detected Points
-    # 2 Range Profile
-    # 3 Noise Floor Profile
-    # 4 Azimuth Static Heatmap
-    # 5 Range-Doppler Heatmap
-    # 6 Statistics (Performance)
-    # 7 Side Info for Detected Points
-    # 8 Azimuth/Elevation Static Heatmap
-    # 9 Temperature Statistics
+    left, centre, right = rangeProfile[peakBin - 1:peakBin + 2].astype(np.float64)
+    curvature = left - 2 * centre + right
+    delta = 0.5 * (left - right) / curvature if curvature < 0 else 0.0
+
+    return peakBin + delta
 
-    # var
-    # TLV_type = {
-    #     MMWDEMO_OUTPUT_MSG_DETECTED_POINTS: 1,
-    #     MMWDEMO_OUTPUT_MSG_RANGE_PROFILE: 2,
-    #     MMWDEMO_OUTPUT_MSG_NOISE_PROFILE: 3,
-    #     MMWDEMO_OUTPUT_MSG_AZIMUT_STATIC_HEAT_MAP: 4,
-    #     MMWDEMO_OUTPUT_MSG_RANGE_DOPPLER_HEAT_MAP: 5,
-    #     MMWDEMO_OUTPUT_MSG_STATS: 6,
-    #     MMWDEMO_OUTPUT_MSG_MAX: 7
-    # };
-
-    maxBufferSize = 2 ** 15  # in bytes
-    expectedMagicWord = [2, 1, 4, 3, 6, 5, 8, 7]
-    minAcceptableBuffSize = 16
-
-    # word array to convert 4 bytes to a 32 bit number
-    word_4_32 = [2 ** 0, 2 ** 8, 2 ** 16, 2 ** 24]
-    # word array to convert 4 bytes to a 16 bit number
-    word_4_16 = word_4_32[:2]
-    # word array to convert 4 bytes to a 8 bit number
-    word_4_8 = word_4_32[:1]
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
+#***********************************************************************************************************************
+def estimateWaterElevation14xx(parsedData, configParameters):
+    ### Function to compute the water elevation of one frame, to be called after "postprocessData14xx"
+    ### 1st choice: peak of the range profile (if the radar sends it, see "guiMonitor") within the range thresholds
+    ### 2nd choice: detected points that passed the filters, peakVal-weighted range of the strongest echo and
+    ###             of the echoes less than one range resolution away from it
+    ### The elevation is "sensorHeight" (height of the radar above the datum) minus the range to the water
+
+    elevationSource = configParameters.get("elevationSource", "auto")
+    waterRange = np.nan
+
+    # Range profile: O(number of range bins)
+    if parsedData.rangeProfile is not None and elevationSource in ["auto", "profile"]:
+        rangeIdxToMeters = configParameters["rangeIdxToMeters"]
+        firstBin = np.ceil(configParameters.get("rangeThresholdMin", 0) / rangeIdxToMeters)
+        lastBin = np.floor(min(configParameters.get("rangeThresholdMax", np.inf), 1e6) / rangeIdxToMeters)
+        waterRange = findRangeProfilePeak(parsedData.rangeProfile, firstBin, lastBin) * rangeIdxToMeters
+        parsedData.elevationSource = "profile"
+
+    # Detected points: O(number of echoes)
+    if np.isnan(waterRange) and parsedData.numKeptObj > 0 and elevationSource in ["auto", "points"]:
+        points = parsedData.points[parsedData.points['isKept']]
+        weights = points['peakVal'].astype(np.float64)
+        strongest = points['rangeVal'][np.argmax(weights)]
+        close = np.abs(points['rangeVal'] - strongest) <= configParameters["rangeResolutionMeters"]
+        if weights[close].sum() > 0:
+            waterRange = float(np.average(points['rangeVal'][close], weights=weights[close]))
+        else:
+            waterRange = float(strongest)
+        parsedData.elevationSource = "points"
 
-    ## Nate: Read data from the radar DATA serial data port
-    readBuffer = Dataport.read(Dataport.in_waiting)
-    byteVec = np.frombuffer(readBuffer, dtype='uint8')
-    del readBuffer
-    byteCount = len(byteVec)  # Nate: count how many bytes have been received through the serial port
+    if np.isnan(waterRange):
+        parsedData.elevationSource = ""
 
-    # Check that the buffer is not full, and then add the data to the buffer
-    if (byteBufferLength + byteCount) < maxBufferSize:
-        byteBuffer[byteBufferLength:byteBufferLength + byteCount] = byteVec[:byteCount]
-        byteBufferLength = byteBufferLength + byteCount
+    parsedData.waterRange = waterRange
+    parsedData.waterElevation = configParameters.get("sensorHeight", 0.0) - waterRange
 
-    # Check that the buffer has some data
-    if byteBufferLength > minAcceptableBuffSize:
+    return parsedData
 
-        # Check for all possible locations of the magic word
-        possibleLocs = np.where(byteBuffer == expectedMagicWord[0])[0]  # look for the first char only
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-        # Confirm if the occurrences found are indeed the beginning of a magic word, store the index in startIdx if True
-        startIdx = []
-        for loc in possibleLocs:
-            check = byteBuffer[loc:loc + 8]
-            if np.all(check == expectedMagicWord):
-                startIdx.append(loc)
+#***********************************************************************************************************************
+def decodeFrameHeader14xx(byteBuffer, frmhdr):
+    ### Function to decode the frame header in one go and store it in the "RadarFrameHeader" class "frmhdr"
+    ### Returns the index of the first byte after the header
+
+    frmhdr.raw = np.frombuffer(byteBuffer, dtype=frameHeaderDtype, count=1).copy()
+    header = frmhdr.raw[0]
+
+    frmhdr.magicNumber = header['magicNumber'].copy()
+    frmhdr.sdkVersion.BuildNum = int(header['BuildNum'])
+    frmhdr.sdkVersion.BugfixNum = int(header['BugfixNum'])
+    frmhdr.sdkVersion.MinorNum = int(header['MinorNum'])
+    frmhdr.sdkVersion.MajorNum = int(header['MajorNum'])
+    frmhdr.totalPacketLen = int(header['totalPacketLen'])
+    frmhdr.platform = format(int(header['platform']), 'x')  # this is a text looking like "a1443"
+    frmhdr.frameNumber = int(header['frameNumber'])
+    frmhdr.timeCpuCycles = int(header['timeCpuCycles'])  # UNSIGNED 32 bit
+    frmhdr.numDetectedObj = int(header['numDetectedObj'])
+    frmhdr.numTLVs = int(header['numTLVs'])
+
+    return frameHeaderDtype.itemsize
 
-        ## Check if the magic number is good
-        parsedData.magicNumber = byteBuffer[startIdx[0]:startIdx[0] + 8]
-        parsedData.magicOK = (parsedData.magicNumber == expectedMagicWord).all()
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-        # Check that startIdx is not empty
-        if startIdx:
+#***********************************************************************************************************************
+def decodeDetectedObjects14xx(byteBuffer, idX, tlv_length):
+    ### Function to decode the payload of a MMWDEMO_UART_MSG_DETECTED_POINTS TLV starting at idX ("tlv_length" bytes)
+    ### Returns the Q format (as 2^N), all the objects as a structured array (x, y, z are signed) and False if the
+    ### object count of the descriptor does not fit in the TLV (corrupted frame: only the objects that fit are returned)
 
-            # Remove the data before the first start index
-            if 0 < startIdx[0] < byteBufferLength:
-                byteBuffer[:byteBufferLength - startIdx[0]] = byteBuffer[startIdx[0]:byteBufferLength]
-                byteBuffer[byteBufferLength - startIdx[0]:] = np.zeros(len(byteBuffer[byteBufferLength - startIdx[0]:]),
-                                                                       dtype='uint8')
-                byteBufferLength = byteBufferLength - startIdx[0]
+    if tlv_length < detectedObjDescrDtype.itemsize:
+        return 1, np.zeros(0, dtype=detectedObjDtype), False
 
+    descr = np.frombuffer(byteBuffer, dtype=detectedObjDescrDtype, count=1, offset=idX)[0]
+    numDetectedObj = int(descr['numDetectedObj'])
+    count = min(numDetectedObj, (tlv_length - detectedObjDescrDtype.itemsize) // detectedObjDtype.itemsize)
+    objects = np.frombuffer(byteBuffer,
+                            dtype=detectedObjDtype,
+                            count=count,
+                            offset=idX + detectedObjDescrDtype.itemsize)
 
+    return 2 ** int(descr['xyzQFormat']), objects, count == numDetectedObj
 
-            # Check that there have no errors with the byte buffer length
-            if byteBufferLength < 0:
-                byteBufferLength = 0
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-            # This code is just outrageously bad, optimised-out
-            #--------------------------------------------------
-            # # Read the total packet length
-            # totalPacketLen = np.matmul(byteBuffer[12:12 + 4], word_4_32)
-            # parsedData.frmhdr.totalPacketLen = np.matmul(byteBuffer[12:12 + 4], word_4_32)
-            #
-            # # Check that all the packet has been read
-            # if (byteBufferLength >= totalPacketLen) and (byteBufferLength != 0):
-            #     parsedData.magicOK = 1
+#***********************************************************************************************************************
+def decodeTlvPayload14xx(parsedData, tlv_type, payload):
+    ### Function to store the payload (uint8 array) of a TLV other than the detected points in "parsedData"
+    ### The arrays are views on the frame bytes: nothing is copied, whatever the size of the heatmaps
+
+    def viewAs(dtype):
+        # a corrupted length may not be a multiple of the element size, the incomplete element is ignored
+        return payload[:len(payload) - len(payload) % dtype.itemsize].view(dtype)
+
+    if tlv_type == MMWDEMO_UART_MSG_RANGE_PROFILE:
+        parsedData.rangeProfile = viewAs(rangeProfileDtype)
+    elif tlv_type == MMWDEMO_UART_MSG_NOISE_PROFILE:
+        parsedData.noiseProfile = viewAs(rangeProfileDtype)
+    elif tlv_type == MMWDEMO_UART_MSG_AZIMUT_STATIC_HEAT_MAP:
+        parsedData.azimuthHeatmap = viewAs(azimuthHeatmapDtype)
+    elif tlv_type == MMWDEMO_UART_MSG_RANGE_DOPPLER_HEAT_MAP:
+        parsedData.rangeDopplerHeatmap = viewAs(rangeDopplerHeatmapDtype)
+    elif tlv_type == MMWDEMO_UART_MSG_STATS:
+        stats = viewAs(statsDtype)
+        if len(stats):
+            parsedData.stats = stats[0]
+    else:
+        parsedData.unknownTlvTypes.append(tlv_type)
 
-    # in the "C:\Users\Nathan\guicomposer\runtime\gcruntime.v6\mmWave_Demo_Visualizer\app\mmWave.js",
-    # look for "var process1 = function (bytevec)", line 1378
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
+#***********************************************************************************************************************
+def readAndParseData14xx(Dataport):
+    ### Function to read and parse the incoming radar data
+    ### Returns an empty "RadarData" (magicOK and dataOK False) if no complete frame has been received yet
 
-    # Process the message only if the magic word has been found
-    if parsedData.magicOK:
+    global frameExtractor
 
-        # Initialize the pointer index to the global byteBuffer
-        idX = 0
+    ## Nate: Read data from the radar DATA serial data port
+    readBuffer = Dataport.read(Dataport.in_waiting)
+    byteVec = np.frombuffer(readBuffer, dtype='uint8')
+    del readBuffer
 
-        # Read the header + apply the word
-        parsedData.frmhdr.magicNumber = byteBuffer[idX:idX + 8]
-        idX += 8
+    # Check that the buffer is not full, and then add the data to the buffer (dropped otherwise)
+    frameExtractor.feed(byteVec)
 
-        # parsedData.frmhdr.version = format(np.matmul(byteBuffer[idX:idX + 4], word_4_32), 'x') # looks like "2010004", should be 2.1.4
-        # idX += 4
+    # Process the message only if a complete frame has been found
+    frame = frameExtractor.nextFrame()
+    if frame is None:
+        # instantiate an empty class-struct
+        return RadarData()
 
-        # REMEMBER: LSB !!!!!
-        # SDK Version represented as (MajorNum x 2^24 + MinorNum x 2^16 + BugfixNum x 2^8 + BuildNum)
-        parsedData.frmhdr.sdkVersion.BuildNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
-        idX += 1
-        parsedData.frmhdr.sdkVersion.BugfixNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
-        idX += 1
-        parsedData.frmhdr.sdkVersion.MinorNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
-        idX += 1
-        parsedData.frmhdr.sdkVersion.MajorNum = np.matmul(byteBuffer[idX:idX + 1], word_4_8)
-        idX += 1
+    parsedData = parseFrame14xx(frame.tobytes())  # copy: the TLV views must outlive the ring buffer
 
+    # Remove already processed data (only the read cursor moves)
+    frameExtractor.consumeFrame(len(frame))
 
+    return parsedData
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-        parsedData.frmhdr.totalPacketLen = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-        idX += 4
-        parsedData.frmhdr.platform = format(np.matmul(byteBuffer[idX:idX + 4], word_4_32), 'x') # this is a text looking like "a1443"
-        idX += 4
-        parsedData.frmhdr.frameNumber = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-        idX += 4
-        parsedData.frmhdr.timeCpuCycles = np.matmul(byteBuffer[idX:idX + 4], word_4_32).astype(np.uint32) ## make sure it is understood as UNSIGNED 32 bit
-        idX += 4
-        parsedData.frmhdr.numDetectedObj = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-        idX += 4
-        parsedData.frmhdr.numTLVs = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-        idX += 4
+#***********************************************************************************************************************
+def parseFrame14xx(byteBuffer):
+    ### Function to parse one complete radar frame (bytes or uint8 array starting with the magic word)
 
-        # save the binary data in the class
-        if globals.saveBinaryDebug:
-            parsedData.binData = byteBuffer[:parsedData.frmhdr.totalPacketLen]
-
-        ## UNCOMMENT IN CASE OF SDK 2
-        #subFrameNumber = np.matmul(byteBuffer[idX:idX+4],word_4_32)
-        #idX += 4
-        # // subFrame number, uint32
-        # if (((Params.platform == mmwInput.Platform.xWR16xx) | | (Params.platform == mmwInput.Platform.xWR18xx)) & & (
-        #     Params.tlv_version_uint16 >= 0x0101))
-
-        # Read through all the TLV messages one by one
-        for tlvIdx in range(parsedData.frmhdr.numTLVs):
-
-            # Check the header of the TLV message
-            tlv_type = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-            idX += 4
-            # tlv_length = np.matmul(byteBuffer[idX:idX + 4], word_4_32)
-            idX += 4
-
-            # Parse the buffer data differently depending on the TLV message
-            if tlv_type == MMWDEMO_UART_MSG_DETECTED_POINTS:
-
-                # list of detected objects, each is
-                # typedef volatile struct MmwDemo_detectedObj_t {
-                #    uint16_t   rangeIdx;     Range index
-                #    uint16_t   dopplerIdx;   Dopler index
-                #    uint16_t  peakVal;       Peak value
-                #    int16_t  x;              x - coordinate in meters. Q format depends on the range resolution
-                #    int16_t  y;              y - coordinate in meters. Q format depends on the range resolution
-                #    int16_t  z;              z - coordinate in meters. Q format depends on the range resolution
-                # }
-
-                tlv_numObj = np.matmul(byteBuffer[idX:idX + 2], word_4_16)  # TODO: is it the same as "parsedData.frmhdr.numDetectedObj" ?
-                idX += 2
-                parsedData.tlv_xyzQFormat = 2 ** np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                idX += 2
-
-                for objectNum in range(tlv_numObj):
-                    if (objectNum <= globals.nbrStoredEchoesInClass-1):  # limit the detected object list to the size we have allocated
-
-                        # Read the data for each object
-
-                        parsedData.objList[objectNum].echoNumber = objectNum # personal counter for integrity check
-                        ## no increment here because we didn't parse
-                        parsedData.objList[objectNum].rangeIdx = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].dopplerIdx = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].peakVal = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].x = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].y = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].z = np.matmul(byteBuffer[idX:idX + 2], word_4_16)
-                        idX += 2
-                        parsedData.objList[objectNum].isValid = True  # indicates that this object can be used later in post-processing
-
-                        # the corrections on the retrieved values are applied later in the function called "postprocessData14xx"
-
-                parsedData.dataOK = True
-
-        # Remove already processed data
-        if idX > 0 and byteBufferLength > idX:
-            shiftSize = parsedData.frmhdr.totalPacketLen
-
-            byteBuffer[:byteBufferLength - shiftSize] = byteBuffer[shiftSize:byteBufferLength]
-            byteBuffer[byteBufferLength - shiftSize:] = np.zeros(len(byteBuffer[byteBufferLength - shiftSize:]),
-                                                                 dtype='uint8')
-            byteBufferLength = byteBufferLength - shiftSize
-
-            # Check that there are no errors with the buffer length
-            if byteBufferLength < 0:
-                byteBufferLength = 0
+    # instantiate an empty class-struct to store the retrieved data
+    parsedData = RadarData()
+
+    # TLV types (see "radarFormats.py")
+    # 1 Detected Points
+    # 2 Range Profile
+    # 3 Noise Floor Profile
+    # 4 Azimuth Static Heatmap
+    # 5 Range-Doppler Heatmap
+    # 6 Statistics (Performance)
+    # 7 Side Info for Detected Points
+    # 8 Azimuth/Elevation Static Heatmap
+    # 9 Temperature Statistics
+
+    # in the "C:\Users\Nathan\guicomposer\runtime\gcruntime.v6\mmWave_Demo_Visualizer\app\mmWave.js",
+    # look for "var process1 = function (bytevec)", line 1378
+
+    byteBuffer = np.frombuffer(byteBuffer, dtype='uint8')
+
+    ## Check if the magic number is good
+    parsedData.magicNumber = byteBuffer[:8]
+    parsedData.magicOK = len(parsedData.magicNumber) == len(expectedMagicWord) and \
+                         (parsedData.magicNumber == expectedMagicWord).all()
+    if not parsedData.magicOK:
+        return parsedData
+
+    # Read the header, all the fields at once
+    if len(byteBuffer) < frameHeaderDtype.itemsize:
+        parsedData.truncated = True
+        return parsedData
+    idX = decodeFrameHeader14xx(byteBuffer, parsedData.frmhdr)
+
+    # save the binary data in the class
+    if globals.saveBinaryDebug:
+        parsedData.binData = byteBuffer[:parsedData.frmhdr.totalPacketLen].tobytes()  # copy, the ring will be overwritten
+
+    ## UNCOMMENT IN CASE OF SDK 2
+    #subFrameNumber = np.matmul(byteBuffer[idX:idX+4],word_4_32)
+    #idX += 4
+    # // subFrame number, uint32
+    # if (((Params.platform == mmwInput.Platform.xWR16xx) | | (Params.platform == mmwInput.Platform.xWR18xx)) & & (
+    #     Params.tlv_version_uint16 >= 0x0101))
+
+    # Read through all the TLV messages one by one, "tlv_length" (payload only) gives the start of the next one
+    for tlvIdx in range(parsedData.frmhdr.numTLVs):
+
+        # Check the header of the TLV message
+        if idX + tlvHeaderDtype.itemsize > len(byteBuffer):
+            parsedData.truncated = True
+            break
+        tlvHeader = np.frombuffer(byteBuffer, dtype=tlvHeaderDtype, count=1, offset=idX)[0]
+        tlv_type = int(tlvHeader['type'])
+        tlv_length = int(tlvHeader['length'])
+        idX += tlvHeaderDtype.itemsize
+        if idX + tlv_length > len(byteBuffer):
+            parsedData.truncated = True
+            break
+
+        # Parse the buffer data differently depending on the TLV message
+        if tlv_type == MMWDEMO_UART_MSG_DETECTED_POINTS:
+
+            # the corrections on the retrieved values are applied later in the function called "postprocessData14xx"
+            parsedData.tlv_xyzQFormat, objects, objectsOK = decodeDetectedObjects14xx(byteBuffer, idX, tlv_length)
+            if not objectsOK:
+                # The object count does not match the TLV length: corrupted frame, not used
+                parsedData.truncated = True
+                break
+
+            # limit the detected object list to the size we have allocated, copy all the columns at once
+            nbrObj = min(len(objects), globals.nbrStoredEchoesInClass)
+            points = parsedData.points
+            for field in detectedObjDtype.names:
+                points[field][:nbrObj] = objects[field][:nbrObj]
+            points['echoNumber'][:nbrObj] = np.arange(nbrObj) # personal counter for integrity check
+            points['isValid'][:nbrObj] = True  # indicates that this object can be used later in post-processing
+            parsedData.numStoredObj = nbrObj
+            parsedData.rawObjects = objects[:nbrObj].copy()
+
+            parsedData.dataOK = True
+
+        else:
+            # Everything else is only a view on the frame bytes (no copy, no decoding)
+            decodeTlvPayload14xx(parsedData, tlv_type, byteBuffer[idX:idX + tlv_length])
+
+        idX += tlv_length
 
     return parsedData
     ## END OF FUNCTION
 #***********************************************************************************************************************
 
+#***********************************************************************************************************************
+def formatRadarFrame(parsedData, time_ms):
+    ### Function to turn a parsed frame into one line of the data log (header, then the echoes one by one)
+
+    # Add the header to the finalFrame
+    finalFrame = globals.headerFormat.format(
+        time_ms,
+        parsedData.frmhdr.magicNumber,
+        #parsedData.frmhdr.version,
+        parsedData.frmhdr.sdkVersion.MajorNum,
+        parsedData.frmhdr.sdkVersion.MinorNum,
+        parsedData.frmhdr.sdkVersion.BugfixNum,
+        parsedData.frmhdr.sdkVersion.BuildNum,
+        parsedData.frmhdr.totalPacketLen,
+        parsedData.frmhdr.platform,
+        parsedData.frmhdr.frameNumber,
+        parsedData.frmhdr.timeCpuCycles,
+        parsedData.frmhdr.numDetectedObj,
+        parsedData.frmhdr.numTLVs,
+        parsedData.tlv_xyzQFormat,
+        parsedData.waterElevation)  # init
+
+    # Add the echoes, the whole point cloud is converted to python values in one go
+    echoes = parsedData.points[radarPointLogFields][:globals.nbrEchosDisplayed].tolist()
+    echoStrings = [globals.singleEchoFormat.format(cnt_echo, *echo) for cnt_echo, echo in enumerate(echoes)]
+
+    return globals.echoSeparator.join([finalFrame] + echoStrings)
+
+    ## END OF FUNCTION
+#***********************************************************************************************************************
+
 #***********************************************************************************************************************
 def stopLogger(loggerObject):
     ### delete all the loggers
@@ -534,82 +1017,49 @@ def stopLogger(loggerObject):
 #***********************************************************************************************************************
 
 #***********************************************************************************************************************
-def listSerialports():
-    # Find and return a list of all EiBotBoard units
-    # connected via USB port.
-
-    # check platform
-    CurrentOS = platform.system()
-    if (CurrentOS == 'Windows' or CurrentOS == 'win32'):
-        ports = ['COM%s' % (i + 1) for i in range(256)]
-    elif CurrentOS == 'Linux':
-        ## this might be problematic if the user uses a linux platform for DEBUG
-        # this excludes your current terminal "/dev/tty"
-        ports = glob.glob('/dev/tty[A-Za-z]*')
-    else:
-        print("Operating system not supported")
-        # raise EnvironmentError('Unsupported platform')
+def checkSerialPortOpens(serialName):
+    ### Check a serial port can be opened (and close it straight away)
+
+    try:
+        s = serial.Serial(serialName)
+        s.close()
+        return True
+    except (OSError, serial.SerialException):
         return False
-        # 'win32'   for Windows(Win32)
-        # 'cygwin'  for Windows(cygwin)
-        # 'darwin'  for macOS
-        # 'aix'     for AIX
-
 
-    #init
-    result = []
-    # loop on the available serial ports and open and close them to check
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
-
-    if globals.debugPrint:
-        print(result)
-
-    return result
-
-    ## END OF FUNCTION
+   ## END OF FUNCTION
 #***********************************************************************************************************************
 
 #***********************************************************************************************************************
-def checkRadarSerialPort(serialNameCFG, serialNameDATA):
+def checkRadarSerialPort(serialNameCFG, serialNameDATA, radarUsbId=radarPorts.xds110UsbId,
+                         cliInterface=radarPorts.xds110CliInterface, dataInterface=radarPorts.xds110DataInterface,
+                         autoDetect=True):
     ## Check the radar USB cable is plugged in and accessible
+    ## Returns (both ports good, CFG port name, DATA port name)
+    ## The ports of the radar board are found from their USB attributes (no port opened), they replace the configured ones
 
-    # Get the list of available serial port
-    if globals.debugPrint:
-        print(listSerialports())
+    if autoDetect:
+        cliPort, dataPort = radarPorts.findRadarPorts(radarUsbId, cliInterface, dataInterface)
+        print("Radar ports from the USB attributes ({}): CLI {}, DATA {}".format(radarUsbId, cliPort, dataPort))
 
-    # Check there is at least 2 usable serial ports
-    if (len(listSerialports()) >= 0): # TODO Should be 2
+        if cliPort is not None and dataPort is not None:
+            if (cliPort, dataPort) != (serialNameCFG, serialNameDATA):
+                print("The ports of the logger parameters ({}, {}) are replaced by the ones found".format(serialNameCFG, serialNameDATA))
+            return True, cliPort, dataPort
 
-        ## check that DATAserial and CFGserial are different
-        if (True): # TODO Should be "serialNameCFG != serialNameDATA"
+    # Radar board not found (e.g. pseudo-terminals of the simulator, symbolic links): only the 2 configured ports are opened
 
-            # Check if the serial port that was in the logger config.ini file can be found in the list of available serial port
+    # Check the config serial port 1st
+    CFGserialGood = checkSerialPortOpens(serialNameCFG)
+    print("CFGserialGood?: {}".format(CFGserialGood))
 
-            # Check the config serial port 1st
-            CFGserialGood = serialNameCFG in listSerialports()
-            print("CFGserialGood?: {}".format(CFGserialGood))
+    # Check the data serial port 2nd
+    DATAserialGood = checkSerialPortOpens(serialNameDATA)
+    print("DATAserialGood?: {} ".format(DATAserialGood))
 
-            # Check the data serial port 2nd
-            DATAserialGood = serialNameDATA in listSerialports()
-            print("DATAserialGood?: {} ".format(DATAserialGood))
+    print("Both serial ports good?: {}".format(CFGserialGood and DATAserialGood))
 
-            print("Both serial ports good?: {}".format(CFGserialGood and DATAserialGood))
-
-            return (CFGserialGood and DATAserialGood)
-
-        else:
-            print("The 2 serial port provided for the radar are the same BUT should be DIFFERENT")
-            return False
-
-    else:
-        print("Not enough available serial ports, at least 2 needed: {} available".format(len(listSerialports())))
-        return False
+    return (CFGserialGood and DATAserialGood), serialNameCFG, serialNameDATA
 
 
     ## END OF FUNCTION
@@ -617,7 +1067,8 @@ def checkRadarSerialPort(serialNameCFG, serialNameDATA):
 
 #***********************************************************************************************************************
 def checkUSBDrivePresent(usbDriveName):
-    ### Check the USB drive is plugged in on the RPi so we can save the data there
+    ### Check the USB drive is plugged in and mounted on the RPi so we can save the data there
+    ### Returns (present, mount point of the drive), found in /proc/mounts (no subprocess)
 
     print("Checking the USB drive is plugged on the RPi")
 
@@ -630,51 +1081,19 @@ def checkUSBDrivePresent(usbDriveName):
         return True, ""
     elif CurrentOS == 'Linux':
 
-        # init
-        usbPresent = False
-        usbName = ""
-
-        ## this might be problematic if the user uses a linux platform for DEBUG
-        # Step 1/3 check the USB devices, there should be one from the USB drive manufacturer
-        print("What are the USB device connected to the pi?")
-        shellAnswer = subprocess.run(['lsusb'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print("Data out: \r\n{}".format(shellAnswer.stdout.decode()))
-        print("Any error?: {}".format(shellAnswer.stderr.decode()))
-
-        if ( len(shellAnswer.stdout.decode()) > 0 and shellAnswer.stderr.decode()=="" ):
-
-            # Step 1/3 check the devices, there should be a sda1
-            # ls /dev/sd*
-            # /dev/sda  /dev/sda1
-            print("Is there a device connected to the pi?")
-            # With the next command, I cannot do: ls /dev/sd*
-            #       ls: cannot access '/dev/sd*': No such file or directory
-            #       shellAnswer = "/dev/sdb\n/dev/sda1\n/dev/ddaf\n/dev/sda2\n/dev/pthb\n/dev/sda50\n"
-            # usbDriveName = "sda1"
-            shellAnswer = executeShellAsSudo('ls /dev')
-            # print("Data out: {}".format(shellAnswer))
-            shellAnswer = shellAnswer.splitlines()  # from string to list, cut on "\n"
-            # using list comprehension to get string with substring
-            res = [i for i in shellAnswer if usbDriveName in i]
-            print("Any {} in the list?: {},{}".format(usbDriveName, len(res), res))
-
-            # sdOccurencesIndx = [m.start() for m in re.finditer('sd', shellAnswer)]
-            # sdOccurencesTxt = [shellAnswer[m:m + 4] for m in sdOccurencesIndx]
-            # print("Any sd* in the list?: {},{}, {}".format(len(sdOccurencesIndx), sdOccurencesIndx, sdOccurencesTxt))
-
-            if (len(res) == 1):
-
-                # Step 3/3 check the media folder (if the USB drive has been mounted), there should be a volume name
-                # ls /media/pi
-                print("Is there a mounted volume connected to the pi?")
-                shellAnswer = executeShellAsSudo('ls /media/pi')
-                print("Data out: {}".format(shellAnswer))
-
-                if (shellAnswer != ""):
-                    usbPresent = True
-                    usbName = shellAnswer
-
-        return usbPresent, usbName
+        mountPoint = radarStorage.findDriveMount(usbDriveName)
+        if mountPoint is None:
+            print("{} is not mounted (or read-only)".format(usbDriveName))
+            return False, ""
+
+        if not os.access(mountPoint, os.W_OK):
+            print("{} is mounted on {} but we cannot write there".format(usbDriveName, mountPoint))
+            return False, ""
+
+        totalBytes, freeBytes = radarStorage.driveUsage(mountPoint)
+        print("{} mounted on {}: {:.1f} MB free out of {:.1f} MB".format(usbDriveName, mountPoint,
+                                                                        freeBytes / 2**20, totalBytes / 2**20))
+        return True, mountPoint
 
     else:
         print("Operating system not supported")
@@ -682,7 +1101,7 @@ def checkUSBDrivePresent(usbDriveName):
         # 'cygwin'  for Windows(cygwin)
         # 'darwin'  for macOS
         # 'aix'     for AIX
-        return False
+        return False, ""
     ## END OF FUNCTION
 #***********************************************************************************************************************
 
@@ -738,8 +1157,8 @@ def checkRadarParameters():
 # ***********************************************************************************************************************
 
 #***********************************************************************************************************************
-def readLoggerParameters():
-    ### parse the logger .ini file
+def readLoggerParameters(fileName=None):
+    ### parse the logger .ini file (default: in the current folder, as checked by "checkLoggerParameters")
 
     print("Reading the Logger Parameters file")
 
@@ -762,7 +1181,9 @@ def readLoggerParameters():
     config = configparser.ConfigParser()
     # give the name and path of the file
 
-    config.read(globals.LoggerParametersFolderName + globals.pathSeparator + globals.LoggerParametersFileName)
+    if fileName is None:
+        fileName = globals.LoggerParametersFolderName + globals.pathSeparator + globals.LoggerParametersFileName
+    config.read(fileName)
 
 
     ## Debug only TODO: remove
@@ -792,57 +1213,60 @@ def readLoggerParameters():
 
 
 #***********************************************************************************************************************
-def radarStop(serialPort):
-    # Function to send a stop command to the radar
+def readElevationParameters(loggerParametersDict):
+    ### Get the parameters of "estimateWaterElevation14xx" from the [Elevation] section (optional)
+    ### ConfigParser gives lowercase keys, the returned keys are the ones used in configParameters
+
+    elevationSection = loggerParametersDict.get("Elevation", {})
+
+    elevationParameters = {"sensorHeight": float(elevationSection.get("sensorheight", "0.0")),
+                           "elevationSource": elevationSection.get("elevationsource", "auto")}
 
-    #init
-    sendOK = True
+    print("Water elevation: {}".format(elevationParameters))
 
-    command = "sensorStop"
-    serialPort.write((command + '\n').encode())
+    return elevationParameters
 
-    # Wait a bit so the radar will have the time to reply with multiple messages
-    time.sleep(1.0)
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-    # init
-    reply = []
-    joined_seq = ""
-    count = 1
-    radarOk = False
+#***********************************************************************************************************************
+def readFilterParameters(loggerParametersDict):
+    ### Get the thresholds used by "postprocessData14xx" to filter the echoes from the [Filter] section
+    ### ConfigParser gives lowercase keys, the returned keys are the ones used in configParameters
 
-    while serialPort.in_waiting:
-        for c in serialPort.readline():
-            if chr(c) == '\n':
+    filterNames = ["azimuthThreshold",
+                   "velocityThresholdMin", "velocityThresholdMax",
+                   "rangeThresholdMin", "rangeThresholdMax",
+                   "peakValThreshold"]
 
-                # Convert a list of characters into a string
-                reply = "".join(reply)
+    filterSection = loggerParametersDict.get("Filter", {})
 
-                print("Radar replied (line " + str(count) + "): " + joined_seq)
+    filterParameters = {}
+    for name in filterNames:
+        if name.lower() in filterSection:
+            filterParameters[name] = float(filterSection[name.lower()])
 
-                ## Check if the radar replied with "ok" (be handling it one byte at a time)
-                radarOk = radarOk or ("Done" in reply)
+    print("Echo filters: {}".format(filterParameters))
 
-                # reset
-                reply = []
-                count += 1
-                # break
-                time.sleep(0.5)
-            else:
-                # if the char is not a terminator
-                reply.append(chr(c))  # convert from ANSII
-                joined_seq = ''.join(str(v) for v in reply)  # Make a string from array
+    return filterParameters
 
-        # end of the while, check if "Done" has been received
+    ## END OF FUNCTION
+#***********************************************************************************************************************
 
-    if radarOk:
+#***********************************************************************************************************************
+def radarStop(serialPort):
+    # Function to send a stop command to the radar
+
+    cliSession = radarCli.RadarCliSession(serialPort, globals.cliCommandTimeoutSeconds, globals.cliStartTimeoutSeconds)
+    result = cliSession.sendCommand("sensorStop")
+
+    print("Radar replied in {:.1f} ms: {}".format(result.roundTrip * 1000, result.replyLines))
+    if result.ok:
         print("Command accepted by the radar")
     else:
-        print("Problem! Command rejected by the radar")
-
-    ## add the current bolean state to the global one
-    sendOK = sendOK and radarOk
+        print("Problem! Command rejected by the radar ({})".format(result.status))
 
-    return sendOK
+    return result.ok
 
    ## END OF FUNCTION
 #***********************************************************************************************************************
@@ -851,54 +1275,16 @@ def radarStop(serialPort):
 def radarStart(serialPort):
     # Function to send a start command to the radar
 
-    #init
-    sendOK = True
+    cliSession = radarCli.RadarCliSession(serialPort, globals.cliCommandTimeoutSeconds, globals.cliStartTimeoutSeconds)
+    result = cliSession.sendCommand("sensorStart")
 
-    command = "sensorStart"
-    serialPort.write((command + '\n').encode())
-
-    # Wait a bit so the radar will have the time to reply with multiple messages
-    time.sleep(1.0)
-
-    # init
-    reply = []
-    joined_seq = ""
-    count = 1
-    radarOk = False
-
-    while serialPort.in_waiting:
-        for c in serialPort.readline():
-            if chr(c) == '\n':
-
-                # Convert a list of characters into a string
-                reply = "".join(reply)
-
-                print("Radar replied (line " + str(count) + "): " + joined_seq)
-
-                ## Check if the radar replied with "ok" (be handling it one byte at a time)
-                radarOk = radarOk or ("Done" in reply)
-
-                # reset
-                reply = []
-                count += 1
-                # break
-                time.sleep(0.5)
-            else:
-                # if the char is not a terminator
-                reply.append(chr(c))  # convert from ANSII
-                joined_seq = ''.join(str(v) for v in reply)  # Make a string from array
-
-        # end of the while, check if "Done" has been received
-
-    if radarOk:
+    print("Radar replied in {:.1f} ms: {}".format(result.roundTrip * 1000, result.replyLines))
+    if result.ok:
         print("Command accepted by the radar")
     else:
-        print("Problem! Command rejected by the radar")
+        print("Problem! Command rejected by the radar ({})".format(result.status))
 
-    ## add the current bolean state to the global one
-    sendOK = sendOK and radarOk
-
-    return sendOK
+    return result.ok
 
    ## END OF FUNCTION
 #***********************************************************************************************************************
@@ -907,77 +1293,106 @@ def radarStart(serialPort):
 def serialSendConfigToRadar(configFileName, serialPort):
     # Function to send the configuration from
     # the radar configuration file (.CFG) to the radar via configuration serial
-
-    #init
-    sendOK = True
+    # Each command is sent as soon as the radar answered the previous one (prompt), no fixed wait
 
     print("-" * 50)
 
-    ## Send a 'enter key' to make the header "mmwDemo:/>" appear
-    serialPort.write(('\n').encode())
-
-    # Wait a bit so the radar will have the time to reply with multiple messages
-    time.sleep(1.0)
+    cliSession = radarCli.RadarCliSession(serialPort, globals.cliCommandTimeoutSeconds, globals.cliStartTimeoutSeconds)
 
+    ## Send a 'enter key' to make the header "mmwDemo:/>" appear
+    if not cliSession.synchronise():
+        print("No prompt from the radar, sending the configuration anyway")
 
     # Read the radar configuration file and send each line to the radar via serial
     config = [line.rstrip('\r\n') for line in open(configFileName)]
-    for command in config:
+    sendOK = cliSession.sendCommands(config)
 
-        print("Retrieved command from file: {}".format(command))
+    for line in cliSession.report():
+        print(line)
 
-        ## Check if the line is a comment or not
-        if not(command.startswith('%')):
-            print("Sending to radar: {}".format(command))
-            serialPort.write((command + '\n').encode())
+    print("-" * 50)
 
-            # Wait a bit so the radar will have the time to reply with multiple messages
-            time.sleep(0.1) # TODO: make smaller
+    return sendOK
 
-            # init
-            reply = []
-            joined_seq = ""
-            count = 1
-            radarOk = False
+   ## END OF FUNCTION
+#***********************************************************************************************************************
 
-            while serialPort.in_waiting:
-                for c in serialPort.readline():
-                    if chr(c) == '\n':
+#***********************************************************************************************************************
+def computeConfigHash(configFileName):
+    ### Function to get a short hash of the radar configuration file
+    ### Only the commands are used: comments, blank lines and line endings do not change the hash
 
-                        # Convert a list of characters into a string
-                        reply = "".join(reply)
+    config = [line.strip() for line in open(configFileName)]
+    commands = [line for line in config if line and not line.startswith('%')]
 
-                        print("Radar replied (line " + str(count) + "): " + joined_seq)
+    return hashlib.sha1("\n".join(commands).encode()).hexdigest()[:16]
 
-                        ## Check if the radar replied with "ok" (be handling it one byte at a time)
-                        radarOk = radarOk or ("Done" in reply)
+   ## END OF FUNCTION
+#***********************************************************************************************************************
 
-                        # reset
-                        reply = []
-                        count += 1
-                        # break
-                        time.sleep(0.1)
-                    else:
-                        # if the char is not a terminator
-                        reply.append(chr(c))  # convert from ANSII
-                        joined_seq = ''.join(str(v) for v in reply)  # Make a string from array
+#***********************************************************************************************************************
+def readRadarState(stateFileName):
+    ### Function to read the last configuration sent to the radar (hash + parameters), None if unknown
 
-                # end of the while, check if "Done" has been received
+    try:
+        with open(stateFileName) as file:
+            radarState = json.load(file)
+    except (OSError, ValueError):
+        return None
 
-            if radarOk:
-                print("Command accepted by the radar")
-            else:
-                print("Problem! Command rejected by the radar")
+    if "configHash" not in radarState or "configParameters" not in radarState:
+        return None
+    return radarState
 
-            ## add the current bolean state to the global one
-            sendOK = sendOK and radarOk
+   ## END OF FUNCTION
+#***********************************************************************************************************************
 
-            ## wait a bit between 2 messages so that the radar UART buffer does not overflow
-            time.sleep(0.1)
+#***********************************************************************************************************************
+def writeRadarState(stateFileName, configHash, configParameters):
+    ### Function to store the configuration just sent to the radar (written to a temporary file then renamed)
+    ### configHash = None removes the state: the radar configuration is unknown (e.g. upload failed)
+
+    if configHash is None:
+        if os.path.isfile(stateFileName):
+            os.remove(stateFileName)
+        return
+
+    radarState = {"configHash": configHash,
+                  "configParameters": configParameters,
+                  "sentTime": time.strftime(globals.timeStampDateFormat)}
+    with open(stateFileName + '.part', 'w') as file:
+        json.dump(radarState, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(stateFileName + '.part', stateFileName)
 
-    print("-" * 50)
+   ## END OF FUNCTION
+#***********************************************************************************************************************
 
-    return sendOK
+#***********************************************************************************************************************
+def detectRadarFrames(dataPort, timeout, nbrFrames=2):
+    ### Function to check if the radar is already sending frames on the DATA port
+    ### Returns the number of valid frames (magic word + header + TLVs decoded) received before the timeout
+    ### Stops as soon as "nbrFrames" are received, the bytes read here are not logged
+
+    extractor = RadarFrameExtractor(2**15)
+    nbrValidFrames = 0
+    deadline = time.monotonic() + timeout
+    while nbrValidFrames < nbrFrames and time.monotonic() < deadline:
+        readBuffer = dataPort.read(max(1, dataPort.in_waiting))
+        if not readBuffer:
+            continue
+        extractor.feed(np.frombuffer(readBuffer, dtype='uint8'))
+
+        frame = extractor.nextFrame()
+        while frame is not None:
+            totalPacketLen = len(frame)
+            if parseFrame14xx(frame.tobytes()).dataOK:
+                nbrValidFrames += 1
+            extractor.consumeFrame(totalPacketLen)
+            frame = extractor.nextFrame()
+
+    return nbrValidFrames
 
    ## END OF FUNCTION
 #***********************************************************************************************************************
@@ -1036,6 +1451,7 @@ def parseConfigFile(configFileName):
                 2 * startFreq * 1e9 * (idleTime + rampEndTime) * 1e-6 * configParameters["numDopplerBins"] * numTxAnt)
     configParameters["maxRange"] = (300 * 0.9 * digOutSampleRate) / (2 * freqSlopeConst * 1e3)
     configParameters["maxVelocity"] = 3e8 / (4 * startFreq * 1e9 * (idleTime + rampEndTime) * 1e-6 * numTxAnt)
+    configParameters["framePeriodicity"] = framePeriodicity  # [ms]
 
     return configParameters
    ## END OF FUNCTION
@@ -1092,6 +1508,9 @@ def main():
         # [USB drive]
         # driveName = sda1
         driveName = loggerParametersDict["USB drive"]["drivename"]
+        storageCheckIntervalSeconds = float(loggerParametersDict["USB drive"].get("storagecheckintervalseconds", "10"))
+        lowFreeMegaBytes = int(loggerParametersDict["USB drive"].get("lowfreemegabytes", "500"))
+        minFreeMegaBytes = int(loggerParametersDict["USB drive"].get("minfreemegabytes", "50"))
 
         # [Logger]
         nbrLogFiles = int(loggerParametersDict["Logger"]["nbrlogfiles"])
@@ -1104,6 +1523,26 @@ def main():
             logencoding = loggerParametersDict["Logger"]["logencoding"]
 
         maxLogFileMegaBytesSize = int(loggerParametersDict["Logger"]["maxlogfilemegabytessize"])
+        binaryLog = int(loggerParametersDict["Logger"].get("binarylog", "0")) == 1
+        asyncWriter = int(loggerParametersDict["Logger"].get("asyncwriter", "0")) == 1
+        writerBatchSize = int(loggerParametersDict["Logger"].get("writerbatchsize", "256"))
+        writerFlushIntervalSeconds = float(loggerParametersDict["Logger"].get("writerflushintervalseconds", "1.0"))
+        writerQueueSize = int(loggerParametersDict["Logger"].get("writerqueuesize", "8192"))
+        rawCapture = int(loggerParametersDict["Logger"].get("rawcapture", "0")) == 1
+        rawBlockKiloBytes = int(loggerParametersDict["Logger"].get("rawblockkilobytes", "64"))
+        rawQueueMegaBytes = int(loggerParametersDict["Logger"].get("rawqueuemegabytes", "16"))
+        compression = loggerParametersDict["Logger"].get("compression", "none")
+        compressionLevel = int(loggerParametersDict["Logger"].get("compressionlevel", "6"))
+        compressRawCapture = int(loggerParametersDict["Logger"].get("compressrawcapture", "0")) == 1
+        # Replaces "nbrLogFiles" when the segments are compressed, by default the same cap as the uncompressed logs
+        maxCompressedMegaBytes = int(loggerParametersDict["Logger"].get("maxcompressedmegabytes",
+                                                                        str(nbrLogFiles * maxLogFileMegaBytesSize)))
+        columnarArchive = int(loggerParametersDict["Logger"].get("columnararchive", "0")) == 1
+        archiveChunkFrames = int(loggerParametersDict["Logger"].get("archivechunkframes", "1024"))
+        retentionMaxMegaBytes = int(loggerParametersDict["Logger"].get("retentionmaxmegabytes", "0"))
+        retentionMaxPercent = float(loggerParametersDict["Logger"].get("retentionmaxpercent", "0"))
+        retentionAction = loggerParametersDict["Logger"].get("retentionaction", "none")
+        retentionIntervalSeconds = float(loggerParametersDict["Logger"].get("retentionintervalseconds", "60"))
         logDelay = int(loggerParametersDict["Logger"]["logdelay"])
 
         # [Radar]
@@ -1117,6 +1556,23 @@ def main():
         radarPlatform = loggerParametersDict["Radar"]["radarplatform"]
         radarSDKVersion = loggerParametersDict["Radar"]["radarsdkversion"]
         serialTimeout = float(loggerParametersDict["Radar"]["serialtimeout"])
+        autoDetectPorts = int(loggerParametersDict["Radar"].get("autodetectports", "1")) == 1
+        radarUsbId = loggerParametersDict["Radar"].get("radarusbid", radarPorts.xds110UsbId)
+        radarCliInterface = int(loggerParametersDict["Radar"].get("radarcliinterface", str(radarPorts.xds110CliInterface)))
+        radarDataInterface = int(loggerParametersDict["Radar"].get("radardatainterface", str(radarPorts.xds110DataInterface)))
+        reuseRunningConfig = int(loggerParametersDict["Radar"].get("reuserunningconfig", "1")) == 1
+
+        # [Filter] (optional, a missing threshold does not filter anything)
+        filterParameters = readFilterParameters(loggerParametersDict)
+
+        # [Elevation] (optional, the sensor height is 0 if missing)
+        elevationParameters = readElevationParameters(loggerParametersDict)
+
+        # [Profiling] (optional, off if missing)
+        profilingSection = loggerParametersDict.get("Profiling", {})
+        stageTiming = int(profilingSection.get("stagetiming", "0")) == 1
+        stageTimingWindow = int(profilingSection.get("stagetimingwindow", "1000"))
+        cpuProfile = int(profilingSection.get("cpuprofile", "0")) == 1
         # radarMagicHeader_hex = "0201040306050807"
         # OBJ_STRUCT_SIZE_BYTES = 12;
         # BYTE_VEC_ACC_MAX_SIZE = 2 ** 15;
@@ -1138,7 +1594,14 @@ def main():
     ##-----------------------
 
     # The function will make the distinction between the OS it is executed on
-    USBOK, USBName = checkUSBDrivePresent("sda1")
+    # driveName = none: no USB drive (e.g. simulator on a PC), the data is saved in the current folder
+    useUSBDrive = driveName.lower() != "none"
+    if useUSBDrive:
+        USBOK, USBName = checkUSBDrivePresent(driveName)
+    else:
+        USBOK, USBName = True, ""
+        print("No USB drive used, the data is saved in the current folder")
+
     if USBOK:
         print("USB drive is present and accessible")
     else:
@@ -1156,7 +1619,9 @@ def main():
 
     CurrentOS = platform.system()
     if (CurrentOS == 'Windows' or CurrentOS == 'win32'):
-        if checkRadarSerialPort(serialConfigName_Win, serialDataName_Win):
+        serialPortsOK, serialConfigName_Win, serialDataName_Win = checkRadarSerialPort(
+            serialConfigName_Win, serialDataName_Win, radarUsbId, radarCliInterface, radarDataInterface, autoDetectPorts)
+        if serialPortsOK:
             print("Both radar serial ports are present and accessible")
         else:
             ## let the user know an error occurred
@@ -1166,7 +1631,9 @@ def main():
             print(
                 "Main code stopped because one or multiple serial ports are NOT present, did you plug + power the radar?")
     elif CurrentOS == 'Linux':
-        if checkRadarSerialPort(serialConfigName_RPi, serialDataName_RPi):
+        serialPortsOK, serialConfigName_RPi, serialDataName_RPi = checkRadarSerialPort(
+            serialConfigName_RPi, serialDataName_RPi, radarUsbId, radarCliInterface, radarDataInterface, autoDetectPorts)
+        if serialPortsOK:
             print("Both radar serial ports are present and accessible")
         else:
             ## let the user know an error occurred
@@ -1197,6 +1664,13 @@ def main():
         print("Parsing the radar configuration")
         # Get the configuration parameters from the configuration file (from Gorordo's code)
         configParameters = parseConfigFile(globals.RadarParametersFolderName + globals.pathSeparator + globals.RadarParametersFileName)
+        configHash = computeConfigHash(globals.RadarParametersFolderName + globals.pathSeparator + globals.RadarParametersFileName)
+        radarConfigParameters = dict(configParameters)  # only what comes from the .cfg, stored with the hash once sent
+        radarStateFileName = globals.RadarParametersFolderName + globals.pathSeparator + globals.RadarStateFileName
+
+        # Add the echo filters of the logger parameters
+        configParameters.update(filterParameters)
+        configParameters.update(elevationParameters)
 
         print("Parsing done")
         print("-" * 50)
@@ -1216,10 +1690,14 @@ def main():
             # Put the data folder in root/CWD
             startPath = os.getcwd()
 
+        elif CurrentOS == 'Linux' and not useUSBDrive:
+            print("Since there is no USB drive, we put the data in the same folder as the code")
+            startPath = os.getcwd()
+
         elif CurrentOS == 'Linux':
             print("Since we are on the Raspberry Pi, we put the data in the USB drive")
-            # Put the data folder in the USB drive
-            startPath = "/media/pi/" + USBName.rstrip()
+            # Put the data folder in the USB drive (where it is mounted)
+            startPath = USBName
 
 
         else:
@@ -1253,12 +1731,24 @@ def main():
         # Prepare the logger
         log = logging.getLogger()
         log.setLevel(logging.DEBUG)
-        logFileHandler = RotatingFileHandler(filename=logFileName,
-                                             mode=logMode,
-                                             backupCount=nbrLogFiles - 1,
-                                             maxBytes=maxLogFileMegaBytesSize * 1024 * 1024, # conv. from byte to MB
-                                             encoding=logencoding,
-                                             delay=logDelay)
+
+        # The rotated segments can be compressed in the background, then the retention is on the compressed size
+        segmentCompressor = None
+        if compression != "none":
+            segmentCompressor = radarWriter.SegmentCompressor(method=compression,
+                                                              level=compressionLevel,
+                                                              maxCompressedBytes=maxCompressedMegaBytes * 1024 * 1024)
+            segmentCompressor.start()
+            print("Rotated segments compressed with {} (level {}), {} MB of compressed segments kept".format(
+                compression, compressionLevel, maxCompressedMegaBytes if maxCompressedMegaBytes > 0 else "all"))
+
+        logFileHandler = radarWriter.BatchedRotatingFileHandler(filename=logFileName,
+                                                                mode=logMode,
+                                                                backupCount=nbrLogFiles - 1,
+                                                                maxBytes=maxLogFileMegaBytesSize * 1024 * 1024, # conv. from byte to MB
+                                                                encoding=logencoding,
+                                                                delay=logDelay,
+                                                                compressor=segmentCompressor)
         logFileHandler.setLevel(logging.DEBUG)
         formatter = logging.Formatter(
             fmt=globals.lineLogFormat,
@@ -1266,7 +1756,57 @@ def main():
         )
 
         logFileHandler.setFormatter(formatter)
-        log.addHandler(logFileHandler)
+
+        # Compact binary log alongside the text log (same folder, same maximum file size)
+        if binaryLog:
+            binaryLogWriter = radarBinaryLog.RadarBinaryLogWriter(
+                baseName=logFileName[:-len('.log')],
+                nbrEchoes=globals.nbrStoredEchoesInClass,
+                configHash=configHash,
+                configParameters=configParameters,
+                maxFileBytes=maxLogFileMegaBytesSize * 1024 * 1024)
+            print("Binary log: {}".format(binaryLogWriter.fileName))
+
+        # Raw capture of every byte of the DATA port (same folder, same maximum file size), to reprocess the data later
+        if rawCapture:
+            rawCaptureWriter = radarCapture.RawCaptureWriter(
+                baseName=logFileName[:-len('-Data.log')] + '-Raw',
+                maxFileBytes=maxLogFileMegaBytesSize * 1024 * 1024,
+                compressor=segmentCompressor if compressRawCapture else None)
+            print("Raw capture: {}".format(rawCaptureWriter.fileName))
+            # Written by its own thread, in large blocks, with its own queue (a full queue leaves a gap record)
+            rawRecorder = radarCapture.RawCaptureRecorder(rawCaptureWriter,
+                                                          blockBytes=rawBlockKiloBytes * 1024,
+                                                          blockSeconds=writerFlushIntervalSeconds,
+                                                          maxQueuedBytes=rawQueueMegaBytes * 1024 * 1024)
+            rawRecorder.start()
+
+        # Columnar archive of the session (one .npy per column, every "archiveChunkFrames" frames), for the analysis
+        if columnarArchive:
+            archiveWriter = radarArchive.ColumnarArchiveWriter(
+                archiveDir=logFileName[:-len('-Data.log')] + '-Archive',
+                nbrEchoes=globals.nbrStoredEchoesInClass,
+                configHash=configHash,
+                configParameters=configParameters,
+                chunkFrames=archiveChunkFrames)
+            print("Columnar archive: {}".format(archiveWriter.archiveDir))
+
+        useDataWriter = asyncWriter or columnarArchive
+        if useDataWriter:
+            # The data logs are written by a dedicated thread, in batches
+            dataWriter = radarWriter.BatchedLogWriter(writerBatchSize, writerFlushIntervalSeconds, writerQueueSize)
+            if asyncWriter:
+                dataWriter.addSink("text", logFileHandler)
+                if binaryLog:
+                    dataWriter.addSink("binary", binaryLogWriter)
+            if columnarArchive:
+                dataWriter.addSink("archive", archiveWriter)
+            dataWriter.start()
+
+        if asyncWriter:
+            log.addHandler(radarWriter.WriterQueueHandler(dataWriter, "text"))
+        else:
+            log.addHandler(logFileHandler)
 
         # Add a header to the log file (Notice the space at the start)
         log.info(globals.logFileHeader)
@@ -1320,6 +1860,20 @@ def main():
         ## step4: Send the configuration to the radar via UART
         ##-----------------------------------------------------
 
+        # No need to send it if the radar is already sending frames with the same configuration (e.g. logger restarted)
+        radarState = readRadarState(radarStateFileName)
+        if reuseRunningConfig and radarState is not None and radarState["configHash"] == configHash \
+                and radarState["configParameters"] == radarConfigParameters:
+            detectTimeout = max(globals.radarDetectFramePeriods * configParameters["framePeriodicity"] / 1000,
+                                globals.radarDetectMinTimeoutSeconds)
+            nbrRunningFrames = detectRadarFrames(radarDataSerialPort, detectTimeout, globals.radarDetectNbrFrames)
+            print("Radar configuration {} already sent ({}), {} valid frame(s) received in {:.1f} s".format(
+                configHash, radarState.get("sentTime", "?"), nbrRunningFrames, detectTimeout))
+            globals.radarAlreadyConfigured = nbrRunningFrames >= globals.radarDetectNbrFrames
+        elif reuseRunningConfig:
+            print("Radar configuration {} not sent yet (last one: {})".format(
+                configHash, radarState["configHash"] if radarState is not None else "unknown"))
+
 
         ## Configure the radar to get the data we want
         try:
@@ -1363,12 +1917,17 @@ def main():
 
         startEllapsedTime = time.time()
         if globals.radarAlreadyConfigured:
-            confSent2Radar = radarStart(radarConfigSerialPort)
+            confSent2Radar = True
+            print("Radar already running with this configuration, nothing sent")
         else:
+            # The radar configuration is unknown until the upload worked
+            writeRadarState(radarStateFileName, None, None)
             confSent2Radar = serialSendConfigToRadar(globals.RadarParametersFolderName +
                                                      globals.pathSeparator +
                                                      globals.RadarParametersFileName,
                                                      radarConfigSerialPort)
+            if confSent2Radar:
+                writeRadarState(radarStateFileName, configHash, radarConfigParameters)
         print("Time elapsed for sending configuration: {:5.1f}".format(time.time() - startEllapsedTime))
         del startEllapsedTime
 
@@ -1392,70 +1951,173 @@ def main():
         globals.nbrEchosDisplayed = min(globals.nbrEchosDisplayed, globals.nbrStoredEchoesInClass)
         print("Logging only {} echoes on maximum {}".format(globals.nbrEchosDisplayed, globals.nbrStoredEchoesInClass))
 
+        # Free space of the drive receiving the data, checked in the background: the acquisition stops before it is full
+        storageMonitor = radarStorage.StorageMonitor(startPath + globals.pathSeparator + dataFolderName,
+                                                     intervalSeconds=storageCheckIntervalSeconds,
+                                                     lowFreeBytes=lowFreeMegaBytes * 1024 * 1024,
+                                                     minFreeBytes=minFreeMegaBytes * 1024 * 1024)
+        storageMonitor.start()
+        print("Storage: {}".format(storageMonitor.statistics()))
+
+        # The older sessions of the data folder are compressed/deleted in the background to stay within the budget
+        # (the free space to keep is the warning level of the storage monitor), this session is never touched
+        sessionRetention = None
+        if retentionAction != "none":
+            sessionRetention = radarRetention.SessionRetention(startPath + globals.pathSeparator + dataFolderName,
+                                                               activeSession=testRef,
+                                                               maxBytes=retentionMaxMegaBytes * 1024 * 1024,
+                                                               maxPercent=retentionMaxPercent,
+                                                               minFreeBytes=lowFreeMegaBytes * 1024 * 1024,
+                                                               action=retentionAction,
+                                                               method=compression,
+                                                               level=compressionLevel,
+                                                               intervalSeconds=retentionIntervalSeconds)
+            sessionRetention.start()
+            print("Retention of the older sessions: {} (check every {} s)".format(retentionAction, retentionIntervalSeconds))
+
         # Statistics variables initialisation (to display in the console when user close the GUI)
         num_logged_frames = 0
-        start_time = time.time()
+        num_bad_frames = 0  # frames that could not be decoded/post-processed
+        start_time = time.monotonic()
+        monotonicToEpoch = time.time() - start_time  # to convert the arrival times to host timestamps
+
+        # The DATA port is read in the background, complete frames are waiting in a queue
+        # Timing of the stages of the acquisition (does nothing if not enabled)
+        stageTimer = radarProfiling.StageTimer(radarProfiling.acquisitionStages, stageTimingWindow, stageTiming)
+
+        if rawCapture:
+            def submitRawChunk(arrivalTime, readBuffer):
+                rawRecorder.submit(arrivalTime + monotonicToEpoch, readBuffer)
+            radarReader = RadarSerialReader(radarDataSerialPort, globals.frameQueueSize, submitRawChunk, stageTimer)
+        else:
+            radarReader = RadarSerialReader(radarDataSerialPort, globals.frameQueueSize, stageTimer=stageTimer)
+        radarReader.start()
+
+        # CPU profile of the main thread (the reader and writer threads are not in it)
+        if cpuProfile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        # Frame loss and link health, from the frame headers and the reader counters
+        linkHealth = LinkHealthTracker(radarReader,
+                                       framePeriodSeconds=configParameters["framePeriodicity"] / 1000,
+                                       cpuFrequencyHz=globals.radarCpuFrequencyHz)
+
+        lastStatusTime = time.monotonic()
 
         for cnt in range(globals.nbrAquisitionLoops):
             try:
                 print("Frame #: {}".format(num_logged_frames))
-                radarClass = readAndParseData14xx(radarDataSerialPort)
 
-                # Only post-process if the received frame is valid
-                if radarClass.dataOK:
-                    radarClass = postprocessData14xx(radarClass, configParameters) ## TODO: in that function, only get the echoes that are within a range (distance) + velocity + angle (straight down)
+                if storageMonitor.full.is_set():
+                    print(globals.crashMarker)
+                    print("Less than {} MB free on the drive, stopping the aquisition".format(minFreeMegaBytes))
+                    break
+
+                # From time to time, show how the reader and the writer are doing
+                if time.monotonic() - lastStatusTime >= globals.statusPrintIntervalSeconds:
+                    lastStatusTime = time.monotonic()
+                    print("Radar DATA reader statistics: {}".format(radarReader.statistics()))
+                    if useDataWriter:
+                        print("Data writer statistics: {}".format(dataWriter.statistics()))
+                    if segmentCompressor is not None:
+                        print("Segment compressor statistics: {}".format(segmentCompressor.statistics()))
+                    print("Link health (last {:.0f} s): {}".format(globals.statusPrintIntervalSeconds,
+                                                                  linkHealth.intervalStatistics()))
+                    print("Storage: {}".format(storageMonitor.statistics()))
+                    if sessionRetention is not None:
+                        print("Retention statistics: {}".format(sessionRetention.statistics()))
+                    if stageTiming:
+                        for line in stageTimer.report():
+                            print(line)
+
+                # Wait for the next frame (no fixed sleep: a frame is processed as soon as it is complete)
+                arrivalTime, frameBytes = radarReader.getFrame(globals.frameWaitTimeoutSeconds)
+                if frameBytes is None:
+                    if not radarReader.is_alive():
+                        print("The radar DATA serial reader stopped, aborting the aquisition")
+                        break
+                    print("No frame received in the last {} s".format(globals.frameWaitTimeoutSeconds))
+                    continue
+
+                frameStamp = stageTimer.start()
+                try:
+                    radarClass = parseFrame14xx(frameBytes)
+                    stamp = stageTimer.stop("decode", frameStamp)
+                    linkHealth.update(radarClass)
+
+                    # Only post-process if the received frame is valid
+                    if radarClass.dataOK:
+                        radarClass = postprocessData14xx(radarClass, configParameters) ## only keeps the echoes within a range (distance) + velocity + angle (straight down)
+                        stamp = stageTimer.stop("postprocess", stamp)
+
+                    # A frame with only a range profile (no detected object) still gives the water elevation
+                    frameUsable = radarClass.dataOK or radarClass.rangeProfile is not None
+                    if frameUsable:
+                        radarClass = estimateWaterElevation14xx(radarClass, configParameters)
+                        stamp = stageTimer.stop("elevation", stamp)
+
+                # A corrupted frame must not stop the logging: skip it
+                except (ValueError, IndexError) as e:
+                    num_bad_frames = num_bad_frames + 1
+                    linkHealth.parseFailed()
+                    print("Bad frame skipped ({} so far): {}".format(num_bad_frames, e))
+                    continue
+
+                if frameUsable:
                     # For the conversion check, just look at the first object
-                    if radarClass.objList[0].isConverted:
+                    if radarClass.points['isConverted'][0] or not np.isnan(radarClass.waterElevation):
 
                         # At every iteration, do the following
-                        time_ms = round((time.time() - start_time) * 1000)  # conversion from [ms] to [s]
-
-                        # Add the header to the finalFrame
-                        finalFrame = globals.headerFormat.format(
-                            time_ms,
-                            radarClass.frmhdr.magicNumber,
-                            #radarClass.frmhdr.version,
-                            radarClass.frmhdr.sdkVersion.MajorNum,
-                            radarClass.frmhdr.sdkVersion.MinorNum,
-                            radarClass.frmhdr.sdkVersion.BugfixNum,
-                            radarClass.frmhdr.sdkVersion.BuildNum,
-                            radarClass.frmhdr.totalPacketLen,
-                            radarClass.frmhdr.platform,
-                            radarClass.frmhdr.frameNumber,
-                            radarClass.frmhdr.timeCpuCycles,
-                            radarClass.frmhdr.numDetectedObj,
-                            radarClass.frmhdr.numTLVs,
-                            radarClass.tlv_xyzQFormat)  # init
-
-                        # Add the echoes, one by one, to the finalFrame
-                        for cnt_echo in range(globals.nbrEchosDisplayed):
-                            finalFrame = finalFrame + globals.echoSeparator + globals.singleEchoFormat.format(
-                                cnt_echo,
-                                radarClass.objList[cnt_echo].echoNumber,
-                                radarClass.objList[cnt_echo].isValid,
-                                radarClass.objList[cnt_echo].isConverted,
-                                radarClass.objList[cnt_echo].x,
-                                radarClass.objList[cnt_echo].y,
-                                radarClass.objList[cnt_echo].z,
-                                radarClass.objList[cnt_echo].dopplerVal,
-                                radarClass.objList[cnt_echo].velocity,
-                                radarClass.objList[cnt_echo].rangeIdx,
-                                radarClass.objList[cnt_echo].rangeVal,
-                                radarClass.objList[cnt_echo].dopplerIdx,
-                                radarClass.objList[cnt_echo].peakVal,
-                                radarClass.objList[cnt_echo].elv,
-                                radarClass.objList[cnt_echo].azmth)
+                        time_ms = round((arrivalTime - start_time) * 1000)  # conversion from [s] to [ms]
+
+                        finalFrame = formatRadarFrame(radarClass, time_ms)
+                        stamp = stageTimer.stop("format", stamp)
 
                         log.info(finalFrame)
+                        if binaryLog and asyncWriter:
+                            # copy, the packed record is re-used for the next frame
+                            dataWriter.submit("binary", binaryLogWriter.packFrame(radarClass, arrivalTime + monotonicToEpoch).copy())
+                        elif binaryLog:
+                            binaryLogWriter.writeFrame(radarClass, arrivalTime + monotonicToEpoch)
+                        if columnarArchive:
+                            dataWriter.submit("archive", archiveWriter.packFrame(radarClass, time_ms, arrivalTime + monotonicToEpoch).copy())
                         num_logged_frames = num_logged_frames + 1  # Increment the frame counter
+                        stageTimer.stop("logInfo", stamp)
 
-                    time.sleep(globals.loopSleepTimeSeconds)  # Wait here so have the new data in the RPi USB buffer
+                stageTimer.stop("frame", frameStamp)
 
             # Stop the program and close everything if Ctrl + c is pressed on the keyboard
             except KeyboardInterrupt:
                 break
 
+        radarReader.stop()
+        if cpuProfile:
+            profiler.disable()
+
         print("Data aquisition loop done")
+        print("Frames logged: {}, bad frames skipped: {}".format(num_logged_frames, num_bad_frames))
+        print("Radar DATA reader statistics: {}".format(radarReader.statistics()))
+        print("Link health: {}".format(linkHealth.statistics()))
+        if stageTiming:
+            for line in stageTimer.report():
+                print(line)
+        if cpuProfile:
+            profileFileName = logFileName[:-len('-Data.log')] + '-Profile.prof'
+            profiler.dump_stats(profileFileName)
+            print("CPU profile of the aquisition loop: {} (main thread, 15 most expensive functions)".format(profileFileName))
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+
+        # Write everything still waiting in the writer queue
+        if useDataWriter:
+            print("Data writer statistics: {}".format(dataWriter.statistics()))
+            dataWriter.stop()
+        if rawCapture:
+            rawRecorder.stop()
+            print("Raw capture statistics: {}".format(rawRecorder.statistics()))
+        if columnarArchive:
+            print("Frames in the columnar archive: {} ({} chunks)".format(archiveWriter.framesWritten,
+                                                                          archiveWriter.chunksWritten))
         print("-" * 50)
 
         # End of aquisition loop
@@ -1470,6 +2132,22 @@ def main():
         stopLogger(log)
         del log
 
+        if binaryLog:
+            binaryLogWriter.close()
+            print("Frames in the binary log: {}".format(binaryLogWriter.recordsWritten))
+
+        # Compress the last rotated segments (the current ones stay as they are)
+        if segmentCompressor is not None:
+            segmentCompressor.stop()
+            print("Segment compressor statistics: {}".format(segmentCompressor.statistics()))
+
+        if sessionRetention is not None:
+            sessionRetention.stop()
+            print("Retention statistics: {}".format(sessionRetention.statistics()))
+
+        storageMonitor.stop()
+        print("Storage: {}".format(storageMonitor.statistics()))
+
 
         if globals.saveBinaryDebug:
             # for debug purpose ONLY, save binary data
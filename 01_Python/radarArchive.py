@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+# This file writes and reads the chunked columnar archive of a session ("<testRef>-Archive" folder)
+# Usage: python3 radarArchive.py OUTPUT_ARCHIVE SESSION_ARCHIVE [SESSION_ARCHIVE ...]
+#   - merges session archives (e.g. all the sessions of a day) into one archive with a single chunk,
+#     so that loading a column is one memory-mapped np.load
+#
+# Folder layout:
+#   - "manifest.json": description (schema version, config hash, number of echoes, columns with their dtype and
+#     shape, radar parameters) and the list of the chunks (folder name, first frame, number of frames, time span)
+#   - "chunk-NNNNNN/<column>.npy": one .npy file per column of the "logFileHeader" (time_ms, frameNumber,
+#     timeCpuCycles, numDetectedObj, ...) and per echo field (x, y, z, doppler, rangeVal, peakVal: one row per
+#     frame, one column per echo, NaN/0 for the unused echoes), for "chunkFrames" frames
+# A chunk is written in a ".part" folder, synced to the drive, renamed, and only then added to the manifest (also
+# replaced atomically): a power cut only loses the frames of the chunk being filled
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import argparse     ## for the command line options
+import json         ## for the manifest
+import os           ## for the folders and the atomic renames
+import time         ## for the creation date
+
+import numpy as np  ## for the columns
+
+# ---------------------- global variables []------------------
+
+archiveSchemaVersion = 1
+archiveManifestName = "manifest.json"
+archiveChunkFormat = "chunk-{:06d}"
+archivePartExtension = ".part"
+
+# Per-echo fields of "radarPointDtype" stored in the archive, with their name in the archive
+archiveEchoFields = [("x", "x"), ("y", "y"), ("z", "z"), ("dopplerVal", "doppler"), ("rangeVal", "rangeVal"),
+                     ("peakVal", "peakVal")]
+
+# ---------------------- Class [1]------------------
+
+class ColumnarArchiveWriter:
+    # Gather the frames in memory and write them as one chunk of columns every "chunkFrames" frames
+    # Sink of the writer thread: the records are the ones returned by "packFrame" (copied)
+    def __init__(self, archiveDir, nbrEchoes, configHash, configParameters, chunkFrames=1024):
+        self.archiveDir = archiveDir
+        self.nbrEchoes = nbrEchoes
+        self.chunkFrames = chunkFrames
+
+        self.frameDtype = archiveFrameDtype(nbrEchoes)
+        self.record = np.zeros(1, dtype=self.frameDtype)  # re-used for every frame
+        self.buffer = np.zeros(chunkFrames, dtype=self.frameDtype)
+        self.bufferedFrames = 0
+
+        if not os.path.isdir(archiveDir):
+            os.mkdir(archiveDir)
+
+        # A previous run may have used the same folder: go on after its chunks
+        self.manifest = readArchiveManifest(archiveDir) if os.path.isfile(os.path.join(archiveDir, archiveManifestName)) \
+            else buildManifest(nbrEchoes, self.frameDtype, configHash, configParameters)
+        self.chunksWritten = 0
+        self.framesWritten = sum([chunk["nbrFrames"] for chunk in self.manifest["chunks"]])
+
+    def packFrame(self, parsedData, time_ms, hostTimestamp):
+        ### Fill the record with a post-processed frame, returns the record (re-used at the next call)
+        record = self.record[0]
+        record['time_ms'] = time_ms
+        record['hostTimestamp'] = hostTimestamp
+        record['frameNumber'] = parsedData.frmhdr.frameNumber
+        record['timeCpuCycles'] = parsedData.frmhdr.timeCpuCycles
+        record['numDetectedObj'] = parsedData.frmhdr.numDetectedObj
+        record['numStoredObj'] = parsedData.numStoredObj
+        record['numKeptObj'] = parsedData.numKeptObj
+        record['xyzQFormat'] = parsedData.tlv_xyzQFormat
+        record['waterElevation'] = parsedData.waterElevation
+
+        # Unused echoes: NaN (0 for peakVal, an integer)
+        nbrStored = min(parsedData.numStoredObj, self.nbrEchoes)
+        for pointField, column in archiveEchoFields:
+            echoes = record[column]
+            echoes[:] = 0 if column == "peakVal" else np.nan
+            echoes[:nbrStored] = parsedData.points[pointField][:nbrStored]
+        return self.record
+
+    def writeFrame(self, parsedData, time_ms, hostTimestamp):
+        ### Append one post-processed frame
+        self.writeRecords(self.packFrame(parsedData, time_ms, hostTimestamp))
+
+    def writeRecords(self, records):
+        ### Append already packed records (one or many), a chunk is written each time the buffer is full
+        recordIdx = 0
+        while recordIdx < len(records):
+            nbrRecords = min(len(records) - recordIdx, self.chunkFrames - self.bufferedFrames)
+            self.buffer[self.bufferedFrames:self.bufferedFrames + nbrRecords] = records[recordIdx:recordIdx + nbrRecords]
+            self.bufferedFrames += nbrRecords
+            recordIdx += nbrRecords
+            if self.bufferedFrames == self.chunkFrames:
+                self.writeChunk()
+
+    def writeBatch(self, recordsList):
+        ### Append a list of packed records (sink of the writer thread)
+        self.writeRecords(np.concatenate(recordsList))
+
+    def writeChunk(self):
+        ### Write the buffered frames as a new chunk, then add it to the manifest
+        if self.bufferedFrames == 0:
+            return
+
+        chunkRecords = self.buffer[:self.bufferedFrames]
+        chunkName = archiveChunkFormat.format(len(self.manifest["chunks"]))
+        chunkDir = os.path.join(self.archiveDir, chunkName)
+        writeColumns(chunkDir, chunkRecords)
+
+        self.manifest["chunks"].append({"name": chunkName,
+                                        "firstFrame": self.framesWritten,
+                                        "nbrFrames": len(chunkRecords),
+                                        "firstTimestamp": float(chunkRecords['hostTimestamp'][0]),
+                                        "lastTimestamp": float(chunkRecords['hostTimestamp'][-1])})
+        writeManifest(self.archiveDir, self.manifest)
+
+        self.framesWritten += len(chunkRecords)
+        self.chunksWritten += 1
+        self.bufferedFrames = 0
+
+    def flush(self):
+        # Only whole chunks are written, the frames of the current one stay in memory
+        pass
+
+    def close(self):
+        ### Write the last (incomplete) chunk
+        self.writeChunk()
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def archiveFrameDtype(nbrEchoes):
+    ### Layout of one frame of the archive, each field becomes one column (echo fields: one value per echo)
+
+    return np.dtype([('time_ms',        '<i8'),  # same as the "Aquisition Time[ms]" of the text log
+                     ('hostTimestamp',  '<f8'),  # host time when the frame was received [s since epoch]
+                     ('frameNumber',    '<u4'),
+                     ('timeCpuCycles',  '<u4'),
+                     ('numDetectedObj', '<u2'),
+                     ('numStoredObj',   '<u2'),
+                     ('numKeptObj',     '<u2'),
+                     ('xyzQFormat',     '<u4'),
+                     ('waterElevation', '<f8')] +
+                    [(column, '<u2' if column == "peakVal" else '<f8', (nbrEchoes,)) for _, column in archiveEchoFields])
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildManifest(nbrEchoes, frameDtype, configHash, configParameters):
+    ### Description of an empty archive
+
+    return {"schemaVersion": archiveSchemaVersion,
+            "configHash": configHash,
+            "nbrEchoes": nbrEchoes,
+            "columns": {name: {"dtype": np.lib.format.dtype_to_descr(frameDtype[name].base),
+                               "shape": list(frameDtype[name].shape)} for name in frameDtype.names},
+            "configParameters": configParameters,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "chunks": []}
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def syncPath(path):
+    ### Make sure a file (or the entries of a folder) are on the drive, not only in the page cache
+
+    if not hasattr(os, "O_DIRECTORY") and os.path.isdir(path):
+        return  # folders cannot be opened on Windows
+    fileDescriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fileDescriptor)
+    finally:
+        os.close(fileDescriptor)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def writeColumns(chunkDir, records):
+    ### Write each field of the records as "<chunkDir>/<field>.npy", through a ".part" folder renamed at the end
+
+    partDir = chunkDir + archivePartExtension
+    if not os.path.isdir(partDir):
+        os.mkdir(partDir)
+
+    for name in records.dtype.names:
+        fileName = os.path.join(partDir, name + ".npy")
+        np.save(fileName, np.ascontiguousarray(records[name]))
+        syncPath(fileName)
+    syncPath(partDir)
+
+    os.replace(partDir, chunkDir)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def writeManifest(archiveDir, manifest):
+    ### Replace the manifest atomically: it always lists complete chunks only
+
+    fileName = os.path.join(archiveDir, archiveManifestName)
+    with open(fileName + archivePartExtension, "w") as file:
+        json.dump(manifest, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(fileName + archivePartExtension, fileName)
+    syncPath(archiveDir)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readArchiveManifest(archiveDir):
+    ### Read the manifest of an archive (dict)
+
+    with open(os.path.join(archiveDir, archiveManifestName)) as file:
+        manifest = json.load(file)
+
+    if manifest["schemaVersion"] > archiveSchemaVersion:
+        raise ValueError("{}: unsupported schema version {}".format(archiveDir, manifest["schemaVersion"]))
+
+    return manifest
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def loadArchive(archiveDir, columns=None):
+    ### Load columns of an archive (all by default), returns a dict of arrays
+    ### With a single chunk (see "consolidateArchives") each column is memory-mapped, otherwise the chunks are joined
+
+    manifest = readArchiveManifest(archiveDir)
+    if columns is None:
+        columns = list(manifest["columns"])
+
+    result = {}
+    for column in columns:
+        parts = [np.load(os.path.join(archiveDir, chunk["name"], column + ".npy"), mmap_mode='r')
+                 for chunk in manifest["chunks"]]
+        if len(parts) == 1:
+            result[column] = parts[0]
+        elif parts:
+            result[column] = np.concatenate(parts)
+        else:
+            columnDescr = manifest["columns"][column]
+            result[column] = np.zeros([0] + columnDescr["shape"], dtype=np.lib.format.descr_to_dtype(columnDescr["dtype"]))
+
+    return result
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def consolidateArchives(archiveDirs, outputDir):
+    ### Merge archives (in the given order) into a new archive with a single chunk
+    ### Each column is filled chunk by chunk through a memory-mapped .npy file: the memory usage is one chunk
+
+    manifests = [readArchiveManifest(archiveDir) for archiveDir in archiveDirs]
+    columns = manifests[0]["columns"]
+    for archiveDir, manifest in zip(archiveDirs, manifests):
+        if manifest["columns"] != columns:
+            raise ValueError("{}: the columns are not the same as in {}".format(archiveDir, archiveDirs[0]))
+
+    nbrFrames = sum([chunk["nbrFrames"] for manifest in manifests for chunk in manifest["chunks"]])
+    if not os.path.isdir(outputDir):
+        os.mkdir(outputDir)
+
+    chunkName = archiveChunkFormat.format(0)
+    partDir = os.path.join(outputDir, chunkName + archivePartExtension)
+    if not os.path.isdir(partDir):
+        os.mkdir(partDir)
+
+    for column, columnDescr in columns.items():
+        output = np.lib.format.open_memmap(os.path.join(partDir, column + ".npy"), mode="w+",
+                                           dtype=np.lib.format.descr_to_dtype(columnDescr["dtype"]),
+                                           shape=tuple([nbrFrames] + columnDescr["shape"]))
+        frameIdx = 0
+        for archiveDir, manifest in zip(archiveDirs, manifests):
+            for chunk in manifest["chunks"]:
+                output[frameIdx:frameIdx + chunk["nbrFrames"]] = \
+                    np.load(os.path.join(archiveDir, chunk["name"], column + ".npy"), mmap_mode='r')
+                frameIdx += chunk["nbrFrames"]
+        output.flush()
+        del output
+    os.replace(partDir, os.path.join(outputDir, chunkName))
+
+    chunks = [chunk for manifest in manifests for chunk in manifest["chunks"]]
+    manifest = dict(manifests[0])
+    manifest["configHashes"] = sorted(set([manifest["configHash"] for manifest in manifests]))
+    manifest["sources"] = [os.path.abspath(archiveDir) for archiveDir in archiveDirs]
+    manifest["created"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    manifest["chunks"] = [{"name": chunkName,
+                           "firstFrame": 0,
+                           "nbrFrames": nbrFrames,
+                           "firstTimestamp": chunks[0]["firstTimestamp"] if chunks else None,
+                           "lastTimestamp": chunks[-1]["lastTimestamp"] if chunks else None}]
+    writeManifest(outputDir, manifest)
+
+    return nbrFrames
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description="Merge session archives into one single-chunk archive")
+    parser.add_argument("output", help="folder of the merged archive")
+    parser.add_argument("archives", nargs="+", help="session archives, in chronological order")
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    nbrFrames = consolidateArchives(args.archives, args.output)
+    print("{} frames from {} archives merged in {:.3f} s: {}".format(nbrFrames, len(args.archives),
+                                                                    time.perf_counter() - startTime, args.output))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+
+# -------------------------    MAIN   -----------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
\ No newline at end of file
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+# This file writes and reads the compact binary session log ("-Data-NNNN.bin"), written alongside the text log
+#
+# File layout (little-endian):
+#   - prefix: magic "RADARBIN", schema version (uint16), length of the description (uint32)
+#   - description: JSON text (schema version, config hash, number of echoes, record dtype, radar parameters)
+#   - records: one fixed-size record per frame (host timestamp + raw frame header + raw point cloud)
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import json         ## for the self-describing file header
+import os           ## for the file sizes
+import time         ## for the creation date
+
+import numpy as np  ## for the records
+
+from radarFormats import frameHeaderDtype, detectedObjDtype  ## binary layouts of the radar data
+
+# ---------------------- global variables []------------------
+
+binaryLogMagic = b"RADARBIN"
+binaryLogSchemaVersion = 1
+
+# Fixed start of the file, the JSON description follows
+binaryLogPrefixDtype = np.dtype([('magic',             'S8'),
+                                 ('schemaVersion',     '<u2'),
+                                 ('descriptionLength', '<u4')])
+
+binaryLogBufferSize = 2 ** 16  # in bytes, the file object only writes large blocks
+
+# ---------------------- Class [1]------------------
+
+class RadarBinaryLogWriter:
+    # Write one fixed-size record per frame, a new file is started when "maxFileBytes" is reached (0: never)
+    def __init__(self, baseName, nbrEchoes, configHash, configParameters, maxFileBytes=0):
+        self.baseName = baseName
+        self.nbrEchoes = nbrEchoes
+        self.configHash = configHash
+        self.configParameters = configParameters
+        self.maxFileBytes = maxFileBytes
+
+        self.recordDtype = binaryRecordDtype(nbrEchoes)
+        self.record = np.zeros(1, dtype=self.recordDtype)  # re-used for every frame
+
+        self.fileIdx = -1
+        self.file = None
+        self.fileBytes = 0
+        self.recordsWritten = 0
+        self.openNextFile()
+
+    def openNextFile(self):
+        ### Close the current file and start a new one with its own description
+        if self.file is not None:
+            self.file.close()
+        self.fileIdx += 1
+        self.fileName = "{}-{:04d}.bin".format(self.baseName, self.fileIdx)
+        self.file = open(self.fileName, "wb", buffering=binaryLogBufferSize)
+        self.fileBytes = self.file.write(buildFileHeader(self.nbrEchoes, self.recordDtype,
+                                                         self.configHash, self.configParameters))
+
+    def packFrame(self, parsedData, hostTimestamp):
+        ### Fill the record with a parsed frame, returns the record (re-used at the next call)
+        record = self.record[0]
+        record['hostTimestamp'] = hostTimestamp
+        record['frmhdr'] = parsedData.frmhdr.raw
+        record['xyzQFormat'] = int(parsedData.tlv_xyzQFormat).bit_length() - 1  # stored as N in 2^N
+        record['numStoredObj'] = parsedData.numStoredObj
+        record['points'] = 0
+        record['points'][:parsedData.numStoredObj] = parsedData.rawObjects
+        return self.record
+
+    def writeFrame(self, parsedData, hostTimestamp):
+        ### Append one parsed frame
+        self.writeRecords(self.packFrame(parsedData, hostTimestamp))
+
+    def writeRecords(self, records):
+        ### Append already packed records (one or many)
+        if self.maxFileBytes and self.fileBytes + records.nbytes > self.maxFileBytes:
+            self.openNextFile()
+        self.fileBytes += self.file.write(records.tobytes())
+        self.recordsWritten += len(records)
+
+    def writeBatch(self, recordsList):
+        ### Append a list of packed records in one write (sink of the writer thread)
+        self.writeRecords(np.concatenate(recordsList))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def binaryRecordDtype(nbrEchoes):
+    ### Layout of one record of the binary log: host timestamp, raw frame header and raw point cloud
+    ### Unused echoes of "points" are zeros, "numStoredObj" tells how many are valid
+
+    return np.dtype([('hostTimestamp', '<f8'),  # host time when the frame was received [s since epoch]
+                     ('frmhdr',        frameHeaderDtype),
+                     ('xyzQFormat',    '<u2'),  # N, the coordinates are in Q(N) format
+                     ('numStoredObj',  '<u2'),
+                     ('points',        detectedObjDtype, (nbrEchoes,))])
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildFileHeader(nbrEchoes, recordDtype, configHash, configParameters):
+    ### Bytes of the start of the file: fixed prefix + JSON description
+
+    description = {"schemaVersion": binaryLogSchemaVersion,
+                   "configHash": configHash,
+                   "nbrEchoes": nbrEchoes,
+                   "recordDtype": np.lib.format.dtype_to_descr(recordDtype),
+                   "configParameters": configParameters,
+                   "created": time.strftime("%Y-%m-%d %H:%M:%S")}
+    description = json.dumps(description).encode()
+
+    prefix = np.zeros(1, dtype=binaryLogPrefixDtype)
+    prefix['magic'] = binaryLogMagic
+    prefix['schemaVersion'] = binaryLogSchemaVersion
+    prefix['descriptionLength'] = len(description)
+
+    return prefix.tobytes() + description
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readBinaryLog(fileName):
+    ### Read a binary log file, returns the description (dict) and all the records (structured array)
+    ### An incomplete last record (power cut) is ignored
+
+    with open(fileName, "rb") as file:
+        prefix = np.frombuffer(file.read(binaryLogPrefixDtype.itemsize), dtype=binaryLogPrefixDtype)[0]
+        if prefix['magic'] != binaryLogMagic:
+            raise ValueError("{} is not a radar binary log".format(fileName))
+        if prefix['schemaVersion'] > binaryLogSchemaVersion:
+            raise ValueError("{}: unsupported schema version {}".format(fileName, prefix['schemaVersion']))
+        description = json.loads(file.read(int(prefix['descriptionLength'])).decode())
+
+    recordDtype = np.lib.format.descr_to_dtype([tuple(field) for field in description["recordDtype"]])
+    offset = binaryLogPrefixDtype.itemsize + int(prefix['descriptionLength'])
+    nbrRecords = (os.path.getsize(fileName) - offset) // recordDtype.itemsize
+
+    records = np.fromfile(fileName, dtype=recordDtype, count=nbrRecords, offset=offset)
+
+    return description, records
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def recordsToColumns(records):
+    ### Convert records into plain numpy columns, x/y/z in [m] (NaN for the unused echoes)
+
+    valid = np.arange(records['points'].shape[1]) < records['numStoredObj'][:, np.newaxis]
+    qFormat = (2.0 ** records['xyzQFormat'])[:, np.newaxis]
+
+    columns = {"hostTimestamp": records['hostTimestamp'],
+               "frameNumber": records['frmhdr']['frameNumber'],
+               "timeCpuCycles": records['frmhdr']['timeCpuCycles'],
+               "numDetectedObj": records['frmhdr']['numDetectedObj'],
+               "numStoredObj": records['numStoredObj']}
+
+    for field in ['x', 'y', 'z']:
+        columns[field] = np.where(valid, records['points'][field] / qFormat, np.nan)
+    for field in ['rangeIdx', 'dopplerIdx', 'peakVal']:
+        columns[field] = records['points'][field]
+
+    return columns
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+
+# This file contains everything about the raw captures of the radar DATA serial port
+#
+# A capture is made of 3 files:
+#   - "<name>.raw": every byte received, exactly as received (can be parsed like the serial port)
+#   - "<name>.raw.chunks": one record per serial read: host timestamp, offset and length in the .raw file
+#     or a gap record (offset "captureGapOffset"): bytes dropped by the logger (drive too slow) at this point of the
+#     .raw file, with the host time of the drop and the number of bytes lost. The data on both sides is not contiguous
+#   - "<name>.raw.idx": one record per complete frame: frame number, host timestamp, offset and length in the .raw file
+#     (written while recording, or rebuilt from the .raw file with "buildCaptureIndex")
+# The rotated .raw files can be compressed ("<name>.raw.gz" or "<name>.raw.xz"), the sidecar files never are
+# A .raw file without its .chunks file (e.g. the "-Raw.bin" debug file) can still be replayed, but not paced
+# The logger writes rotating captures "<testRef>-Raw-NNNN.raw" (+ .chunks) with "RawCaptureWriter", from the thread of
+# "RawCaptureRecorder" (large blocks, its own queue)
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import collections  ## for the queue of blocks of the recorder
+import gzip         ## for the compressed captures
+import io           ## for replaying the compressed captures
+import lzma         ## for the compressed captures
+import os           ## for the file sizes
+import threading    ## for the recorder thread
+import time         ## for pacing the replay
+
+import numpy as np  ## for the chunk records
+
+from radarFormats import findMagicWord, expectedMagicWord, frameHeaderDtype  ## to find the frames in the raw bytes
+
+# ---------------------- global variables []------------------
+
+captureChunksExtension = ".chunks"
+captureCompressedOpeners = {".gz": gzip.open, ".xz": lzma.open}  # compressed .raw files (see "SegmentCompressor")
+captureIndexExtension = ".idx"
+captureBufferSize = 2 ** 20  # in bytes, the file object only writes large blocks
+
+# One record per serial read
+captureChunkDtype = np.dtype([('hostTimestamp', '<f8'),  # host time when the bytes were received [s since epoch]
+                              ('offset',        '<u8'),  # position of the first byte in the .raw file
+                              ('length',        '<u4')])
+captureGapOffset = np.iinfo(np.uint64).max  # "offset" of a gap record, its "length" is the number of bytes dropped
+
+# Gaps of a capture (from the gap records of the .chunks file)
+captureGapDtype = np.dtype([('hostTimestamp', '<f8'),  # host time when the first dropped bytes were received [s since epoch]
+                            ('offset',        '<u8'),  # position of the gap in the .raw file (first byte after it)
+                            ('droppedBytes',  '<u8')])
+
+# One record per complete frame
+captureIndexDtype = np.dtype([('frameNumber',   '<u4'),
+                              ('hostTimestamp', '<f8'),  # host time when the last byte of the frame was received (NaN if unknown)
+                              ('offset',        '<u8'),  # position of the magic word in the .raw file
+                              ('packetLength',  '<u4')])
+
+captureMaxPacketLen = 2 ** 15     # in bytes, a longer "totalPacketLen" is a corrupted header (same as the frame extractor)
+captureIndexBlockSize = 2 ** 26   # in bytes, the index is rebuilt by blocks of this size (memory usage)
+
+# ---------------------- Class [5]------------------
+
+class RadarReplayPort:
+    # Replay a raw capture through the same interface as the serial port ("read", "in_waiting", ...)
+    # so "readAndParseData14xx" and "RadarSerialReader" can use it instead of the radar
+    #   - paced=False: as fast as possible, "chunkSize" bytes at a time
+    #   - paced=True: the bytes become available at the recorded times (divided by "speed")
+    # A read never crosses a gap of the capture, "lastGapBytes" is the number of bytes dropped just before the bytes of
+    # the last read (0: they follow the previous ones)
+    def __init__(self, fileName, paced=False, speed=1.0, chunkSize=4096, timeout=0.1):
+        self.fileName = fileName
+        if os.path.splitext(fileName)[1] in captureCompressedOpeners:
+            # The whole segment is decompressed in memory (one rotated segment is only a few MB)
+            self.file = io.BytesIO(loadCaptureBytes(fileName).tobytes())
+            self.fileSize = len(self.file.getbuffer())
+        else:
+            self.file = open(fileName, "rb")
+            self.fileSize = os.path.getsize(fileName)
+        self.position = 0
+        self.chunkSize = chunkSize
+        self.timeout = timeout
+        self.rtscts = 0
+        self.speed = speed
+
+        self.chunks = readCaptureChunks(fileName)
+        self.gaps = readCaptureGaps(fileName)
+        self.lastGapBytes = 0
+        self.paced = paced and self.chunks is not None
+        if paced and not self.paced:
+            print("No {} file for {}, replaying as fast as possible".format(captureChunksExtension, fileName))
+
+        if self.chunks is not None:
+            self.chunkEnds = (self.chunks['offset'] + self.chunks['length']).astype(np.int64)
+        if self.paced:
+            self.chunkTimes = (self.chunks['hostTimestamp'] - self.chunks['hostTimestamp'][0]) / speed
+            self.startTime = time.monotonic()
+
+    def available(self):
+        ### Number of bytes of the capture that can be read now
+        if not self.paced:
+            return self.fileSize
+        elapsed = time.monotonic() - self.startTime
+        nbrChunks = np.searchsorted(self.chunkTimes, elapsed, side='right')
+        return int(self.chunkEnds[nbrChunks - 1]) if nbrChunks else 0
+
+    def recordedTimestamp(self):
+        ### Host time when the last byte read was received during the capture, None without the .chunks file
+        if self.chunks is None or self.position == 0:
+            return None
+        chunkIdx = min(np.searchsorted(self.chunkEnds, self.position), len(self.chunkEnds) - 1)
+        return float(self.chunks['hostTimestamp'][chunkIdx])
+
+    @property
+    def in_waiting(self):
+        waiting = self.available() - self.position
+        return waiting if self.paced else min(waiting, self.chunkSize)
+
+    def eof(self):
+        ### True when the whole capture has been read
+        return self.position >= self.fileSize
+
+    def read(self, size=1):
+        ### Same as serial.Serial.read: wait (at most "timeout") until "size" bytes are available
+        if self.paced:
+            deadline = time.monotonic() + (self.timeout or 0)
+            while self.available() - self.position < size and not self.eof() and time.monotonic() < deadline:
+                time.sleep(0.001)
+            size = min(size, self.available() - self.position)
+
+        # Stop at the next gap: the bytes after it are not the continuation of the ones before
+        nextGaps = self.gaps['offset'][self.gaps['offset'] > self.position]
+        if nextGaps.size:
+            size = min(size, int(nextGaps[0]) - self.position)
+
+        data = self.file.read(size)
+        self.lastGapBytes = int(self.gaps['droppedBytes'][self.gaps['offset'] == self.position].sum()) if data else 0
+        self.position += len(data)
+        return data
+
+    def isOpen(self):
+        return self.file is not None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class RawCaptureWriter:
+    # Write the raw bytes of the DATA port to "<baseName>-NNNN.raw" + ".chunks" files, a new file is started
+    # when "maxFileBytes" is reached (0: never). Written by "RawCaptureRecorder": blocks of serial reads, and gaps
+    # With a "compressor", each full .raw file is handed to it (the sidecar files stay as they are)
+    def __init__(self, baseName, maxFileBytes=0, compressor=None):
+        self.baseName = baseName
+        self.maxFileBytes = maxFileBytes
+        self.compressor = compressor
+
+        self.fileIdx = -1
+        self.file = None
+        self.chunksFile = None
+        self.indexFile = None
+        self.indexer = None
+        self.fileBytes = 0
+        self.bytesWritten = 0
+        self.chunksWritten = 0
+        self.framesIndexed = 0
+        self.gapsWritten = 0
+        self.bytesDropped = 0  # bytes in the gaps
+        self.openNextFile()
+
+    def openNextFile(self):
+        ### Close the current files and start new ones
+        fullFile = self.file is not None
+        self.close()
+        if fullFile and self.compressor is not None:
+            self.compressor.submit(self.fileName)
+        self.fileIdx += 1
+        self.fileName = "{}-{:04d}.raw".format(self.baseName, self.fileIdx)
+        self.file = open(self.fileName, "wb", buffering=captureBufferSize)
+        self.chunksFile = open(self.fileName + captureChunksExtension, "wb", buffering=captureBufferSize)
+        self.indexFile = open(self.fileName + captureIndexExtension, "wb", buffering=captureBufferSize)
+        self.indexer = CaptureIndexer()  # a frame split over 2 files is in none of the indexes
+        self.fileBytes = 0
+
+    def writeBatch(self, chunks):
+        ### Append a list of (hostTimestamp, bytes) chunks
+        self.writeBlock([hostTimestamp for hostTimestamp, _ in chunks], [len(data) for _, data in chunks],
+                        b"".join([data for _, data in chunks]))
+
+    def writeBlock(self, timestamps, lengths, data):
+        ### Append a block of serial reads: their host timestamps, their lengths and all their bytes
+        ### Each file only contains whole blocks
+        blockBytes = len(data)
+        if self.maxFileBytes and self.fileBytes > 0 and self.fileBytes + blockBytes > self.maxFileBytes:
+            self.openNextFile()
+
+        records = np.zeros(len(lengths), dtype=captureChunkDtype)
+        records['hostTimestamp'] = timestamps
+        records['length'] = lengths
+        records['offset'] = self.fileBytes + np.cumsum(records['length'], dtype=np.uint64) - records['length']
+
+        self.file.write(data)
+        self.chunksFile.write(records.tobytes())
+
+        index = self.indexer.update(data, records)
+        self.indexFile.write(index.tobytes())
+        self.framesIndexed += len(index)
+
+        self.fileBytes += blockBytes
+        self.bytesWritten += blockBytes
+        self.chunksWritten += len(lengths)
+
+    def writeGap(self, hostTimestamp, droppedBytes):
+        ### Record that "droppedBytes" bytes, received from "hostTimestamp" on, are missing at the end of the file
+        maxLength = np.iinfo(captureChunkDtype['length']).max
+        records = np.zeros(-(-droppedBytes // maxLength), dtype=captureChunkDtype)  # a very long gap takes several records
+        records['hostTimestamp'] = hostTimestamp
+        records['offset'] = captureGapOffset
+        records['length'] = maxLength
+        records['length'][-1] = droppedBytes - maxLength * (len(records) - 1)
+        self.chunksFile.write(records.tobytes())
+
+        self.indexer.skipGap(self.fileBytes)  # a frame across the gap is in no index
+        self.gapsWritten += 1
+        self.bytesDropped += droppedBytes
+
+    def flush(self):
+        self.file.flush()
+        self.chunksFile.flush()
+        self.indexFile.flush()
+
+    def close(self):
+        for file in [self.file, self.chunksFile, self.indexFile]:
+            if file is not None:
+                file.close()
+        self.file = None
+        self.chunksFile = None
+        self.indexFile = None
+
+class RawCaptureRecorder(threading.Thread):
+    # Writer thread of the raw capture, with its own queue (the data logs have theirs, in "BatchedLogWriter")
+    # "submit" is called by the reader thread for every serial read: the bytes are appended to the current block, which
+    # is queued when it holds "blockBytes" or when its first read is "blockSeconds" old (one entry per block, not per read)
+    # The queue holds at most "maxQueuedBytes": when the drive stalls, the new blocks are dropped and a gap record
+    # (host time, number of bytes) is written to the .chunks file instead, so the replay knows the data is not contiguous
+    def __init__(self, captureWriter, blockBytes=2**16, blockSeconds=1.0, maxQueuedBytes=2**24):
+        threading.Thread.__init__(self, name="RawCaptureRecorder", daemon=True)
+        self.captureWriter = captureWriter
+        self.blockBytes = blockBytes
+        self.blockSeconds = blockSeconds
+        self.maxQueuedBytes = maxQueuedBytes
+        self.condition = threading.Condition()
+        self.blocks = collections.deque()  # ("block", timestamps, lengths, bytes) or ("gap", hostTimestamp, droppedBytes)
+        self.queuedBytes = 0  # bytes of the blocks waiting (or being written)
+        self.running = True
+        self.newBlock()
+
+        # Counters
+        self.blocksQueued = 0
+        self.blocksDropped = 0
+        self.bytesDropped = 0
+        self.maxQueuedBytesSeen = 0
+        self.error = None
+
+    def newBlock(self):
+        ### Start an empty block
+        self.blockTimestamps = []
+        self.blockLengths = []
+        self.blockData = bytearray()
+        self.blockStartTime = None  # time.monotonic() of its first read
+
+    def submit(self, hostTimestamp, data):
+        ### Add the bytes of one serial read, called by the reader thread (never blocks)
+        with self.condition:
+            if self.blockStartTime is None:
+                self.blockStartTime = time.monotonic()
+            self.blockTimestamps.append(hostTimestamp)
+            self.blockLengths.append(len(data))
+            self.blockData += data
+            if len(self.blockData) >= self.blockBytes:
+                self.queueBlock()
+
+    def queueBlock(self):
+        ### Move the current block to the queue, or replace it by a gap if the queue is full (lock held by the caller)
+        if not self.blockLengths:
+            return
+        blockBytes = len(self.blockData)
+        if self.queuedBytes + blockBytes > self.maxQueuedBytes:
+            self.blocksDropped += 1
+            self.bytesDropped += blockBytes
+            if self.blocks and self.blocks[-1][0] == "gap":
+                _, hostTimestamp, droppedBytes = self.blocks.pop()
+                self.blocks.append(("gap", hostTimestamp, droppedBytes + blockBytes))
+            else:
+                self.blocks.append(("gap", self.blockTimestamps[0], blockBytes))
+        else:
+            self.blocks.append(("block", self.blockTimestamps, self.blockLengths, self.blockData))
+            self.queuedBytes += blockBytes
+            self.maxQueuedBytesSeen = max(self.maxQueuedBytesSeen, self.queuedBytes)
+            self.blocksQueued += 1
+        self.newBlock()
+        self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                # Wait for a block, the current one is queued when it is old enough (the radar may have stopped)
+                while not self.blocks and self.running:
+                    waitSeconds = self.blockSeconds
+                    if self.blockStartTime is not None:
+                        waitSeconds = self.blockStartTime + self.blockSeconds - time.monotonic()
+                        if waitSeconds <= 0:
+                            self.queueBlock()
+                            continue
+                    self.condition.wait(waitSeconds)
+                if not self.blocks:
+                    break  # stopped and everything written
+                item = self.blocks.popleft()
+                lastItem = not self.blocks
+
+            self.writeItem(item)
+            if lastItem:
+                self.flushWriter()
+
+        self.captureWriter.close()
+
+    def writeItem(self, item):
+        ### Write a block or a gap, an error is counted as dropped bytes (the thread goes on with the next blocks)
+        try:
+            if item[0] == "gap":
+                _, hostTimestamp, droppedBytes = item
+                self.captureWriter.writeGap(hostTimestamp, droppedBytes)
+            else:
+                _, timestamps, lengths, data = item
+                self.captureWriter.writeBlock(timestamps, lengths, data)
+        except Exception as e:
+            self.error = e
+            print("Error while writing the raw capture: {}".format(e))
+            if item[0] == "block":
+                self.blocksDropped += 1
+                self.bytesDropped += len(item[3])
+
+        if item[0] == "block":
+            with self.condition:
+                self.queuedBytes -= len(item[3])
+
+    def flushWriter(self):
+        try:
+            self.captureWriter.flush()
+        except Exception as e:
+            self.error = e
+            print("Error while flushing the raw capture: {}".format(e))
+
+    def stop(self):
+        ### Queue the current block, write everything still queued, close the capture and wait for the thread
+        with self.condition:
+            self.queueBlock()
+            self.running = False
+            self.condition.notify()
+        self.join()
+
+    def statistics(self):
+        ### Counters of the recorder, as a dictionary
+        return {"bytesWritten": self.captureWriter.bytesWritten,
+                "blocksQueued": self.blocksQueued,
+                "blocksDropped": self.blocksDropped,
+                "bytesDropped": self.bytesDropped,
+                "gapsWritten": self.captureWriter.gapsWritten,
+                "queuedKB": round(self.queuedBytes / 1024, 1),
+                "maxQueuedKB": round(self.maxQueuedBytesSeen / 1024, 1)}
+
+class CaptureIndexer:
+    # Find the complete frames in a capture while it is written, one batch of chunks at a time
+    # The end of a batch that may be the start of a frame is kept for the next batch
+    def __init__(self):
+        self.tail = np.zeros(0, dtype='uint8')
+        self.tailOffset = 0  # position of the first byte of the tail in the .raw file
+
+    def update(self, data, chunks):
+        ### Index records of the frames completed by "data", "chunks" are its records (offsets in the .raw file)
+        byteVec = np.concatenate((self.tail, np.frombuffer(data, dtype='uint8')))
+        starts, headers, nextStart = scanFrames(byteVec)
+
+        index = np.zeros(len(starts), dtype=captureIndexDtype)
+        index['frameNumber'] = headers['frameNumber']
+        index['offset'] = self.tailOffset + starts
+        index['packetLength'] = headers['totalPacketLen']
+        index['hostTimestamp'] = frameTimestamps(chunks, index['offset'] + index['packetLength'])
+
+        self.tail = byteVec[nextStart:].copy()
+        self.tailOffset += nextStart
+        return index
+
+    def skipGap(self, offset):
+        ### Bytes are missing before "offset" (position in the .raw file): forget the incomplete frame of the tail
+        self.tail = np.zeros(0, dtype='uint8')
+        self.tailOffset = offset
+
+class RadarCaptureReader:
+    # Random access to the frames of a capture: the .raw file is memory-mapped, the frames are zero-copy views
+    # (a compressed .raw file is decompressed in memory first, the frames are then views on it)
+    # The index is read from the .idx file, or rebuilt (and saved) if there is none
+    def __init__(self, fileName, rebuildIndex=False):
+        self.fileName = fileName
+        self.data = loadCaptureBytes(fileName)
+
+        self.index = None if rebuildIndex else readCaptureIndex(fileName)
+        if self.index is None:
+            self.index = buildCaptureIndex(fileName, self.data)
+            self.index.tofile(captureSidecarName(fileName, captureIndexExtension))
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, frameIdx):
+        ### Bytes (uint8 view) of one frame, "frameIdx" is the position in the index
+        offset = int(self.index['offset'][frameIdx])
+        return self.data[offset:offset + int(self.index['packetLength'][frameIdx])]
+
+    def frames(self, start, stop):
+        ### Bytes (uint8 views) of the frames start to stop-1 of the index
+        return [self.frame(frameIdx) for frameIdx in range(start, min(stop, len(self.index)))]
+
+    def timeRange(self, startTime, stopTime):
+        ### (start, stop) positions in the index of the frames received between startTime and stopTime [s since epoch]
+        timestamps = self.index['hostTimestamp']
+        return int(np.searchsorted(timestamps, startTime, side='left')), \
+               int(np.searchsorted(timestamps, stopTime, side='right'))
+
+    def findFrameNumber(self, frameNumber):
+        ### Positions in the index of a frame number (several if the radar has been restarted)
+        return np.flatnonzero(self.index['frameNumber'] == frameNumber)
+
+    def close(self):
+        self.data = None
+
+# ---------------------- functions [9]-----------------------------------------
+
+# ***********************************************************************************************************************
+def captureSidecarName(fileName, extension):
+    ### Name of a sidecar file (.chunks, .idx) of a capture, the same for the plain and the compressed .raw file
+
+    baseName, compressedExtension = os.path.splitext(fileName)
+    if compressedExtension in captureCompressedOpeners:
+        fileName = baseName
+
+    return fileName + extension
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def loadCaptureBytes(fileName):
+    ### Bytes of a .raw file as a uint8 array: memory-mapped, or decompressed in memory for a compressed file
+
+    compressedExtension = os.path.splitext(fileName)[1]
+    if compressedExtension in captureCompressedOpeners:
+        with captureCompressedOpeners[compressedExtension](fileName, "rb") as file:
+            return np.frombuffer(file.read(), dtype='uint8')
+
+    if os.path.getsize(fileName) == 0:
+        return np.zeros(0, dtype='uint8')  # an empty file cannot be mapped
+
+    return np.memmap(fileName, dtype='uint8', mode='r')
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readCaptureChunkRecords(fileName):
+    ### Read all the records of the .chunks file of a capture (serial reads and gaps), None if it does not exist
+    ### An incomplete last record (power cut) is ignored
+
+    chunksFileName = captureSidecarName(fileName, captureChunksExtension)
+    if not os.path.isfile(chunksFileName):
+        return None
+
+    nbrChunks = os.path.getsize(chunksFileName) // captureChunkDtype.itemsize
+    return np.fromfile(chunksFileName, dtype=captureChunkDtype, count=nbrChunks)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readCaptureChunks(fileName):
+    ### Read the chunk records (serial reads) of a capture, None if the .chunks file does not exist
+
+    records = readCaptureChunkRecords(fileName)
+    if records is None:
+        return None
+
+    return records[records['offset'] != captureGapOffset]
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readCaptureGaps(fileName):
+    ### Gaps of a capture (bytes dropped by the logger), in the order of the .raw file, none without the .chunks file
+    ### A gap is at the end of the serial reads written before it
+
+    records = readCaptureChunkRecords(fileName)
+    if records is None or len(records) == 0:
+        return np.zeros(0, dtype=captureGapDtype)
+
+    isGap = records['offset'] == captureGapOffset
+    readEnds = np.zeros(len(records), dtype=np.uint64)
+    readEnds[~isGap] = records['offset'][~isGap] + records['length'][~isGap]
+
+    gaps = np.zeros(np.count_nonzero(isGap), dtype=captureGapDtype)
+    gaps['hostTimestamp'] = records['hostTimestamp'][isGap]
+    gaps['offset'] = np.maximum.accumulate(readEnds)[isGap]
+    gaps['droppedBytes'] = records['length'][isGap]
+    return gaps
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readCaptureIndex(fileName):
+    ### Read the frame index of a capture, None if the .idx file does not exist
+    ### An incomplete last record (power cut) is ignored
+
+    indexFileName = captureSidecarName(fileName, captureIndexExtension)
+    if not os.path.isfile(indexFileName):
+        return None
+
+    nbrFrames = os.path.getsize(indexFileName) // captureIndexDtype.itemsize
+    return np.fromfile(indexFileName, dtype=captureIndexDtype, count=nbrFrames)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def scanFrames(byteVec):
+    ### Find the complete frames of a byte vector, all at once
+    ### Returns their start positions, their headers and the position where the next scan has to start
+    ### (first incomplete frame, or the last bytes that can be the start of a magic word)
+
+    headerLen = frameHeaderDtype.itemsize
+    candidates = findMagicWord(byteVec, expectedMagicWord)
+
+    # Headers of the candidates, all at once
+    hasHeader = candidates + headerLen <= len(byteVec)
+    starts = candidates[hasHeader]
+    headers = byteVec[starts[:, None] + np.arange(headerLen)].view(frameHeaderDtype).ravel()
+
+    # A magic word with an impossible length is not a frame, a magic word inside the previous frame neither
+    lengths = headers['totalPacketLen'].astype(np.int64)
+    valid = (lengths >= headerLen) & (lengths <= captureMaxPacketLen)
+    starts, headers, lengths = starts[valid], headers[valid], lengths[valid]
+    previousEnds = np.maximum.accumulate(np.concatenate(([0], starts + lengths)))[:-1]
+    outside = starts >= previousEnds
+    starts, headers, lengths = starts[outside], headers[outside], lengths[outside]
+
+    complete = starts + lengths <= len(byteVec)
+    nextStart = max(len(byteVec) - (len(expectedMagicWord) - 1), 0)
+    if complete.any():
+        nextStart = max(nextStart, int(starts[complete][-1] + lengths[complete][-1]))
+    pending = np.concatenate((starts[~complete], candidates[~hasHeader]))
+    if pending.size:
+        nextStart = min(nextStart, int(pending.min()))
+
+    return starts[complete], headers[complete], nextStart
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def frameTimestamps(chunks, frameEnds):
+    ### Host timestamp of the chunk that brought the last byte of each frame, NaN without the chunk records
+
+    if chunks is None or len(chunks) == 0:
+        return np.full(len(frameEnds), np.nan)
+
+    chunkEnds = chunks['offset'].astype(np.int64) + chunks['length']
+    chunkIdx = np.minimum(np.searchsorted(chunkEnds, frameEnds, side='left'), len(chunks) - 1)
+    return chunks['hostTimestamp'][chunkIdx]
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildCaptureIndex(fileName, data=None):
+    ### Build the frame index of a capture from the .raw file (and the .chunks file for the timestamps)
+    ### The file is memory-mapped (unless its bytes are given) and scanned by blocks, each block in one vectorised pass
+
+    if data is None:
+        data = loadCaptureBytes(fileName)
+    fileSize = len(data)
+    if fileSize == 0:
+        return np.zeros(0, dtype=captureIndexDtype)
+
+    chunks = readCaptureChunks(fileName)
+
+    # The frames are never searched across a gap: the bytes on both sides are not contiguous
+    gapOffsets = [int(offset) for offset in readCaptureGaps(fileName)['offset'] if 0 < offset < fileSize]
+    segmentBounds = [0] + gapOffsets + [fileSize]
+
+    indexes = [np.zeros(0, dtype=captureIndexDtype)]
+    for segmentStart, segmentStop in zip(segmentBounds[:-1], segmentBounds[1:]):
+        blockStart = segmentStart
+        while blockStart < segmentStop:
+            blockStop = min(blockStart + captureIndexBlockSize, segmentStop)
+            starts, headers, nextStart = scanFrames(data[blockStart:blockStop])
+
+            index = np.zeros(len(starts), dtype=captureIndexDtype)
+            index['frameNumber'] = headers['frameNumber']
+            index['offset'] = blockStart + starts
+            index['packetLength'] = headers['totalPacketLen']
+            index['hostTimestamp'] = frameTimestamps(chunks, index['offset'] + index['packetLength'])
+            indexes.append(index)
+
+            if blockStop == segmentStop:
+                break
+            # The next block starts with what may be an incomplete frame (always some progress: blocks > 1 frame)
+            blockStart += max(nextStart, 1)
+
+    return np.concatenate(indexes)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# This file talks to the CLI (configuration) port of the radar: each command is sent as soon as the radar has answered
+# the previous one ("Done" or "Error ..." followed by the "mmwDemo:/>" prompt), instead of waiting a fixed time
+#   - every command has a timeout (longer for "sensorStart", which runs the calibration)
+#   - the round-trip time and the reply of every command are kept for the report
+#   - after a timeout, the late reply of the command is drained (or the CLI synchronised again) before the next one, and
+#     a reply that does not start with the echo of the command sent is skipped: a reply is never given to another command
+# Reply of the out-of-box demo to a command:
+#   <echo of the command>\r\n [Debug: ...\r\n] Done\r\n mmwDemo:/>
+#   or "Error <code>" / "'<word>' is not recognized as a CLI command" instead of "Done"
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import time         ## for the timeouts and the round-trip times
+
+# ---------------------- global variables []------------------
+
+cliPrompt = b"mmwDemo:/>"
+cliErrorMarkers = ["Error", "not recognized"]
+
+# ---------------------- Class [2]------------------
+
+class CliCommandResult:
+    # Answer of the radar to one command
+    def __init__(self, command):
+        self.command = command
+        self.status = "Timeout"  # "Done", "Error", "NoDone" (prompt without "Done") or "Timeout"
+        self.replyLines = []  # without the echo of the command
+        self.roundTrip = 0.0  # [s] from the write to the prompt (or the timeout)
+
+    @property
+    def ok(self):
+        return self.status == "Done"
+
+class RadarCliSession:
+    # Send commands on the CLI port, one at a time, each as soon as the prompt of the previous one arrived
+    # "serialPort" only needs write, read and in_waiting (serial.Serial, or a pseudo-terminal of the simulator)
+    def __init__(self, serialPort, commandTimeout=1.0, startTimeout=5.0):
+        self.serialPort = serialPort
+        self.commandTimeout = commandTimeout
+        self.startTimeout = startTimeout  # for "sensorStart"
+        self.buffer = b""
+        self.results = []
+        self.replyPending = False  # the last command timed out, its reply (and prompt) may still arrive
+        self.skippedReplies = 0  # replies skipped because they did not start with the echo of the command sent
+
+    def readUntilPrompt(self, timeout):
+        ### Text received before the next prompt (the prompt is removed), None if it did not arrive in time
+        return self.readUntilPromptBefore(time.monotonic() + timeout)
+
+    def readUntilPromptBefore(self, deadline):
+        ### Same as "readUntilPrompt", with the time limit given as a "time.monotonic()" deadline
+        while cliPrompt not in self.buffer:
+            if time.monotonic() >= deadline:
+                return None
+            # Blocks until at least 1 byte arrived or the serial timeout expired
+            self.buffer += self.serialPort.read(max(1, self.serialPort.in_waiting))
+
+        text, self.buffer = self.buffer.split(cliPrompt, 1)
+        return text.decode(errors="replace")
+
+    def synchronise(self):
+        ### Send an empty line and wait for the prompt, so the replies of previous commands are not mixed with ours
+        self.serialPort.write(b"\n")
+        promptOK = self.readUntilPrompt(self.commandTimeout) is not None
+        self.buffer = b""
+        self.replyPending = False
+        return promptOK
+
+    def resynchronise(self):
+        ### After a timeout: wait a little for the late reply of the previous command, else synchronise again
+        if self.readUntilPrompt(self.commandTimeout) is not None:
+            self.replyPending = False
+            return True
+        return self.synchronise()
+
+    def sendCommand(self, command):
+        ### Send one command and wait for its answer, returns a "CliCommandResult" (also kept in "results")
+        result = CliCommandResult(command)
+        timeout = self.startTimeout if command.startswith("sensorStart") else self.commandTimeout
+
+        if self.replyPending:
+            self.resynchronise()
+
+        startTime = time.monotonic()
+        deadline = startTime + timeout
+        self.serialPort.write((command + '\n').encode())
+        # The radar echoes the command first: a reply without our echo is a late one (or an empty line), skip it
+        while True:
+            reply = self.readUntilPromptBefore(deadline)
+            if reply is None:
+                break
+            lines = [line.strip() for line in reply.splitlines() if line.strip()]
+            if lines and lines[0].split() == command.split():
+                break
+            self.skippedReplies += 1
+        result.roundTrip = time.monotonic() - startTime
+
+        if reply is None:
+            self.replyPending = True
+        else:
+            lines = lines[1:]
+            result.replyLines = lines
+
+            if any([marker in line for line in lines for marker in cliErrorMarkers]):
+                result.status = "Error"
+            elif any(["Done" in line for line in lines]):
+                result.status = "Done"
+            else:
+                result.status = "NoDone"
+
+        self.results.append(result)
+        return result
+
+    def sendCommands(self, commands):
+        ### Send a list of commands (comments "%" and empty lines are skipped), returns True if all were "Done"
+        allOK = True
+        for command in commands:
+            command = command.strip()
+            if not command or command.startswith('%'):
+                continue
+            allOK = self.sendCommand(command).ok and allOK
+        return allOK
+
+    def report(self):
+        ### Lines of text with the round-trip time and the status of every command sent
+        lines = ["{:>9} {:>8}  {}".format("time[ms]", "status", "command")]
+        for result in self.results:
+            lines.append("{:>9.1f} {:>8}  {}".format(result.roundTrip * 1000, result.status, result.command))
+            if not result.ok:
+                for replyLine in result.replyLines:
+                    lines.append("{:>9} {:>8}    radar replied: {}".format("", "", replyLine))
+        totalTime = sum([result.roundTrip for result in self.results])
+        nbrFailed = len([result for result in self.results if not result.ok])
+        lines.append("{} commands in {:.1f} ms, {} failed".format(len(self.results), totalTime * 1000, nbrFailed))
+        if self.skippedReplies:
+            lines.append("{} late replies skipped".format(self.skippedReplies))
+        return lines
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
\ No newline at end of file
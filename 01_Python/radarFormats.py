@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# This file contains the binary layouts (numpy dtypes) of the radar messages and of the files written by the logger
+# It is shared by 'logRadar.py' and the tools around it (only definitions, and the search of the magic word in raw bytes)
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import numpy as np  ## for the dtypes
+
+# ---------------------- global variables []------------------
+
+expectedMagicWord = [2, 1, 4, 3, 6, 5, 8, 7]
+
+## Binary layouts of the radar messages (SDK 2.1, xWR14xx), all little-endian
+# Frame header, the SDK version is stored LSB first: (MajorNum x 2^24 + MinorNum x 2^16 + BugfixNum x 2^8 + BuildNum)
+frameHeaderDtype = np.dtype([('magicNumber',      'u1', (8,)),
+                             ('BuildNum',         'u1'),
+                             ('BugfixNum',        'u1'),
+                             ('MinorNum',         'u1'),
+                             ('MajorNum',         'u1'),
+                             ('totalPacketLen',   '<u4'),
+                             ('platform',         '<u4'),
+                             ('frameNumber',      '<u4'),
+                             ('timeCpuCycles',    '<u4'),
+                             ('numDetectedObj',   '<u4'),
+                             ('numTLVs',          '<u4')])
+
+# Header of each TLV message
+tlvHeaderDtype = np.dtype([('type', '<u4'), ('length', '<u4')])
+
+# Point cloud stored in "RadarData", one row per echo
+# The field order is the order of the columns of "globals.singleEchoFormat" (after the display count)
+radarPointDtype = np.dtype([('echoNumber',  '<i4'),
+                            ('isValid',     '?'),
+                            ('isConverted', '?'),
+                            ('x',           '<f8'),
+                            ('y',           '<f8'),
+                            ('z',           '<f8'),
+                            ('dopplerVal',  '<f8'),
+                            ('velocity',    '<f8'),
+                            ('rangeIdx',    '<u2'),
+                            ('rangeVal',    '<f8'),
+                            ('dopplerIdx',  '<u2'),
+                            ('peakVal',     '<u2'),
+                            ('elv',         '<f8'),
+                            ('azmth',       '<f8'),
+                            ('isKept',      '?')])  # not logged: passed the filters of "postprocessData14xx"
+
+# Fields written in the data log, in the order of "globals.singleEchoFormat"
+radarPointLogFields = list(radarPointDtype.names[:-1])
+
+# Default values of one echo (same as "RadarDetectedObject")
+radarPointTemplate = np.zeros(1, dtype=radarPointDtype)
+radarPointTemplate['echoNumber'] = 999
+
+# TLV types of the out-of-box demo (only 1 to 6 are sent by the xWR14xx)
+MMWDEMO_UART_MSG_DETECTED_POINTS = 1
+MMWDEMO_UART_MSG_RANGE_PROFILE = 2
+MMWDEMO_UART_MSG_NOISE_PROFILE = 3
+MMWDEMO_UART_MSG_AZIMUT_STATIC_HEAT_MAP = 4
+MMWDEMO_UART_MSG_RANGE_DOPPLER_HEAT_MAP = 5
+MMWDEMO_UART_MSG_STATS = 6
+
+# Range and noise profiles: one log magnitude per range bin (Q9)
+rangeProfileDtype = np.dtype('<u2')
+
+# Azimuth static heatmap: cmplx16ImRe_t, one per (range bin, virtual antenna), imaginary part first
+azimuthHeatmapDtype = np.dtype([('imag', '<i2'), ('real', '<i2')])
+
+# Range-Doppler heatmap: one log magnitude per (range bin, Doppler bin)
+rangeDopplerHeatmapDtype = np.dtype('<u2')
+
+# typedef struct MmwDemo_output_message_stats_t
+statsDtype = np.dtype([('interFrameProcessingTime',   '<u4'),  # [us]
+                       ('transmitOutputTime',         '<u4'),  # [us]
+                       ('interFrameProcessingMargin', '<u4'),  # [us]
+                       ('interChirpProcessingMargin', '<u4'),  # [us]
+                       ('activeFrameCPULoad',         '<u4'),  # [%]
+                       ('interFrameCPULoad',          '<u4')])  # [%]
+
+# Start of the detected points TLV
+detectedObjDescrDtype = np.dtype([('numDetectedObj', '<u2'), ('xyzQFormat', '<u2')])
+
+# typedef volatile struct MmwDemo_detectedObj_t
+# x, y and z are in meters, the Q format depends on the range resolution
+detectedObjDtype = np.dtype([('rangeIdx',   '<u2'),
+                             ('dopplerIdx', '<u2'),
+                             ('peakVal',    '<u2'),
+                             ('x',          '<i2'),
+                             ('y',          '<i2'),
+                             ('z',          '<i2')])
+
+# ---------------------- functions [1]-----------------------------------------
+
+# ***********************************************************************************************************************
+def findMagicWord(byteVec, magicWord):
+    ### Function to find all the occurrences of the magic word in a byte vector, in one vectorised pass
+    ### Returns the index of the first byte of each occurrence
+
+    magicLen = len(magicWord)
+    if len(byteVec) < magicLen:
+        return np.zeros(0, dtype=np.int64)
+
+    # Candidates: positions of the first char of the magic word (only where a whole word can fit)
+    candidates = np.flatnonzero(byteVec[:len(byteVec) - magicLen + 1] == magicWord[0])
+
+    if candidates.size:
+        # Compare the 8 bytes following each candidate with the magic word, all at once
+        windows = byteVec[candidates[:, None] + np.arange(magicLen)]
+        candidates = candidates[(windows == magicWord).all(axis=1)]
+
+    return candidates.astype(np.int64)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+# This file finds the 2 serial ports of the radar board from their USB attributes, without opening any port
+#   - Linux: the attributes of each /dev/ttyACM* and /dev/ttyUSB* are read from sysfs (/sys/class/tty/<name>/device)
+#   - other OS: the port list of pyserial (serial.tools.list_ports), which also reads the attributes only
+# The XDS110 debug probe of the AWR1443BOOST (VID:PID 0451:bef3, see "Help/log") has 2 UART interfaces:
+#   - interface 0: "XDS110 Class Application/User UART" -> CLI port (configuration)
+#   - interface 3: "XDS110 Class Auxiliary Data Port" -> DATA port
+# The result is cached for the session (the ports do not change while the logger runs)
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import glob         ## to list the tty devices in sysfs
+import os           ## to read the sysfs attributes
+import platform     ## for checking the platform (Win7 or raspberry pi)
+import re           ## to get the interface number from the pyserial location
+
+# ---------------------- global variables []------------------
+
+xds110UsbId = "0451:bef3"
+xds110CliInterface = 0
+xds110DataInterface = 3
+
+sysfsTtyFolder = "/sys/class/tty"
+sysfsTtyPatterns = ["ttyACM*", "ttyUSB*"]
+
+# Cache of "listUsbSerialPorts"
+discoveredPorts = None
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def readSysfsAttribute(folder, attributeName):
+    ### Content of a sysfs attribute file (stripped), None if it does not exist
+
+    try:
+        with open(os.path.join(folder, attributeName)) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def listSysfsSerialPorts():
+    ### USB serial ports described by sysfs: list of dicts (device, usbId "vvvv:pppp", interface, serialNumber)
+    ### For an ACM/USB serial tty, "device" is the USB interface folder, its parent is the USB device folder
+
+    ports = []
+    for pattern in sysfsTtyPatterns:
+        for ttyFolder in sorted(glob.glob(os.path.join(sysfsTtyFolder, pattern))):
+            interfaceFolder = os.path.realpath(os.path.join(ttyFolder, "device"))
+            usbDeviceFolder = os.path.dirname(interfaceFolder)
+
+            vendorId = readSysfsAttribute(usbDeviceFolder, "idVendor")
+            productId = readSysfsAttribute(usbDeviceFolder, "idProduct")
+            interface = readSysfsAttribute(interfaceFolder, "bInterfaceNumber")
+            if vendorId is None or productId is None or interface is None:
+                continue  # not a USB device
+
+            ports.append({"device": "/dev/" + os.path.basename(ttyFolder),
+                          "usbId": "{}:{}".format(vendorId, productId).lower(),
+                          "interface": int(interface, 16),
+                          "serialNumber": readSysfsAttribute(usbDeviceFolder, "serial")})
+
+    return ports
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def listPyserialPorts():
+    ### USB serial ports from pyserial (Windows, macOS), same dicts as "listSysfsSerialPorts"
+    ### The interface number is the end of the location ("1-1.2:x.3" or "1-1.2:1.3"), -1 if unknown
+
+    from serial.tools import list_ports  ## only needed here
+
+    ports = []
+    for portInfo in list_ports.comports():
+        if portInfo.vid is None or portInfo.pid is None:
+            continue
+        match = re.search(r":[^.]*\.(\d+)$", portInfo.location or "")
+        ports.append({"device": portInfo.device,
+                      "usbId": "{:04x}:{:04x}".format(portInfo.vid, portInfo.pid),
+                      "interface": int(match.group(1)) if match else -1,
+                      "serialNumber": portInfo.serial_number})
+
+    return ports
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def listUsbSerialPorts(refresh=False):
+    ### USB serial ports of the system (cached for the session unless "refresh")
+
+    global discoveredPorts
+
+    if discoveredPorts is None or refresh:
+        if platform.system() == 'Linux':
+            discoveredPorts = listSysfsSerialPorts()
+        else:
+            try:
+                discoveredPorts = listPyserialPorts()
+            except ImportError:
+                discoveredPorts = []
+
+    return discoveredPorts
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def findRadarPorts(usbId=xds110UsbId, cliInterface=xds110CliInterface, dataInterface=xds110DataInterface, refresh=False):
+    ### Find the CLI and DATA ports of the radar board, returns (cliPort, dataPort), None for a port not found
+    ### With several boards plugged in, the first one (lowest serial number) is used
+
+    radarPorts = [port for port in listUsbSerialPorts(refresh) if port["usbId"] == usbId.lower()]
+    serialNumbers = sorted(set([str(port["serialNumber"]) for port in radarPorts]))
+    if len(serialNumbers) > 1:
+        print("{} boards {} found ({}), using {}".format(len(serialNumbers), usbId, serialNumbers, serialNumbers[0]))
+
+    cliPort = None
+    dataPort = None
+    for port in radarPorts:
+        if str(port["serialNumber"]) != serialNumbers[0]:
+            continue
+        if port["interface"] == cliInterface:
+            cliPort = port["device"]
+        elif port["interface"] == dataInterface:
+            dataPort = port["device"]
+
+    return cliPort, dataPort
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# This file contains the timing of the stages of the acquisition loop of 'logRadar.py' (switched on in Parameter.ini)
+#   - wall time with time.perf_counter_ns, CPU time of the calling thread with time.thread_time_ns
+#   - the last "windowSize" durations of each stage are kept for the percentiles (p50/p95/p99), max and totals since the start
+#   - the CPU time of the whole process (user/system) and the peak memory come from "resource" (not on Windows)
+# The stages can be timed from several threads (e.g. serial read in the reader thread), as long as each stage is
+# always timed by the same thread
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import collections  ## for the rolling windows
+import time         ## for the timers
+
+import numpy as np  ## for the percentiles
+
+try:
+    import resource  ## for the CPU time of the whole process (Linux only)
+except ImportError:
+    resource = None
+
+# ---------------------- global variables []------------------
+
+# Stages of the acquisition loop, in the order of the report
+# "serialWait" is the blocking read of the DATA port: mostly idle time waiting for the UART, not a processing cost
+acquisitionStages = ["serialWait", "serialRead", "magicSync", "decode", "postprocess", "elevation", "format", "logInfo", "frame"]
+
+stagePercentiles = [50, 95, 99]
+
+# ---------------------- Class [2]------------------
+
+class StageStatistics:
+    # Durations of one stage: rolling window [ns] and totals since the start
+    def __init__(self, windowSize):
+        self.wallTimes = collections.deque(maxlen=windowSize)
+        self.count = 0
+        self.totalWall = 0  # [ns]
+        self.totalCpu = 0  # [ns]
+        self.maxWall = 0  # [ns]
+
+    def add(self, wallTime, cpuTime):
+        self.wallTimes.append(wallTime)
+        self.count += 1
+        self.totalWall += wallTime
+        self.totalCpu += cpuTime
+        if wallTime > self.maxWall:
+            self.maxWall = wallTime
+
+class StageTimer:
+    # Timing of named stages: "stamp = start()", then "stop(stageName, stamp)" at the end of the stage
+    # With enabled=False, "start" and "stop" do nothing (the acquisition loop does not need to check)
+    def __init__(self, stageNames, windowSize=1000, enabled=True):
+        self.enabled = enabled
+        self.stages = {stageName: StageStatistics(windowSize) for stageName in stageNames}
+        self.startWall = time.perf_counter_ns()
+        self.startCpu = processCpuTimes()
+
+    def start(self):
+        ### Time stamp of the start of a stage (wall, CPU of this thread)
+        if not self.enabled:
+            return None
+        return time.perf_counter_ns(), time.thread_time_ns()
+
+    def stop(self, stageName, stamp):
+        ### End of a stage started with "start", returns the stamp of now (to chain the stages)
+        if stamp is None:
+            return None
+        now = time.perf_counter_ns(), time.thread_time_ns()
+        self.stages[stageName].add(now[0] - stamp[0], now[1] - stamp[1])
+        return now
+
+    def statistics(self):
+        ### Statistics of each stage, as a dictionary of dictionaries (durations in [us])
+        statistics = {}
+        for stageName, stage in self.stages.items():
+            if not stage.count:
+                continue
+            percentiles = np.percentile(np.array(stage.wallTimes), stagePercentiles) / 1000
+            stageStatistics = {"count": stage.count}
+            for percentile, value in zip(stagePercentiles, percentiles):
+                stageStatistics["p{}".format(percentile)] = round(float(value), 1)
+            stageStatistics["max"] = round(stage.maxWall / 1000, 1)
+            stageStatistics["wallMean"] = round(stage.totalWall / stage.count / 1000, 1)
+            stageStatistics["cpuMean"] = round(stage.totalCpu / stage.count / 1000, 1)
+            stageStatistics["cpuTotal[s]"] = round(stage.totalCpu / 1e9, 3)
+            statistics[stageName] = stageStatistics
+        return statistics
+
+    def report(self):
+        ### Lines of text of the stage statistics, for the console
+        elapsed = (time.perf_counter_ns() - self.startWall) / 1e9
+        lines = ["Stage timings [us] over the last frames (cpu: time of the thread running the stage), {:.0f} s elapsed".format(elapsed),
+                 "{:>12} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10} {:>7}".format(
+                     "stage", "count", "p50", "p95", "p99", "max", "wallMean", "cpuMean", "cpuTot[s]", "cpu[%]")]
+        for stageName, stageStatistics in self.statistics().items():
+            lines.append("{:>12} {:>8d} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>10.3f} {:>7.2f}".format(
+                stageName, stageStatistics["count"], stageStatistics["p50"], stageStatistics["p95"],
+                stageStatistics["p99"], stageStatistics["max"], stageStatistics["wallMean"],
+                stageStatistics["cpuMean"], stageStatistics["cpuTotal[s]"],
+                100 * stageStatistics["cpuTotal[s]"] / elapsed if elapsed > 0 else 0.0))
+
+        cpuTimes = processCpuTimes()
+        if cpuTimes is not None:
+            lines.append("Process: user {:.3f} s, system {:.3f} s ({:.1f} % of one core), peak memory {} kB".format(
+                cpuTimes[0] - self.startCpu[0], cpuTimes[1] - self.startCpu[1],
+                100 * (cpuTimes[0] + cpuTimes[1] - self.startCpu[0] - self.startCpu[1]) / elapsed if elapsed > 0 else 0.0,
+                cpuTimes[2]))
+        return lines
+
+# ---------------------- functions [1]-----------------------------------------
+
+# ***********************************************************************************************************************
+def processCpuTimes():
+    ### User and system CPU time [s] of the process and its peak memory [kB], None where "resource" does not exist
+
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime, usage.ru_stime, usage.ru_maxrss
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
\ No newline at end of file
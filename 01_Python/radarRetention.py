@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+
+# This file keeps the data folder of the logger within a budget, so old sessions never fill the USB drive
+#   - a session is a sub folder of the data folder (Data/<testRef>), or its archive once compressed (<testRef>.tar.gz)
+#   - the budget is a size (bytes), a share of the drive (percent) and/or a free space to keep on the drive
+#   - when it is exceeded, the oldest sessions are compressed into a single archive (if "compress"), then the oldest
+#     archives/sessions are deleted, until the budget is met again
+#   - the active session (the one being logged) is never touched
+# The check runs in a background thread every "intervalSeconds" (and once at the start)
+# The archive is written to a temporary file then renamed: a power cut never leaves a truncated archive
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import os           ## for the sizes and the deletion of the files
+import shutil       ## to delete the session folders
+import tarfile      ## to compress a session folder into a single archive
+import threading    ## for the retention thread
+
+import radarStorage  ## for the free space of the drive
+
+# ---------------------- global variables []------------------
+
+# Compression of the archives (same names as the segment compression of the logs), extension and tarfile mode
+archiveMethods = {"gzip": (".tar.gz", "w:gz"),
+                  "lzma": (".tar.xz", "w:xz")}
+archiveExtensions = [extension for extension, mode in archiveMethods.values()]
+
+# ---------------------- Class [2]------------------
+
+class RetentionStopped(Exception):
+    # The retention thread was asked to stop while compressing a session
+    pass
+
+class SessionRetention(threading.Thread):
+    # Background thread enforcing the budget of the data folder "dataFolder", without touching "activeSession"
+    # "maxBytes": maximum size of all the sessions (0: no limit)
+    # "maxPercent": maximum size of all the sessions, in percent of the size of the drive (0: no limit)
+    # "minFreeBytes": free space to keep on the drive (0: no limit)
+    # "action": "compress" (then delete the oldest archives if still needed) or "delete"
+    def __init__(self, dataFolder, activeSession, maxBytes=0, maxPercent=0.0, minFreeBytes=0, action="compress",
+                 method="gzip", level=6, intervalSeconds=60.0):
+        threading.Thread.__init__(self, name="SessionRetention", daemon=True)
+        self.dataFolder = dataFolder
+        self.activeSession = activeSession
+        self.maxBytes = maxBytes
+        self.maxPercent = maxPercent
+        self.minFreeBytes = minFreeBytes
+        self.action = action
+        self.extension, self.tarMode = archiveMethods.get(method, archiveMethods["gzip"])
+        self.level = level
+        self.intervalSeconds = intervalSeconds
+        self.stopEvent = threading.Event()
+        self.overBudget = False  # only the active session is left and it is over the budget
+
+        # Counters
+        self.sessionsBytes = 0  # size of all the sessions at the last check (active one included)
+        self.checks = 0
+        self.sessionsCompressed = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.sessionsDeleted = 0
+        self.bytesDeleted = 0
+        self.partsRemoved = 0  # temporary archives left by an interrupted compression (power cut, error)
+        self.error = None
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            try:
+                self.applyRetention()
+            except RetentionStopped:
+                break
+            except OSError as e:
+                # Try again at the next check
+                self.error = e
+                print("Error while applying the retention of {}: {}".format(self.dataFolder, e))
+            self.stopEvent.wait(self.intervalSeconds)
+
+    def budgetBytes(self, totalDriveBytes):
+        ### Maximum size of the sessions from "maxBytes" and "maxPercent" (the smallest), None if no limit
+        limits = []
+        if self.maxBytes > 0:
+            limits.append(self.maxBytes)
+        if self.maxPercent > 0:
+            limits.append(int(totalDriveBytes * self.maxPercent / 100))
+        return min(limits) if limits else None
+
+    def excessBytes(self, sessions):
+        ### Number of bytes to free to meet the budget (<= 0: nothing to do)
+        self.sessionsBytes = sum([session["bytes"] for session in sessions])
+        totalDriveBytes, freeBytes = radarStorage.driveUsage(self.dataFolder)
+
+        excess = self.minFreeBytes - freeBytes if self.minFreeBytes > 0 else 0
+        budget = self.budgetBytes(totalDriveBytes)
+        if budget is not None:
+            excess = max(excess, self.sessionsBytes - budget)
+        return excess
+
+    def applyRetention(self):
+        ### Compress then delete the oldest sessions until the budget is met, returns the number of bytes freed
+        self.checks += 1
+        self.partsRemoved += removeStaleParts(self.dataFolder)
+        sessions = listSessions(self.dataFolder, self.activeSession)
+        excess = self.excessBytes(sessions)
+        freedBytes = 0
+
+        # First compress the oldest sessions (the archive replaces the folder, the session is still there)
+        if self.action == "compress":
+            for session in sessions:
+                if freedBytes >= excess:
+                    break
+                if session["active"] or session["archive"]:
+                    continue
+                try:
+                    archiveBytes = self.compressSession(session)
+                except OSError as e:
+                    # Most likely the drive is full (ENOSPC): no more compression, the oldest sessions are deleted below
+                    self.error = e
+                    print("Retention: could not compress session {}: {}".format(session["name"], e))
+                    break
+                freedBytes += session["bytes"] - archiveBytes
+                session["archive"] = True
+                session["bytes"] = archiveBytes
+
+        # Not enough: delete the oldest sessions (the archives of the previous step included)
+        for session in sessions:
+            if freedBytes >= excess:
+                break
+            if session["active"]:
+                continue
+            try:
+                self.deleteSession(session)
+            except OSError as e:
+                self.error = e
+                print("Retention: could not delete session {}: {}".format(session["name"], e))
+                continue
+            freedBytes += session["bytes"]
+
+        # Only say it once, the active session keeps growing until the end
+        if freedBytes < excess and not self.overBudget:
+            print("Retention: {:.1f} MB still over the budget of {}, only the active session is left".format(
+                (excess - freedBytes) / 2**20, self.dataFolder))
+        self.overBudget = freedBytes < excess
+        return freedBytes
+
+    def compressSession(self, session):
+        ### Compress a session folder into one archive, then delete the folder, returns the size of the archive
+        archivePath = session["path"] + self.extension
+        temporaryPath = archivePath + ".part"
+        tarOptions = {"preset": self.level} if self.tarMode == "w:xz" else {"compresslevel": self.level}
+
+        try:
+            with tarfile.open(temporaryPath, self.tarMode, **tarOptions) as archive:
+                archive.add(session["path"], arcname=session["name"], recursive=False)
+                for folder, subFolders, fileNames in os.walk(session["path"]):
+                    subFolders.sort()
+                    for name in sorted(subFolders) + sorted(fileNames):
+                        # The archive of a big session takes a while, check if we have to stop between the files
+                        if self.stopEvent.is_set():
+                            raise RetentionStopped
+                        path = os.path.join(folder, name)
+                        archive.add(path, arcname=os.path.relpath(path, self.dataFolder), recursive=False)
+        except BaseException:
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+            raise
+
+        os.replace(temporaryPath, archivePath)
+        shutil.rmtree(session["path"])
+
+        archiveBytes = os.path.getsize(archivePath)
+        self.sessionsCompressed += 1
+        self.bytesIn += session["bytes"]
+        self.bytesOut += archiveBytes
+        print("Retention: session {} compressed ({:.1f} MB -> {:.1f} MB)".format(
+            session["name"], session["bytes"] / 2**20, archiveBytes / 2**20))
+        session["path"] = archivePath
+        return archiveBytes
+
+    def deleteSession(self, session):
+        ### Delete a session (folder or archive)
+        if os.path.isdir(session["path"]):
+            shutil.rmtree(session["path"])
+        else:
+            os.remove(session["path"])
+        self.sessionsDeleted += 1
+        self.bytesDeleted += session["bytes"]
+        print("Retention: session {} deleted ({:.1f} MB)".format(session["name"], session["bytes"] / 2**20))
+
+    def stop(self):
+        ### Stop the thread (a compression in progress is abandoned, its temporary file removed)
+        self.stopEvent.set()
+        self.join()
+
+    def statistics(self):
+        ### Counters of the retention, as a dictionary
+        return {"sessionsMB": round(self.sessionsBytes / 2**20, 1),
+                "checks": self.checks,
+                "overBudget": self.overBudget,
+                "sessionsCompressed": self.sessionsCompressed,
+                "bytesIn": self.bytesIn,
+                "bytesOut": self.bytesOut,
+                "sessionsDeleted": self.sessionsDeleted,
+                "bytesDeleted": self.bytesDeleted,
+                "partsRemoved": self.partsRemoved}
+
+# ---------------------- functions [3]-----------------------------------------
+
+# ***********************************************************************************************************************
+def folderBytes(folder):
+    ### Size of all the files of a folder and its sub folders [bytes]
+
+    totalBytes = 0
+    for parentFolder, subFolders, fileNames in os.walk(folder):
+        for fileName in fileNames:
+            try:
+                totalBytes += os.path.getsize(os.path.join(parentFolder, fileName))
+            except OSError:
+                pass  # deleted in the meantime (rotated, compressed)
+    return totalBytes
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def listSessions(dataFolder, activeSession=None):
+    ### Sessions of the data folder, oldest first: list of dicts (name, path, bytes, archive, active)
+    ### The session names are the start time (testRef, "%Y-%m-%d--%H-%M-%S"), so they sort in chronological order
+    ### Temporary archives (".part") are not sessions, see "removeStaleParts"
+
+    sessions = []
+    for entry in os.scandir(dataFolder):
+        name = entry.name
+        if entry.is_dir(follow_symlinks=False):
+            sessions.append({"name": name, "path": entry.path, "bytes": folderBytes(entry.path), "archive": False})
+        elif entry.is_file(follow_symlinks=False):
+            extensions = [extension for extension in archiveExtensions if name.endswith(extension)]
+            if not extensions:
+                continue
+            name = name[:-len(extensions[0])]
+            sessions.append({"name": name, "path": entry.path, "bytes": entry.stat().st_size, "archive": True})
+
+    for session in sessions:
+        session["active"] = session["name"] == activeSession
+    sessions.sort(key=lambda session: (session["name"], session["archive"]))
+    return sessions
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def removeStaleParts(dataFolder):
+    ### Delete the temporary archives (".part") of the data folder, returns how many were deleted
+    ### Only called between 2 compressions: a ".part" found then was left by an interrupted one (power cut, error)
+
+    nbrRemoved = 0
+    for entry in os.scandir(dataFolder):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        if not any([entry.name.endswith(extension + ".part") for extension in archiveExtensions]):
+            continue
+        try:
+            os.remove(entry.path)
+            nbrRemoved += 1
+        except OSError:
+            pass  # try again at the next check
+    return nbrRemoved
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# This file simulates the AWR1443 (out-of-box demo firmware) on 2 pseudo-terminals, so 'logRadar.py' can run without the radar
+# Usage: python3 radarSimulator.py [--rate HZ] [--objects N] [--range-bins N] [--cli-link PATH] [--data-link PATH]
+#   - CLI port: every command is answered with "Done" and the "mmwDemo:/>" prompt
+#   - DATA port: after "sensorStart", synthetic TLV packets (magic word + SDK 2.1 header) are sent at the frame rate
+# Put the 2 printed paths (or the links) in "serialConfigName_RPi" and "serialDataName_RPi" of the Parameter.ini file
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import argparse     ## for the command line options
+import errno        ## for the non-blocking writes
+import os           ## for the pseudo-terminals
+import select       ## to wait for the CLI commands with a timeout
+import threading    ## for the CLI and DATA threads
+import time         ## for the frame rate
+import tty          ## to put the pseudo-terminals in raw mode
+
+import numpy as np  ## for the random point clouds
+
+import radarSynthetic   ## to build the radar frames
+
+# ---------------------- global variables []------------------
+
+simulatorPrompt = b"mmwDemo:/>"
+simulatorCpuFrequency = 200e6  # [Hz] clock of the R4F, unit of "timeCpuCycles"
+
+# ---------------------- Class [1]------------------
+
+class RadarSimulator:
+    # Two pseudo-terminals (CLI and DATA) behaving like the radar
+    #   - frameRate <= 0: use the "frameCfg" periodicity sent on the CLI port
+    #   - numRangeBins < 0: send the range profile if "guiMonitor" asks for it, with the "profileCfg" number of bins
+    # The DATA port is written without blocking: if the logger does not read fast enough,
+    # what does not fit in the pseudo-terminal is dropped, like the UART of the radar would
+    def __init__(self, frameRate=0.0, numObj=10, numRangeBins=-1, seed=0):
+        self.frameRate = frameRate
+        self.numObj = numObj
+        self.numRangeBins = numRangeBins
+        self.rng = np.random.default_rng(seed)
+
+        # Parameters sent on the CLI port (same defaults as the radar configuration file)
+        self.configFramePeriod = 0.125  # [s]
+        self.configRangeBins = 256
+        self.configRangeProfile = False
+
+        # The slave ends stay open here, so the logger can close and re-open the ports
+        self.cliMaster, self.cliSlave = os.openpty()
+        self.dataMaster, self.dataSlave = os.openpty()
+        for fd in [self.cliSlave, self.dataSlave]:
+            tty.setraw(fd)
+        os.set_blocking(self.dataMaster, False)
+        self.cliName = os.ttyname(self.cliSlave)
+        self.dataName = os.ttyname(self.dataSlave)
+
+        self.sensorStarted = threading.Event()
+        self.stopEvent = threading.Event()
+        self.threads = [threading.Thread(target=self.runCli, name="RadarSimulatorCLI", daemon=True),
+                        threading.Thread(target=self.runData, name="RadarSimulatorDATA", daemon=True)]
+
+        # Counters
+        self.commandsReceived = 0
+        self.framesSent = 0
+        self.framesDropped = 0  # not (or only partially) written because the DATA port was full
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.sensorStarted.set()  # wake up the DATA thread
+        for thread in self.threads:
+            thread.join()
+        for fd in [self.cliMaster, self.cliSlave, self.dataMaster, self.dataSlave]:
+            os.close(fd)
+
+    def runCli(self):
+        ### Answer the commands of the CLI port, one line at a time
+        line = b""
+        while not self.stopEvent.is_set():
+            readable, _, _ = select.select([self.cliMaster], [], [], 0.1)
+            if not readable:
+                continue
+            line += os.read(self.cliMaster, 1024)
+            while b"\n" in line:
+                command, line = line.split(b"\n", 1)
+                self.handleCommand(command.decode(errors="replace").strip())
+
+    def handleCommand(self, command):
+        ### Echo the command, apply it and reply like the demo firmware
+        self.commandsReceived += 1
+        reply = command + "\r\n"
+        words = command.split()
+
+        if not words:
+            reply = "\r\n"
+        elif words[0] == "sensorStart":
+            self.sensorStarted.set()
+            reply += "Done\r\n"
+        elif words[0] == "sensorStop":
+            self.sensorStarted.clear()
+            reply += "Done\r\n"
+        elif words[0] == "frameCfg" and len(words) > 5:
+            self.configFramePeriod = float(words[5]) / 1000
+            reply += "Done\r\n"
+        elif words[0] == "profileCfg" and len(words) > 10:
+            self.configRangeBins = 1 << (int(words[10]) - 1).bit_length()  # rounded up to a power of 2
+            reply += "Done\r\n"
+        elif words[0] == "guiMonitor" and len(words) > 2:
+            self.configRangeProfile = words[2] == "1"
+            reply += "Done\r\n"
+        else:
+            reply += "Done\r\n"
+
+        os.write(self.cliMaster, reply.encode() + simulatorPrompt)
+
+    def runData(self):
+        ### Send the frames at the frame rate while the sensor is started
+        while not self.stopEvent.is_set():
+            self.sensorStarted.wait()
+            framePeriod = 1.0 / self.frameRate if self.frameRate > 0 else self.configFramePeriod
+            numRangeBins = self.numRangeBins
+            if numRangeBins < 0:
+                numRangeBins = self.configRangeBins if self.configRangeProfile else 0
+
+            # Deadlines are computed from the start, so a late frame does not slow down the next ones
+            startTime = time.monotonic()
+            frameNumber = 1
+            while self.sensorStarted.is_set() and not self.stopEvent.is_set():
+                elapsed = time.monotonic() - startTime
+                frame = radarSynthetic.buildSyntheticFrame(frameNumber, self.numObj, rng=self.rng,
+                                                           numRangeBins=numRangeBins,
+                                                           timeCpuCycles=int(elapsed * simulatorCpuFrequency) & 0xFFFFFFFF)
+                self.writeFrame(frame)
+                frameNumber += 1
+
+                sleepTime = startTime + (frameNumber - 1) * framePeriod - time.monotonic()
+                if sleepTime > 0:
+                    time.sleep(sleepTime)
+
+    def writeFrame(self, frame):
+        ### Write a frame without blocking, the end that does not fit is lost
+        try:
+            written = os.write(self.dataMaster, frame)
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+            written = 0
+
+        if written == len(frame):
+            self.framesSent += 1
+        else:
+            self.framesDropped += 1
+
+    def statistics(self):
+        ### Counters of the simulator, as a dictionary
+        return {"commandsReceived": self.commandsReceived,
+                "framesSent": self.framesSent,
+                "framesDropped": self.framesDropped}
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def createLink(linkName, target):
+    ### Make "linkName" point to "target", replacing an older link
+
+    if os.path.islink(linkName):
+        os.remove(linkName)
+    os.symlink(target, linkName)
+    print("{} -> {}".format(linkName, target))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description="AWR1443 simulator on 2 pseudo-terminals")
+    parser.add_argument("--rate", type=float, default=0.0, help="frame rate [Hz], default: frameCfg of the configuration")
+    parser.add_argument("--objects", type=int, default=10, help="number of detected objects per frame")
+    parser.add_argument("--range-bins", type=int, default=-1,
+                        help="number of range profile bins (0: no range profile), default: guiMonitor + profileCfg")
+    parser.add_argument("--cli-link", default=None, help="symbolic link to create to the CLI port")
+    parser.add_argument("--data-link", default=None, help="symbolic link to create to the DATA port")
+    parser.add_argument("--duration", type=float, default=0.0, help="stop after this time [s] (0: Ctrl+c)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random point clouds")
+    args = parser.parse_args()
+
+    simulator = RadarSimulator(args.rate, args.objects, args.range_bins, args.seed)
+
+    print("-" * 50)
+    print("serialConfigName_RPi = {}".format(simulator.cliName))
+    print("serialDataName_RPi   = {}".format(simulator.dataName))
+    if args.cli_link:
+        createLink(args.cli_link, simulator.cliName)
+    if args.data_link:
+        createLink(args.data_link, simulator.dataName)
+    print("-" * 50)
+
+    simulator.start()
+    startTime = time.monotonic()
+    try:
+        while args.duration <= 0 or time.monotonic() - startTime < args.duration:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+
+    simulator.stop()
+    for linkName in [args.cli_link, args.data_link]:
+        if linkName and os.path.islink(linkName):
+            os.remove(linkName)
+
+    print("Simulator statistics: {}".format(simulator.statistics()))
+
+## END OF FUNCTION
+# ***********************************************************************************************************************
+
+
+# -------------------------    MAIN   -----------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+# This file finds where the USB drive is mounted and watches its free space during the acquisition, without any
+# subprocess (no lsusb, ls or sudo)
+#   - the mount point of the drive comes from /proc/mounts (device "/dev/<driveName>", or the volume label)
+#   - the free space comes from os.statvfs (shutil.disk_usage where it does not exist, e.g. Windows)
+#   - the bytes written by the logger come from /proc/self/io (Linux only)
+# "StorageMonitor" samples them in the background, warns when the drive gets low and flags it when it is (nearly) full,
+# so the acquisition can be stopped cleanly before the writes start failing
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import os           ## for statvfs and the device names
+import shutil       ## for the free space where os.statvfs does not exist
+import threading    ## for the monitor thread
+import time         ## for the sampling interval and the rates
+
+# ---------------------- global variables []------------------
+
+mountsFileName = "/proc/mounts"
+processIoFileName = "/proc/self/io"
+
+# ---------------------- Class [1]------------------
+
+class StorageMonitor(threading.Thread):
+    # Background thread sampling the free space of the drive holding "path" and the bytes written by the process
+    # "lowFreeBytes": a warning is printed when the free space goes below it (once, until it is above again)
+    # "minFreeBytes": below it, "full" is set: the acquisition should stop before the drive is completely full
+    def __init__(self, path, intervalSeconds=10.0, lowFreeBytes=0, minFreeBytes=0):
+        threading.Thread.__init__(self, name="StorageMonitor", daemon=True)
+        self.path = path
+        self.intervalSeconds = intervalSeconds
+        self.lowFreeBytes = lowFreeBytes
+        self.minFreeBytes = minFreeBytes
+        self.stopEvent = threading.Event()
+        self.full = threading.Event()
+
+        # Last sample
+        self.totalBytes, self.freeBytes = driveUsage(path)
+        self.minFreeSeen = self.freeBytes
+        self.lastTime = time.monotonic()
+        self.lastWrittenBytes = processWrittenBytes()
+        self.startTime = self.lastTime
+        self.startWrittenBytes = self.lastWrittenBytes
+        self.startFreeBytes = self.freeBytes
+
+        # Rates over the last interval [bytes/s]
+        self.writeRate = 0.0  # written by this process
+        self.consumeRate = 0.0  # decrease of the free space (all processes, minus what was deleted)
+
+        self.lowSpace = False
+        self.error = None
+        self.checkThresholds()
+
+    def run(self):
+        while not self.stopEvent.wait(self.intervalSeconds):
+            try:
+                self.sample()
+            except OSError as e:
+                # The drive may have been removed: keep the last values, "full" stops the acquisition
+                self.error = e
+                print("Error while checking the free space of {}: {}".format(self.path, e))
+                self.full.set()
+
+    def sample(self):
+        ### Read the free space and the bytes written now, update the rates and the flags
+        now = time.monotonic()
+        self.totalBytes, freeBytes = driveUsage(self.path)
+        writtenBytes = processWrittenBytes()
+
+        elapsed = now - self.lastTime
+        if elapsed > 0:
+            self.consumeRate = (self.freeBytes - freeBytes) / elapsed
+            if writtenBytes is not None and self.lastWrittenBytes is not None:
+                self.writeRate = (writtenBytes - self.lastWrittenBytes) / elapsed
+
+        self.freeBytes = freeBytes
+        self.minFreeSeen = min(self.minFreeSeen, freeBytes)
+        self.lastTime = now
+        self.lastWrittenBytes = writtenBytes
+        self.checkThresholds()
+
+    def checkThresholds(self):
+        ### Warning and "full" flag from the last free space
+        if self.freeBytes < self.lowFreeBytes:
+            if not self.lowSpace:
+                print("Warning: only {:.1f} MB free on the drive of {}".format(self.freeBytes / 2**20, self.path))
+            self.lowSpace = True
+        else:
+            self.lowSpace = False
+
+        if self.freeBytes < self.minFreeBytes:
+            self.full.set()
+
+    def secondsToFull(self):
+        ### Time before the free space reaches "minFreeBytes" at the current rate, None if it is not decreasing
+        if self.consumeRate <= 0:
+            return None
+        return max(0.0, (self.freeBytes - self.minFreeBytes) / self.consumeRate)
+
+    def stop(self):
+        ### Take a last sample and wait for the thread
+        self.stopEvent.set()
+        self.join()
+        try:
+            self.sample()
+        except OSError:
+            pass
+
+    def statistics(self):
+        ### Free space and rates, as a dictionary (sizes in [MB], rates in [kB/s])
+        elapsed = self.lastTime - self.startTime
+        secondsToFull = self.secondsToFull()
+        statistics = {"path": self.path,
+                      "totalMB": round(self.totalBytes / 2**20, 1),
+                      "freeMB": round(self.freeBytes / 2**20, 1),
+                      "minFreeMB": round(self.minFreeSeen / 2**20, 1),
+                      "usedSinceStartMB": round((self.startFreeBytes - self.freeBytes) / 2**20, 1),
+                      "consumeRate[kB/s]": round(self.consumeRate / 1024, 1),
+                      "writeRate[kB/s]": round(self.writeRate / 1024, 1),
+                      "hoursToFull": round(secondsToFull / 3600, 1) if secondsToFull is not None else None,
+                      "lowSpace": self.lowSpace,
+                      "full": self.full.is_set()}
+        if self.lastWrittenBytes is not None and self.startWrittenBytes is not None:
+            statistics["writtenMB"] = round((self.lastWrittenBytes - self.startWrittenBytes) / 2**20, 1)
+            statistics["meanWriteRate[kB/s]"] = round((self.lastWrittenBytes - self.startWrittenBytes) / 1024 / elapsed, 1) \
+                if elapsed > 0 else 0.0
+        return statistics
+
+# ---------------------- functions [5]-----------------------------------------
+
+# ***********************************************************************************************************************
+def unescapeMountField(field):
+    ### /proc/mounts escapes the spaces, tabs, new lines and backslashes of the paths in octal (e.g. "\040")
+
+    return field.replace("\\040", " ").replace("\\011", "\t").replace("\\012", "\n").replace("\\134", "\\")
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def readMounts(fileName=mountsFileName):
+    ### Mounted file systems: list of dicts (device, mountPoint, fsType, options), empty if the file does not exist
+
+    mounts = []
+    try:
+        with open(fileName) as file:
+            for line in file:
+                fields = line.split()
+                if len(fields) < 4:
+                    continue
+                mounts.append({"device": unescapeMountField(fields[0]),
+                               "mountPoint": unescapeMountField(fields[1]),
+                               "fsType": fields[2],
+                               "options": fields[3].split(",")})
+    except OSError:
+        pass
+
+    return mounts
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def findDriveMount(driveName, fileName=mountsFileName):
+    ### Mount point of the drive "driveName", None if it is not mounted (or mounted read-only)
+    ### "driveName" is the device ("sda1" or "/dev/sda1", also found through /dev/disk/by-* links) or the volume label
+    ### (last folder of the mount point, e.g. "/media/pi/<label>"); the device is preferred if both match
+
+    deviceName = driveName if driveName.startswith("/dev/") else "/dev/" + driveName
+    deviceMatches = []
+    labelMatches = []
+    for mount in readMounts(fileName):
+        if "ro" in mount["options"]:
+            continue
+        device = mount["device"]
+        if device == deviceName or (device.startswith("/dev/") and os.path.realpath(device) == os.path.realpath(deviceName)):
+            deviceMatches.append(mount["mountPoint"])
+        elif os.path.basename(mount["mountPoint"]) == driveName:
+            labelMatches.append(mount["mountPoint"])
+
+    mountPoints = deviceMatches + labelMatches
+    if len(mountPoints) > 1:
+        print("{} mounted {} times ({}), using {}".format(driveName, len(mountPoints), mountPoints, mountPoints[0]))
+
+    return mountPoints[0] if mountPoints else None
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def driveUsage(path):
+    ### Total and free (for a normal user) space [bytes] of the drive holding "path"
+
+    if hasattr(os, "statvfs"):
+        fsStats = os.statvfs(path)
+        return fsStats.f_frsize * fsStats.f_blocks, fsStats.f_frsize * fsStats.f_bavail
+
+    usage = shutil.disk_usage(path)
+    return usage.total, usage.free
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def processWrittenBytes():
+    ### Bytes written to the storage by this process since it started ("write_bytes"), None if unknown
+
+    try:
+        with open(processIoFileName) as file:
+            for line in file:
+                if line.startswith("write_bytes:"):
+                    return int(line.split(":")[1])
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
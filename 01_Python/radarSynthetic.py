@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# This file generates synthetic radar frames, in the same format as the AWR1443 OOB demo (SDK 2.1)
+# It is used to benchmark and test the parser without the radar board
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import numpy as np  ## for generating the random point clouds
+
+## The binary layouts are the ones of the parser: a change of the format changes the synthetic frames too
+from radarFormats import expectedMagicWord, frameHeaderDtype, tlvHeaderDtype, detectedObjDescrDtype, \
+    detectedObjDtype, rangeProfileDtype, MMWDEMO_UART_MSG_DETECTED_POINTS, MMWDEMO_UART_MSG_RANGE_PROFILE
+
+# ---------------------- global variables []------------------
+
+# Values of the frame header fields (SDK 2.1, xWR14xx)
+syntheticMagicWord = bytes(expectedMagicWord)
+syntheticSDKVersion = (2, 1, 0, 4)  # MajorNum, MinorNum, BugfixNum, BuildNum: same as the firmware on the board
+syntheticPlatform = 0xa1443
+
+# The demo pads every packet to a multiple of this length
+syntheticPacketSegmentLen = 32
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def buildTlvHeader(tlvType, tlvLength):
+    ### Function to build the header of a TLV message ("tlvLength" is the length of the payload only)
+
+    tlvHeader = np.zeros(1, dtype=tlvHeaderDtype)
+    tlvHeader['type'] = tlvType
+    tlvHeader['length'] = tlvLength
+    return tlvHeader.tobytes()
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildSyntheticFrame(frameNumber, numObj, rng=None, xyzQFormat=9, numRangeBins=0, timeCpuCycles=None):
+    ### Function to build one complete radar packet (header + TLVs + padding) as bytes
+    ### numRangeBins > 0 adds a range profile TLV after the detected points
+
+    if rng is None:
+        rng = np.random.default_rng(frameNumber)
+
+    if timeCpuCycles is None:
+        timeCpuCycles = (frameNumber * 25000000) & 0xFFFFFFFF  # 125ms at 200MHz
+
+    tlvs = []
+
+    # Detected points TLV
+    if numObj > 0:
+        objs = np.zeros(numObj, dtype=detectedObjDtype)
+        objs['rangeIdx'] = rng.integers(0, 256, numObj)
+        objs['dopplerIdx'] = rng.integers(0, 16, numObj)
+        objs['peakVal'] = rng.integers(100, 5000, numObj)
+        objs['x'] = rng.integers(-2 ** 12, 2 ** 12, numObj)
+        objs['y'] = rng.integers(0, 2 ** 12, numObj)
+        objs['z'] = rng.integers(-2 ** 12, 2 ** 12, numObj)
+        descr = np.zeros(1, dtype=detectedObjDescrDtype)
+        descr['numDetectedObj'] = numObj
+        descr['xyzQFormat'] = xyzQFormat
+        payload = descr.tobytes() + objs.tobytes()
+        tlvs.append(buildTlvHeader(MMWDEMO_UART_MSG_DETECTED_POINTS, len(payload)) + payload)
+
+    # Range profile TLV
+    if numRangeBins > 0:
+        profile = rng.integers(1000, 4000, numRangeBins).astype(rangeProfileDtype)
+        # Add a water surface echo somewhere in the middle
+        peakBin = numRangeBins // 3
+        profile[peakBin - 1:peakBin + 2] = [9000, 12000, 10000]
+        payload = profile.tobytes()
+        tlvs.append(buildTlvHeader(MMWDEMO_UART_MSG_RANGE_PROFILE, len(payload)) + payload)
+
+    body = b"".join(tlvs)
+    totalPacketLen = frameHeaderDtype.itemsize + len(body)
+    totalPacketLen += (-totalPacketLen) % syntheticPacketSegmentLen
+
+    header = np.zeros(1, dtype=frameHeaderDtype)
+    header['magicNumber'] = expectedMagicWord
+    header['MajorNum'], header['MinorNum'], header['BugfixNum'], header['BuildNum'] = syntheticSDKVersion
+    header['totalPacketLen'] = totalPacketLen
+    header['platform'] = syntheticPlatform
+    header['frameNumber'] = frameNumber & 0xFFFFFFFF
+    header['timeCpuCycles'] = timeCpuCycles
+    header['numDetectedObj'] = numObj
+    header['numTLVs'] = len(tlvs)
+
+    frame = header.tobytes() + body
+    return frame + bytes(totalPacketLen - len(frame))
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def buildSyntheticStream(nbrFrames, numObj, garbageBytes=0, numRangeBins=0, seed=0):
+    ### Function to build a byte stream of several frames, with optional random bytes between them (resync test)
+
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for frameNumber in range(1, nbrFrames + 1):
+        if garbageBytes > 0:
+            garbage = rng.integers(0, 256, garbageBytes, dtype=np.uint8)
+            garbage[garbage == syntheticMagicWord[0]] = 0  # make sure there is no fake magic word
+            chunks.append(garbage.tobytes())
+        chunks.append(buildSyntheticFrame(frameNumber, numObj, rng=rng, numRangeBins=numRangeBins))
+
+    return b"".join(chunks)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+# This file contains the writer thread of the data logs: the acquisition thread only queues the records,
+# they are written to the USB drive in large batches by a dedicated thread, so slow writes never block the radar
+# The rotated segments of the logs can be compressed by another thread ("SegmentCompressor")
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import gzip                                       ## for compressing the rotated segments
+import logging                                    ## for the text data log
+from logging.handlers import RotatingFileHandler  ## for limiting the file size
+import lzma                                       ## for compressing the rotated segments
+import os           ## for renaming/removing the segments
+import queue        ## to pass the records to the writer thread
+import shutil       ## to copy a file into its compressed version
+import threading    ## for the writer and compressor threads
+import time         ## for the flush interval and the lag
+
+# ---------------------- global variables []------------------
+
+# Compression methods of the rotated segments: extension and how to open the compressed file for writing
+compressionMethods = {"gzip": (".gz", lambda fileName, level: gzip.open(fileName, "wb", compresslevel=level)),
+                      "lzma": (".xz", lambda fileName, level: lzma.open(fileName, "wb", preset=level))}
+
+# ---------------------- Class [4]------------------
+
+class BatchedLogWriter(threading.Thread):
+    # Writer thread: the records queued with "submit" are grouped by sink and written in batches
+    # A sink is any object with writeBatch(list of records), flush() and close()
+    # The queue holds at most "queueSize" records: if the drive stalls, the new records are dropped (and counted)
+    # instead of filling the memory of the RPi
+    def __init__(self, batchSize, flushIntervalSeconds, queueSize=8192):
+        threading.Thread.__init__(self, name="BatchedLogWriter", daemon=True)
+        self.batchSize = batchSize
+        self.flushIntervalSeconds = flushIntervalSeconds
+        self.recordQueue = queue.Queue(maxsize=queueSize)  # the acquisition thread must never wait
+        self.sinks = {}
+        self.stopMarker = object()
+
+        # Counters
+        self.recordsWritten = 0
+        self.batchesWritten = 0
+        self.lag = 0.0  # [s] age of the oldest record of the last batch when it was written
+        self.maxLag = 0.0
+        self.recordsDropped = {}  # per sink, queue full
+        self.error = None
+
+    def addSink(self, sinkName, sink):
+        ### Register a sink, must be called before "start"
+        self.sinks[sinkName] = sink
+
+    def submit(self, sinkName, record):
+        ### Queue a record for the sink, called by the acquisition thread (never blocks)
+        ### Returns False if the record was dropped because the queue is full (the writer cannot keep up)
+        try:
+            self.recordQueue.put_nowait((time.monotonic(), sinkName, record))
+        except queue.Full:
+            self.recordsDropped[sinkName] = self.recordsDropped.get(sinkName, 0) + 1
+            return False
+        return True
+
+    def pending(self):
+        ### Number of records waiting to be written
+        return self.recordQueue.qsize()
+
+    def run(self):
+        lastFlushTime = time.monotonic()
+        running = True
+
+        while running:
+            # Wait for the first record, at most until the next flush
+            timeout = max(0.0, self.flushIntervalSeconds - (time.monotonic() - lastFlushTime))
+            batch = []
+            try:
+                item = self.recordQueue.get(timeout=timeout)
+                # Then take everything already waiting, up to the batch size
+                while item is not self.stopMarker:
+                    batch.append(item)
+                    if len(batch) >= self.batchSize:
+                        break
+                    item = self.recordQueue.get_nowait()
+                else:
+                    running = False
+            except queue.Empty:
+                pass
+
+            if batch:
+                self.writeBatch(batch)
+
+            if not running or time.monotonic() - lastFlushTime >= self.flushIntervalSeconds:
+                self.flushSinks()
+                lastFlushTime = time.monotonic()
+
+        self.closeSinks()
+
+    def writeBatch(self, batch):
+        ### Group the records by sink (keeping their order) and write them
+        recordsBySink = {}
+        for _, sinkName, record in batch:
+            recordsBySink.setdefault(sinkName, []).append(record)
+
+        for sinkName, records in recordsBySink.items():
+            try:
+                self.sinks[sinkName].writeBatch(records)
+            except Exception as e:
+                # Do not kill the thread: the other sinks (and the next batches) can still be written
+                self.error = e
+                print("Error while writing the {} log: {}".format(sinkName, e))
+
+        self.lag = time.monotonic() - batch[0][0]
+        self.maxLag = max(self.maxLag, self.lag)
+        self.recordsWritten += len(batch)
+        self.batchesWritten += 1
+
+    def flushSinks(self):
+        for sinkName, sink in self.sinks.items():
+            try:
+                sink.flush()
+            except Exception as e:
+                self.error = e
+                print("Error while flushing the {} log: {}".format(sinkName, e))
+
+    def closeSinks(self):
+        for sink in self.sinks.values():
+            sink.close()
+
+    def stop(self):
+        ### Write everything still queued, close the sinks and wait for the thread
+        self.recordQueue.put(self.stopMarker)  # may wait for the writer to make room, the acquisition is over
+        self.join()
+
+    def statistics(self):
+        ### Counters of the writer, as a dictionary
+        return {"pending": self.pending(),
+                "recordsWritten": self.recordsWritten,
+                "batchesWritten": self.batchesWritten,
+                "recordsDropped": sum(self.recordsDropped.values()),
+                "recordsDroppedPerSink": dict(self.recordsDropped),
+                "lag[ms]": round(self.lag * 1000, 1),
+                "maxLag[ms]": round(self.maxLag * 1000, 1)}
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    # Same as "RotatingFileHandler", but can also write a whole batch of records in one write
+    # With a "compressor", the full file becomes "<name>.NNNN" (never renamed again) and is handed to the compressor,
+    # which also deletes the oldest segments: "backupCount" is not used anymore (its "maxCompressedBytes" replaces it)
+    def __init__(self, *args, compressor=None, **kwargs):
+        RotatingFileHandler.__init__(self, *args, **kwargs)
+        self.compressor = compressor
+        self.segmentIdx = 0
+
+    def doRollover(self):
+        if self.compressor is None:
+            RotatingFileHandler.doRollover(self)
+            return
+
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        # Next free segment name (a previous run may have used the same file)
+        segmentName = "{}.{:04d}".format(self.baseFilename, self.segmentIdx)
+        while os.path.exists(segmentName) or os.path.exists(self.compressor.compressedName(segmentName)):
+            self.segmentIdx += 1
+            segmentName = "{}.{:04d}".format(self.baseFilename, self.segmentIdx)
+
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, segmentName)
+            self.compressor.submit(segmentName)
+        self.segmentIdx += 1
+
+        if not self.delay:
+            self.stream = self._open()
+
+    def writeBatch(self, records):
+        ### Format all the records and write them at once, rotating the file first if needed
+        text = "".join([self.format(record) + self.terminator for record in records])
+
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()  # opening was delayed
+            if self.maxBytes > 0 and self.stream.tell() > 0 and self.stream.tell() + len(text) >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(text)
+        finally:
+            self.release()
+
+class SegmentCompressor(threading.Thread):
+    # Background thread compressing the closed segments of the logs ("submit"), the plain file is then deleted
+    # Retention: when the compressed segments take more than "maxCompressedBytes" (0: no limit), the oldest are deleted
+    def __init__(self, method="gzip", level=6, maxCompressedBytes=0):
+        threading.Thread.__init__(self, name="SegmentCompressor", daemon=True)
+        self.extension, self.openCompressed = compressionMethods[method]
+        self.level = level
+        self.maxCompressedBytes = maxCompressedBytes
+        self.segmentQueue = queue.Queue()
+        self.stopMarker = object()
+
+        self.compressedSegments = []  # (name, size), oldest first
+        self.compressedBytes = 0  # total size of "compressedSegments"
+
+        # Counters
+        self.filesCompressed = 0
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.filesDeleted = 0
+        self.error = None
+
+    def compressedName(self, fileName):
+        return fileName + self.extension
+
+    def submit(self, fileName):
+        ### Queue a closed file for compression (never blocks)
+        self.segmentQueue.put(fileName)
+
+    def run(self):
+        fileName = self.segmentQueue.get()
+        while fileName is not self.stopMarker:
+            try:
+                self.compressSegment(fileName)
+                self.applyRetention()
+            except Exception as e:
+                # Keep the plain file and go on with the next one
+                self.error = e
+                print("Error while compressing {}: {}".format(fileName, e))
+            fileName = self.segmentQueue.get()
+
+    def compressSegment(self, fileName):
+        ### Compress into a temporary file first: a power cut never leaves a truncated ".gz"/".xz"
+        compressedName = self.compressedName(fileName)
+        temporaryName = compressedName + ".part"
+        with open(fileName, "rb") as source, self.openCompressed(temporaryName, self.level) as destination:
+            shutil.copyfileobj(source, destination, length=2 ** 20)
+        os.replace(temporaryName, compressedName)
+
+        plainSize = os.path.getsize(fileName)
+        compressedSize = os.path.getsize(compressedName)
+        os.remove(fileName)
+
+        self.compressedSegments.append((compressedName, compressedSize))
+        self.compressedBytes += compressedSize
+        self.filesCompressed += 1
+        self.bytesIn += plainSize
+        self.bytesOut += compressedSize
+
+    def applyRetention(self):
+        ### Delete the oldest compressed segments until they fit in "maxCompressedBytes"
+        while self.maxCompressedBytes and self.compressedBytes > self.maxCompressedBytes and self.compressedSegments:
+            oldestName, oldestSize = self.compressedSegments.pop(0)
+            if os.path.exists(oldestName):
+                os.remove(oldestName)
+            self.compressedBytes -= oldestSize
+            self.filesDeleted += 1
+
+    def pending(self):
+        ### Number of segments waiting to be compressed
+        return self.segmentQueue.qsize()
+
+    def stop(self):
+        ### Compress everything still queued and wait for the thread
+        self.segmentQueue.put(self.stopMarker)
+        self.join()
+
+    def statistics(self):
+        ### Counters of the compressor, as a dictionary
+        return {"pending": self.pending(),
+                "filesCompressed": self.filesCompressed,
+                "bytesIn": self.bytesIn,
+                "bytesOut": self.bytesOut,
+                "ratio": round(self.bytesIn / self.bytesOut, 2) if self.bytesOut else 0.0,
+                "compressedBytes": self.compressedBytes,
+                "filesDeleted": self.filesDeleted}
+
+class WriterQueueHandler(logging.Handler):
+    # Logging handler that only hands the records to the writer thread
+    def __init__(self, writer, sinkName):
+        logging.Handler.__init__(self)
+        self.writer = writer
+        self.sinkName = sinkName
+
+    def emit(self, record):
+        self.writer.submit(self.sinkName, record)
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
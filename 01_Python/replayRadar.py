@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# This file replays a raw capture of the radar DATA port through the parser, without the radar board
+# Usage: python3 replayRadar.py <capture.raw> [--paced] [--speed S] [--binary OUTBASE] [--rebuild-index]
+#   - to reprocess field captures (optionally into a binary log)
+#   - to benchmark the parser on real data
+#   - to check that a change of the parser gives the same frames as before
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import argparse     ## for the command line options
+import time         ## for the timers
+
+import numpy as np  ## for the byte vectors
+
+import globals          ## for the name of the radar configuration file
+import logRadar         ## the parser
+import radarBinaryLog   ## to save the reprocessed frames
+import radarCapture     ## to read the capture
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def replayFrames(replayPort):
+    ### Generator of the complete frames (bytes) of a capture, with the host time of the serial read that completed them
+    ### (recorded time if the capture has its .chunks file, replay time otherwise)
+
+    extractor = logRadar.RadarFrameExtractor(2**15)
+
+    while not replayPort.eof():
+        readBuffer = replayPort.read(max(1, replayPort.in_waiting))
+        if not readBuffer:
+            continue
+        arrivalTime = replayPort.recordedTimestamp() or time.time()
+        if replayPort.lastGapBytes:
+            # Bytes dropped by the logger: the frame in progress cannot be completed
+            extractor.reset()
+        extractor.feed(np.frombuffer(readBuffer, dtype='uint8'))
+
+        frame = extractor.nextFrame()
+        while frame is not None:
+            yield arrivalTime, frame.tobytes()
+            extractor.consumeFrame(len(frame))
+            frame = extractor.nextFrame()
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def main():
+
+    parser = argparse.ArgumentParser(description="Replay a raw capture of the radar DATA port through the parser")
+    parser.add_argument("capture", help="raw capture file (.raw, or the -Raw.bin debug file)")
+    parser.add_argument("--paced", action="store_true", help="replay at the recorded pace (needs the .chunks file)")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed factor of the paced replay")
+    parser.add_argument("--cfg", default=globals.RadarParametersFilePath,
+                        help="radar configuration file used for the capture")
+    parser.add_argument("--binary", default=None, help="base name of a binary log to write the frames to")
+    parser.add_argument("--rebuild-index", action="store_true", help="only (re)build the .idx frame index of the capture")
+    args = parser.parse_args()
+
+    if args.rebuild_index:
+        startTime = time.perf_counter()
+        captureReader = radarCapture.RadarCaptureReader(args.capture, rebuildIndex=True)
+        print("{} frames indexed in {:.3f} s: {}".format(len(captureReader), time.perf_counter() - startTime,
+                                                         radarCapture.captureSidecarName(args.capture, radarCapture.captureIndexExtension)))
+        captureReader.close()
+        return
+
+    configParameters = logRadar.parseConfigFile(args.cfg)
+    replayPort = radarCapture.RadarReplayPort(args.capture, paced=args.paced, speed=args.speed)
+
+    binaryLogWriter = None
+    if args.binary:
+        binaryLogWriter = radarBinaryLog.RadarBinaryLogWriter(args.binary, globals.nbrStoredEchoesInClass,
+                                                              logRadar.computeConfigHash(args.cfg),
+                                                              configParameters)
+
+    nbrFrames = 0
+    nbrDataFrames = 0
+    linkHealth = logRadar.LinkHealthTracker(framePeriodSeconds=configParameters["framePeriodicity"] / 1000,
+                                            cpuFrequencyHz=globals.radarCpuFrequencyHz)
+    waterElevations = []
+    startTime = time.perf_counter()
+
+    for arrivalTime, frameBytes in replayFrames(replayPort):
+        nbrFrames += 1
+        try:
+            radarClass = logRadar.parseFrame14xx(frameBytes)
+            linkHealth.update(radarClass)
+
+            if radarClass.dataOK:
+                radarClass = logRadar.postprocessData14xx(radarClass, configParameters)
+                nbrDataFrames += 1
+                if binaryLogWriter is not None:
+                    binaryLogWriter.writeFrame(radarClass, arrivalTime)
+
+            if radarClass.dataOK or radarClass.rangeProfile is not None:
+                waterElevations.append(logRadar.estimateWaterElevation14xx(radarClass, configParameters).waterElevation)
+
+        # Same as the logger: a frame that cannot be decoded is skipped
+        except (ValueError, IndexError):
+            linkHealth.parseFailed()
+
+    duration = time.perf_counter() - startTime
+    replayPort.close()
+    if binaryLogWriter is not None:
+        binaryLogWriter.close()
+
+    print("-" * 50)
+    print("Replayed {} bytes in {:.3f} s".format(replayPort.fileSize, duration))
+    if len(replayPort.gaps):
+        print("Gaps in the capture: {} ({} bytes dropped by the logger)".format(
+            len(replayPort.gaps), int(replayPort.gaps['droppedBytes'].sum())))
+    print("Frames: {} ({} with detected objects), {:.0f} frames/s".format(
+        nbrFrames, nbrDataFrames, nbrFrames / duration if duration > 0 else 0))
+    print("Link health: {}".format(linkHealth.statistics()))
+    waterElevations = np.array(waterElevations)
+    waterElevations = waterElevations[~np.isnan(waterElevations)]
+    if waterElevations.size:
+        print("Water elevation [m]: {} frames, min {:.4f}, median {:.4f}, max {:.4f}".format(
+            waterElevations.size, waterElevations.min(), np.median(waterElevations), waterElevations.max()))
+
+## END OF FUNCTION
+# ***********************************************************************************************************************
+
+
+# -------------------------    MAIN   -----------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+
+# pytest configuration: the modules of the logger are imported from the code folder (parent of this folder)
+
+import os           ## for the path of the code folder
+import sys          ## to add it to the import path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## END OF FILE
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Regression tests of the raw capture ('radarCapture.py'): blocks of serial reads, gaps when the drive stalls
+#   - the dropped bytes leave a gap record in the .chunks file
+#   - the replay and the frame index never join the bytes on both sides of a gap
+# Usage (from the code folder): python3 -m pytest -q tests
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import threading    ## to stall the writer
+import time         ## to wait for the writer
+
+import radarCapture    ## the code we test
+import radarSynthetic  ## to generate the radar frames
+import replayRadar     ## to replay the capture
+
+# ---------------------- Class [1]------------------
+
+class StalledCaptureWriter(radarCapture.RawCaptureWriter):
+    # The first block waits until "resume" is set, like a USB drive that stalls
+    def __init__(self, *args, **kwargs):
+        radarCapture.RawCaptureWriter.__init__(self, *args, **kwargs)
+        self.resume = threading.Event()
+        self.blockStarted = threading.Event()
+
+    def writeBlock(self, timestamps, lengths, data):
+        self.blockStarted.set()
+        self.resume.wait()
+        radarCapture.RawCaptureWriter.writeBlock(self, timestamps, lengths, data)
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def recordReads(captureWriter, reads, readsPerBlock, maxQueuedBlocks, stalledReads):
+    ### Submit the reads (blocks of "readsPerBlock" reads), the drive stalls during the first "stalledReads" reads
+    ### Returns the recorder once stopped
+
+    readBytes = len(reads[0])
+    recorder = radarCapture.RawCaptureRecorder(captureWriter, blockBytes=readsPerBlock * readBytes, blockSeconds=10.0,
+                                               maxQueuedBytes=maxQueuedBlocks * readsPerBlock * readBytes)
+    recorder.start()
+    for readIdx, data in enumerate(reads):
+        if readIdx == readsPerBlock:
+            assert captureWriter.blockStarted.wait(5)  # the first block is being written
+        if readIdx >= stalledReads:
+            # The drive is back (and faster than the radar): the queue is empty before each read
+            captureWriter.resume.set()
+            while recorder.queuedBytes:
+                time.sleep(0.001)
+        recorder.submit(1000.0 + readIdx, data)
+    captureWriter.resume.set()
+    recorder.stop()
+    return recorder
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def test_blocksGroupReads(tmp_path):
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 5) for frameNumber in range(1, 21)]
+    captureWriter = radarCapture.RawCaptureWriter(str(tmp_path / "capture"))
+    recorder = radarCapture.RawCaptureRecorder(captureWriter, blockBytes=4 * len(frames[0]), blockSeconds=10.0)
+    recorder.start()
+    for frameIdx, frame in enumerate(frames):
+        recorder.submit(1000.0 + frameIdx, frame)
+    recorder.stop()
+
+    assert recorder.blocksQueued == 5 and recorder.bytesDropped == 0
+    chunks = radarCapture.readCaptureChunks(captureWriter.fileName)
+    assert len(chunks) == 20 and list(chunks['hostTimestamp']) == [1000.0 + frameIdx for frameIdx in range(20)]
+    assert len(radarCapture.readCaptureGaps(captureWriter.fileName)) == 0
+
+# ***********************************************************************************************************************
+def test_stalledDriveLeavesGap(tmp_path):
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 5) for frameNumber in range(1, 21)]
+    frameBytes = len(frames[0])
+    captureWriter = StalledCaptureWriter(str(tmp_path / "capture"))
+    # Blocks of 2 frames, room for 4 blocks (the first one, stalled, included): frames 9 to 12 are dropped
+    recorder = recordReads(captureWriter, frames, 2, 4, 12)
+
+    assert recorder.bytesDropped == 4 * frameBytes
+    assert recorder.bytesDropped + captureWriter.bytesWritten == 20 * frameBytes
+
+    gaps = radarCapture.readCaptureGaps(captureWriter.fileName)
+    assert len(gaps) == 1
+    assert int(gaps['droppedBytes'][0]) == recorder.bytesDropped
+    assert int(gaps['offset'][0]) == 8 * frameBytes
+    chunks = radarCapture.readCaptureChunks(captureWriter.fileName)
+    assert int(chunks['length'].sum()) == captureWriter.bytesWritten
+
+# ***********************************************************************************************************************
+def test_replayAndIndexAcrossGap(tmp_path):
+    # Frames of 2.5 reads: a gap cuts a frame, its 2 parts must not be joined
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 5) for frameNumber in range(1, 41)]
+    stream = b"".join(frames)
+    readBytes = 2 * len(frames[0]) // 5
+    reads = [stream[start:start + readBytes] for start in range(0, len(stream), readBytes)]
+    captureWriter = StalledCaptureWriter(str(tmp_path / "capture"))
+    recordReads(captureWriter, reads, 3, 3, 30)
+
+    replayPort = radarCapture.RadarReplayPort(captureWriter.fileName)
+    replayed = [radarSynthetic.np.frombuffer(frameBytes, dtype=radarCapture.frameHeaderDtype, count=1)[0]
+                for arrivalTime, frameBytes in replayRadar.replayFrames(replayPort)]
+    index = radarCapture.buildCaptureIndex(captureWriter.fileName)
+
+    assert len(replayPort.gaps) == 1
+    frameNumbers = [int(header['frameNumber']) for header in replayed]
+    assert frameNumbers == list(index['frameNumber'])
+    assert frameNumbers == sorted(frameNumbers) and len(frameNumbers) < 40
+    # Every frame found is a whole frame of the stream
+    for header, offset in zip(replayed, index['offset']):
+        frame = frames[int(header['frameNumber']) - 1]
+        assert radarCapture.loadCaptureBytes(captureWriter.fileName)[int(offset):int(offset) + len(frame)].tobytes() == frame
+
+    # Same index while recording
+    recordedIndex = radarCapture.readCaptureIndex(captureWriter.fileName)
+    assert list(recordedIndex['frameNumber']) == frameNumbers
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Regression tests of the CLI session ('radarCli.py') with a scripted fake CLI port
+#   - a command that times out must not shift the replies of the next commands (late reply, stray prompt)
+# Usage (from the code folder): python3 -m pytest -q tests
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import time         ## for the delays of the replies
+
+import radarCli     ## the code we test
+
+# ---------------------- global variables []------------------
+
+commandTimeout = 0.1  # [s] short, so the tests run fast
+
+# ---------------------- Class [1]------------------
+
+class FakeCliPort:
+    # CLI port answering like the demo firmware: echo, "Done" (or the reply of "replies") and the prompt
+    # "delays": command name -> delay of its reply [s] (none: immediate)
+    def __init__(self, replies=None, delays=None):
+        self.replies = replies or {}
+        self.delays = delays or {}
+        self.pending = []  # (time the bytes are available, bytes)
+        self.commands = []
+
+    def write(self, data):
+        for command in data.decode().split('\n')[:-1]:
+            command = command.strip()
+            self.commands.append(command)
+            name = command.split()[0] if command else ""
+            reply = command + "\r\n" + self.replies.get(name, "Done") + "\r\n" if command else "\r\n"
+            self.pending.append((time.monotonic() + self.delays.get(name, 0.0), reply.encode() + radarCli.cliPrompt))
+
+    def available(self):
+        now = time.monotonic()
+        nbrReady = 0
+        while nbrReady < len(self.pending) and self.pending[nbrReady][0] <= now:
+            nbrReady += 1
+        return nbrReady
+
+    @property
+    def in_waiting(self):
+        return sum([len(data) for readyTime, data in self.pending[:self.available()]])
+
+    def read(self, nbrBytes):
+        # Serial timeout of 10 ms
+        deadline = time.monotonic() + 0.01
+        while not self.available() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        readBuffer = b""
+        while self.available() and len(readBuffer) < nbrBytes:
+            readyTime, data = self.pending.pop(0)
+            readBuffer += data
+        return readBuffer
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def sendConfiguration(cliPort):
+    ### Send a short configuration, returns the session
+
+    cliSession = radarCli.RadarCliSession(cliPort, commandTimeout, commandTimeout)
+    cliSession.sendCommands(["sensorStop", "profileCfg 0 77", "frameCfg 0 1 16", "sensorStart"])
+    return cliSession
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def statuses(cliSession):
+    return [(result.command.split()[0], result.status) for result in cliSession.results]
+
+# ***********************************************************************************************************************
+def test_allDone():
+    cliSession = sendConfiguration(FakeCliPort())
+    assert statuses(cliSession) == [("sensorStop", "Done"), ("profileCfg", "Done"), ("frameCfg", "Done"),
+                                    ("sensorStart", "Done")]
+
+# ***********************************************************************************************************************
+def test_lateReplyDrained():
+    # The reply of "sensorStop" arrives after its timeout, but before the end of the grace period
+    cliPort = FakeCliPort(replies={"profileCfg": "Error -1"}, delays={"sensorStop": 1.5 * commandTimeout})
+    cliSession = sendConfiguration(cliPort)
+
+    assert statuses(cliSession) == [("sensorStop", "Timeout"), ("profileCfg", "Error"), ("frameCfg", "Done"),
+                                    ("sensorStart", "Done")]
+    assert cliSession.results[1].replyLines == ["Error -1"]
+
+# ***********************************************************************************************************************
+def test_lateReplySkipped():
+    # The reply of "sensorStop" arrives after the grace period: the CLI is synchronised again (empty line) and the
+    # late reply, received during the next command, is skipped
+    cliPort = FakeCliPort(replies={"profileCfg": "Error -1"}, delays={"sensorStop": 2.5 * commandTimeout})
+    cliSession = sendConfiguration(cliPort)
+
+    assert "" in cliPort.commands  # synchronised again
+    assert statuses(cliSession) == [("sensorStop", "Timeout"), ("profileCfg", "Error"), ("frameCfg", "Done"),
+                                    ("sensorStart", "Done")]
+    assert cliSession.results[1].replyLines == ["Error -1"]
+    assert cliSession.skippedReplies >= 1
+
+# ***********************************************************************************************************************
+def test_strayPromptSkipped():
+    # A prompt without the echo of our command (empty line typed before) is not taken as the reply
+    cliPort = FakeCliPort(replies={"sensorStop": "Error -2"})
+    cliPort.write(b"\n")
+    cliSession = radarCli.RadarCliSession(cliPort, commandTimeout, commandTimeout)
+    result = cliSession.sendCommand("sensorStop")
+
+    assert result.status == "Error" and result.replyLines == ["Error -2"]
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
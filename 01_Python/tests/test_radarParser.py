@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# Regression tests of the radar DATA port parsing: frames from 'radarSynthetic.py' go through "parseFrame14xx",
+# "MagicWordSync", "RadarFrameExtractor" and "readAndParseData14xx"
+#   - good frames, split in chunks of every size (also across the magic word), with garbage in between
+#   - corrupted frames (truncated, wrong object count, too short): never an exception, "dataOK" is False
+# Usage (from the code folder): python3 -m pytest -q tests
+
+# -------------------Metadata----------------------
+# Creator: Nathanael ESNAULT
+
+# nathanael.esnault@gmail.com
+# or
+# nesn277@aucklanduni.ac.nz
+
+# Creation date 2022-06-01
+# Version	1.0
+
+# Version Control: https://github.com/Saultes45/
+
+# ---------------------- imports -----------------------------------------
+import struct       ## to corrupt the object count of a frame
+
+import numpy as np  ## for the byte vectors
+import pytest       ## for the parametrised tests
+
+import logRadar     ## the code we test
+import radarSynthetic  ## to generate the radar frames
+from radarFormats import frameHeaderDtype, tlvHeaderDtype, detectedObjDescrDtype, detectedObjDtype, expectedMagicWord
+
+# ---------------------- global variables []------------------
+
+# Offset of the object count of the detected points TLV (first TLV of the synthetic frames)
+numDetectedObjOffset = frameHeaderDtype.itemsize + tlvHeaderDtype.itemsize
+
+# ---------------------- functions []-----------------------------------------
+
+# ***********************************************************************************************************************
+def extractFrames(stream, chunkSize, capacity=2**15):
+    ### Feed "stream" to a "RadarFrameExtractor" in chunks of "chunkSize" bytes, returns the frames (bytes) found
+
+    extractor = logRadar.RadarFrameExtractor(capacity)
+    frames = []
+    for start in range(0, len(stream), chunkSize):
+        extractor.feed(np.frombuffer(stream[start:start + chunkSize], dtype='uint8'))
+        frame = extractor.nextFrame()
+        while frame is not None:
+            frames.append(frame.tobytes())
+            extractor.consumeFrame(len(frame))
+            frame = extractor.nextFrame()
+    return frames, extractor
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+def corruptObjectCount(frame, numDetectedObj):
+    ### Copy of a synthetic frame with another object count in the descriptor of the detected points TLV
+
+    frame = bytearray(frame)
+    frame[numDetectedObjOffset:numDetectedObjOffset + 2] = struct.pack('<H', numDetectedObj)
+    return bytes(frame)
+
+    ## END OF FUNCTION
+# ***********************************************************************************************************************
+
+# ***********************************************************************************************************************
+@pytest.mark.parametrize("numObj", [1, 3, 10, 100])
+def test_parseGoodFrame(numObj):
+    frame = radarSynthetic.buildSyntheticFrame(7, numObj, numRangeBins=64)
+    parsedData = logRadar.parseFrame14xx(frame)
+
+    assert parsedData.magicOK and parsedData.dataOK and not parsedData.truncated
+    assert parsedData.frmhdr.frameNumber == 7
+    assert parsedData.frmhdr.totalPacketLen == len(frame)
+    assert parsedData.numStoredObj == min(numObj, logRadar.globals.nbrStoredEchoesInClass)
+    assert len(parsedData.rangeProfile) == 64
+
+    # The objects are the ones of the frame
+    objects = np.frombuffer(frame, dtype=detectedObjDtype, count=numObj,
+                            offset=numDetectedObjOffset + detectedObjDescrDtype.itemsize)
+    assert (parsedData.rawObjects == objects[:parsedData.numStoredObj]).all()
+
+# ***********************************************************************************************************************
+@pytest.mark.parametrize("wrongCount", [4, 60, 65535])
+def test_parseObjectCountTooLarge(wrongCount):
+    # Regression: np.frombuffer raised "buffer is smaller than requested size"
+    frame = corruptObjectCount(radarSynthetic.buildSyntheticFrame(1, 3), wrongCount)
+    parsedData = logRadar.parseFrame14xx(frame)
+
+    assert parsedData.magicOK
+    assert parsedData.truncated and not parsedData.dataOK
+
+# ***********************************************************************************************************************
+def test_decodeDetectedObjectsClamped():
+    frame = np.frombuffer(corruptObjectCount(radarSynthetic.buildSyntheticFrame(1, 3), 60), dtype='uint8')
+    tlvLength = detectedObjDescrDtype.itemsize + 3 * detectedObjDtype.itemsize
+    xyzQFormat, objects, objectsOK = logRadar.decodeDetectedObjects14xx(frame, numDetectedObjOffset, tlvLength)
+
+    assert len(objects) == 3 and not objectsOK
+
+    # A TLV shorter than its descriptor
+    xyzQFormat, objects, objectsOK = logRadar.decodeDetectedObjects14xx(frame, numDetectedObjOffset, 2)
+    assert len(objects) == 0 and not objectsOK
+
+# ***********************************************************************************************************************
+@pytest.mark.parametrize("length", [0, 8, 20, frameHeaderDtype.itemsize, frameHeaderDtype.itemsize + 4,
+                                    numDetectedObjOffset + 6, numDetectedObjOffset + 20])
+def test_parseTruncatedFrame(length):
+    frame = radarSynthetic.buildSyntheticFrame(1, 10, numRangeBins=64)[:length]
+    parsedData = logRadar.parseFrame14xx(frame)
+
+    assert not parsedData.dataOK
+    if length >= len(expectedMagicWord):
+        assert parsedData.truncated
+
+# ***********************************************************************************************************************
+def test_parseBadMagicWord():
+    frame = bytearray(radarSynthetic.buildSyntheticFrame(1, 3))
+    frame[0] ^= 0xFF
+    parsedData = logRadar.parseFrame14xx(bytes(frame))
+
+    assert not parsedData.magicOK and not parsedData.dataOK
+
+# ***********************************************************************************************************************
+def test_magicWordSyncAcrossReads():
+    # The magic word straddles 2 updates of the buffer
+    frame = radarSynthetic.buildSyntheticFrame(1, 3)
+    buffer = np.frombuffer(b"\x00" * 5 + frame + frame, dtype='uint8')
+    magicSync = logRadar.MagicWordSync(expectedMagicWord)
+
+    splitIdx = 5 + len(frame) + 3  # in the middle of the second magic word
+    assert list(magicSync.update(buffer, splitIdx)) == [5]
+    assert list(magicSync.update(buffer, len(buffer))) == [5, 5 + len(frame)]
+
+    # The first bytes are removed: the indexes follow
+    magicSync.discard(5 + len(frame))
+    assert list(magicSync.startIdx) == [0]
+
+# ***********************************************************************************************************************
+@pytest.mark.parametrize("chunkSize", [1, 3, 7, 8, 9, 64, 100, 4096])
+@pytest.mark.parametrize("garbageBytes", [0, 13])
+def test_extractFramesInChunks(chunkSize, garbageBytes):
+    stream = radarSynthetic.buildSyntheticStream(20, 5, garbageBytes=garbageBytes, numRangeBins=32)
+    frames, extractor = extractFrames(stream, chunkSize)
+
+    assert [logRadar.parseFrame14xx(frame).frmhdr.frameNumber for frame in frames] == list(range(1, 21))
+    assert all([logRadar.parseFrame14xx(frame).dataOK for frame in frames])
+    assert extractor.discardedBytes == 20 * garbageBytes
+
+# ***********************************************************************************************************************
+@pytest.mark.parametrize("splitOffset", range(1, 8))
+def test_extractFrameSplitInMagicWord(splitOffset):
+    first = radarSynthetic.buildSyntheticFrame(1, 3)
+    second = radarSynthetic.buildSyntheticFrame(2, 3)
+    stream = first + second
+
+    extractor = logRadar.RadarFrameExtractor(2**15)
+    splitIdx = len(first) + splitOffset
+    frameNumbers = []
+    for chunk in [stream[:splitIdx], stream[splitIdx:]]:
+        extractor.feed(np.frombuffer(chunk, dtype='uint8'))
+        frame = extractor.nextFrame()
+        while frame is not None:
+            frameNumbers.append(logRadar.parseFrame14xx(frame.tobytes()).frmhdr.frameNumber)
+            extractor.consumeFrame(len(frame))
+            frame = extractor.nextFrame()
+
+    assert frameNumbers == [1, 2]
+
+# ***********************************************************************************************************************
+def test_extractCorruptedFrameInStream():
+    # A frame with a wrong object count between good ones: the good ones are still parsed
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 3) for frameNumber in range(1, 6)]
+    frames[2] = corruptObjectCount(frames[2], 60)
+    extracted, extractor = extractFrames(b"".join(frames), 50)
+
+    parsed = [logRadar.parseFrame14xx(frame) for frame in extracted]
+    assert [parsedData.frmhdr.frameNumber for parsedData in parsed] == [1, 2, 3, 4, 5]
+    assert [parsedData.dataOK for parsedData in parsed] == [True, True, False, True, True]
+
+# ***********************************************************************************************************************
+def test_extractAfterRingOverflow():
+    # A chunk dropped because the ring is full leaves a spliced frame: it must not raise, and the next frames are found
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 10) for frameNumber in range(1, 40)]
+    stream = b"".join(frames)
+    capacity = 4 * len(frames[0])
+    extractor = logRadar.RadarFrameExtractor(capacity)
+
+    parsed = []
+    chunkSize = 3 * len(frames[0]) // 2
+    for start in range(0, len(stream), chunkSize):
+        extractor.feed(np.frombuffer(stream[start:start + chunkSize], dtype='uint8'))
+        # Only read the frames from time to time: the ring overflows
+        if (start // chunkSize) % 3 == 2:
+            frame = extractor.nextFrame()
+            while frame is not None:
+                parsed.append(logRadar.parseFrame14xx(frame.tobytes()))
+                extractor.consumeFrame(len(frame))
+                frame = extractor.nextFrame()
+
+    assert extractor.byteRing.droppedWrites > 0
+    assert any([parsedData.dataOK for parsedData in parsed])
+
+# ***********************************************************************************************************************
+class FakeDataPort:
+    # Serial port replaying a byte stream, "chunkSize" bytes per read
+    def __init__(self, stream, chunkSize):
+        self.stream = stream
+        self.chunkSize = chunkSize
+        self.position = 0
+
+    @property
+    def in_waiting(self):
+        return min(self.chunkSize, len(self.stream) - self.position)
+
+    def read(self, nbrBytes):
+        readBuffer = self.stream[self.position:self.position + nbrBytes]
+        self.position += len(readBuffer)
+        return readBuffer
+
+def test_readAndParseData():
+    frames = [radarSynthetic.buildSyntheticFrame(frameNumber, 3) for frameNumber in range(1, 6)]
+    frames[1] = corruptObjectCount(frames[1], 60)
+    dataPort = FakeDataPort(b"".join(frames), 37)
+    logRadar.frameExtractor = logRadar.RadarFrameExtractor(2**15)
+
+    frameNumbers = []
+    while dataPort.in_waiting:
+        parsedData = logRadar.readAndParseData14xx(dataPort)
+        if parsedData.magicOK:
+            frameNumbers.append((parsedData.frmhdr.frameNumber, parsedData.dataOK))
+
+    assert frameNumbers == [(1, True), (2, False), (3, True), (4, True), (5, True)]
+
+## END OF FILE
+##&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&